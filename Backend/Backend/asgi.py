@@ -9,19 +9,22 @@ https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 
 import os
 
-# from channels.auth import AuthMiddlewareStack
 from channels.routing import ProtocolTypeRouter, URLRouter
-from django.core.asgi import get_asgi_application   
-
-from .urls import websocket_urlpatterns
+from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Backend.settings')
+# Served by an event loop, the read-heavy endpoints use their async views
+os.environ.setdefault('ASYNC_READ_VIEWS', 'True')
 
+# Sets up Django, so it comes before anything importing models
 application = get_asgi_application()
 
+from .urls import websocket_urlpatterns  # noqa: E402
+from .websocket_auth import JWTAuthMiddleware  # noqa: E402
+
 application = ProtocolTypeRouter(
     {
         "http": application,
-        "websocket": URLRouter(websocket_urlpatterns),
+        "websocket": JWTAuthMiddleware(URLRouter(websocket_urlpatterns)),
     }
 )
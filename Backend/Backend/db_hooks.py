@@ -0,0 +1,47 @@
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+_query_wrappers = []
+
+
+def install_query_wrapper(wrapper):
+    """
+    Run every query of every connection, present and future, through ``wrapper``.
+
+    ``connection.execute_wrapper()`` only covers the connection of the calling thread. Under
+    ASGI the async ORM runs queries through sync_to_async, on a thread with a connection of its
+    own, so request instrumentation installs its wrapper here instead and finds the request it
+    belongs to from a ContextVar, which sync_to_async carries over to that thread.
+    """
+    if wrapper not in _query_wrappers:
+        _query_wrappers.append(wrapper)
+    _attach_open_connections()
+
+
+def _attach_open_connections():
+    # Connections are per thread, so this only reaches the calling thread's
+    for connection in connections.all(initialized_only=True):
+        _attach(connection)
+
+
+def _attach(connection):
+    for wrapper in _query_wrappers:
+        if wrapper not in connection.execute_wrappers:
+            # Outermost, so execute_wrapper() blocks, which pop the last wrapper, leave it in place
+            connection.execute_wrappers.insert(0, wrapper)
+
+
+def _connection_created(sender, connection, **kwargs):
+    _attach(connection)
+
+
+def _request_started(sender, **kwargs):
+    # Sent from the thread that will run the request's queries (under ASGI too, as a sync
+    # receiver), which may hold connections opened before the wrappers were installed
+    if _query_wrappers:
+        _attach_open_connections()
+
+
+connection_created.connect(_connection_created)
+request_started.connect(_request_started)
@@ -0,0 +1,376 @@
+import atexit
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import transaction
+from django.dispatch import receiver
+from django.http import HttpResponse
+from rest_framework.permissions import IsAdminUser
+from rest_framework.views import APIView
+
+from Backend.db_hooks import install_query_wrapper
+from store.models import lots_allocated, stock_changed
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+# name: (type, help, histogram buckets)
+METRICS = {
+    'http_requests_total': ('counter', "Requests handled, by route, method and status.", None),
+    'http_request_duration_seconds': ('histogram', "Time until the response is returned (before a streamed body), by route and method.", LATENCY_BUCKETS),
+    'http_request_queries': ('histogram', "Database queries per request, by route and method.", QUERY_BUCKETS),
+    'stock_movements_total': ('counter', "Committed stock ledger entries, by movement type.", None),
+    'stock_movement_units_total': ('counter', "Units moved by committed ledger entries, by movement type.", None),
+    'out_allocations_total': ('counter', "Committed lot allocations of out-transaction lines.", None),
+    'out_allocated_units_total': ('counter', "Units taken from lots by committed out-transaction lines.", None),
+}
+
+# Snapshots of exited processes are folded into this file
+EXITED_FILENAME = 'exited.json'
+
+
+class MetricsRegistry:
+    """
+    Counters and histograms shared by every worker process on the host, without a metrics server.
+
+    Each process keeps its own values in memory and writes a snapshot of them to a file of its
+    own in METRICS_DIR from a timer, METRICS_FLUSH_INTERVAL seconds after the first change
+    since the last snapshot, and on exit; requests never wait on the file. Reading
+    sums the snapshots of all processes, past and present, so counters only ever grow; clear
+    the directory when deploying to start from zero. When a worker starts, the snapshots of
+    processes that have exited are folded into one file (see fold_exited()), so restarts do
+    not leave a file each behind. Rates, such as stock movements per second, are left to the
+    scraper (``rate(stock_movements_total[1m])``).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = None
+        atexit.register(self.flush)
+
+    def _own_state(self):
+        # A forked worker starts its own file rather than continuing its parent's
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.filename = f'{self.pid}-{uuid.uuid4().hex}.json'
+            self.values = {}
+            self.timer = None
+        return self.values
+
+    def inc(self, name, labels=None, amount=1):
+        with self.lock:
+            series = self._own_state().setdefault(name, {})
+            key = self.key(labels)
+            series[key] = series.get(key, 0) + amount
+        self.changed()
+
+    def observe(self, name, value, labels=None):
+        buckets = METRICS[name][2]
+        with self.lock:
+            series = self._own_state().setdefault(name, {})
+            histogram = series.setdefault(self.key(labels), {'buckets': [0] * len(buckets), 'sum': 0, 'count': 0})
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram['buckets'][index] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+        self.changed()
+
+    @staticmethod
+    def key(labels):
+        return json.dumps(sorted((labels or {}).items()))
+
+    def changed(self):
+        if not settings.METRICS_FLUSH_INTERVAL:
+            self.flush()
+            return
+        with self.lock:
+            if self.timer is None:
+                self.timer = threading.Timer(settings.METRICS_FLUSH_INTERVAL, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self):
+        with self.lock:
+            values = self._own_state()
+            # Values kept while metrics were enabled, as in tests, are not written after they are turned off
+            if not values or not settings.METRICS_ENABLED:
+                return
+            snapshot = json.dumps(values)
+            self.timer = None
+            os.makedirs(settings.METRICS_DIR, exist_ok=True)
+            self.write(os.path.join(settings.METRICS_DIR, self.filename), snapshot)
+
+    def collect(self):
+        """Sum the latest snapshots of every process into ``{name: {label key: value}}``."""
+        self.flush()
+        with self.directory_lock(exclusive=False):
+            return self.merge(glob.glob(os.path.join(settings.METRICS_DIR, '*.json')))
+
+    def fold_exited(self):
+        """
+        Merge the snapshots of processes that are no longer running into EXITED_FILENAME.
+
+        The exclusive lock keeps readers from summing a snapshot both before and after it is
+        folded, and two starting workers from folding the same one.
+        """
+        with self.directory_lock(exclusive=True):
+            exited = [path for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.json')) if snapshot_exited(path)]
+            if not exited:
+                return
+            path = os.path.join(settings.METRICS_DIR, EXITED_FILENAME)
+            self.write(path, json.dumps(self.merge([path, *exited])))
+            for snapshot in exited:
+                os.remove(snapshot)
+
+    @staticmethod
+    def directory_lock(exclusive):
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        return DirectoryLock(os.path.join(settings.METRICS_DIR, '.lock'), exclusive)
+
+    @staticmethod
+    def write(path, content):
+        # Readers only ever see a complete snapshot
+        fd, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'w') as output:
+            output.write(content)
+        os.replace(temporary, path)
+
+    @staticmethod
+    def merge(paths):
+        merged = {}
+        for path in paths:
+            try:
+                with open(path) as snapshot:
+                    values = json.load(snapshot)
+            except (OSError, ValueError):
+                continue
+            for name, series in values.items():
+                if name not in METRICS:
+                    continue
+                target = merged.setdefault(name, {})
+                for key, value in series.items():
+                    if isinstance(value, dict):
+                        total = target.setdefault(key, {'buckets': [0] * len(value['buckets']), 'sum': 0, 'count': 0})
+                        total['buckets'] = [a + b for a, b in zip(total['buckets'], value['buckets'])]
+                        total['sum'] += value['sum']
+                        total['count'] += value['count']
+                    else:
+                        target[key] = target.get(key, 0) + value
+        return merged
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        merged = self.collect()
+        lines = []
+        for name, (kind, help_text, buckets) in METRICS.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for key, value in sorted(merged.get(name, {}).items()):
+                labels = json.loads(key)
+                if kind == 'counter':
+                    lines.append(f'{name}{format_labels(labels)} {format_value(value)}')
+                    continue
+                for bound, count in zip(buckets, value['buckets']):
+                    lines.append(f'{name}_bucket{format_labels(labels + [["le", format_value(bound)]])} {count}')
+                lines.append(f'{name}_bucket{format_labels(labels + [["le", "+Inf"]])} {value["count"]}')
+                lines.append(f'{name}_sum{format_labels(labels)} {format_value(value["sum"])}')
+                lines.append(f'{name}_count{format_labels(labels)} {value["count"]}')
+        return '\n'.join(lines) + '\n'
+
+
+class DirectoryLock:
+    """
+    A lock on ``path`` for the duration of a with block: flock() on POSIX, msvcrt on Windows.
+
+    Windows has no shared file locks, so readers there take the lock exclusively too.
+    """
+
+    def __init__(self, path, exclusive):
+        self.path = path
+        self.exclusive = exclusive
+
+    def __enter__(self):
+        self.file = open(self.path, 'a')
+        if os.name == 'nt':
+            import msvcrt
+
+            self.file.seek(0)
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(self.file, fcntl.LOCK_EX if self.exclusive else fcntl.LOCK_SH)
+
+    def __exit__(self, *exc_info):
+        if os.name == 'nt':
+            import msvcrt
+
+            self.file.seek(0)
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+        self.file.close()
+
+
+def snapshot_exited(path):
+    # Snapshots are named <pid>-<random>.json; EXITED_FILENAME has no pid and is kept
+    try:
+        pid = int(os.path.basename(path).split('-', 1)[0])
+    except ValueError:
+        return False
+    return not process_running(pid)
+
+
+# Windows process access right and exit code used by process_running()
+PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+STILL_ACTIVE = 259
+ERROR_ACCESS_DENIED = 5
+
+
+def process_running(pid):
+    """Whether process ``pid`` still runs, without signalling it (os.kill() terminates it on Windows)."""
+    if os.name == 'nt':
+        import ctypes
+
+        kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+        handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            # Another user's process cannot be opened but is running
+            return ctypes.get_last_error() == ERROR_ACCESS_DENIED
+        try:
+            exit_code = ctypes.c_ulong()
+            return bool(kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))) and exit_code.value == STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+
+    try:
+        # Signal 0 only checks that the process exists
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in labels) + '}'
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_value(value):
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+metrics = MetricsRegistry()
+
+# One-item list counting the queries of the request being handled in this context
+current_query_count = ContextVar('current_query_count', default=None)
+
+
+def count_query(execute, sql, params, many, context):
+    counter = current_query_count.get()
+    if counter is not None:
+        counter[0] += 1
+    return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """
+    Counts every request by route, method and status, and records its latency and query count.
+
+    Routes are the URL patterns (``store/products/<int:pk>/``), so label values stay bounded;
+    requests that match no pattern are grouped under ``<unmatched>``. Only used with
+    METRICS_ENABLED=True.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        install_query_wrapper(count_query)
+        metrics.fold_exited()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        queries = [0]
+        token = current_query_count.set(queries)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_query_count.reset(token)
+        self.record(request, response, time.perf_counter() - started, queries[0])
+        return response
+
+    async def __acall__(self, request):
+        queries = [0]
+        token = current_query_count.set(queries)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_query_count.reset(token)
+        self.record(request, response, time.perf_counter() - started, queries[0])
+        return response
+
+    def record(self, request, response, elapsed, queries):
+        match = request.resolver_match
+        route = {'route': match.route if match else '<unmatched>', 'method': request.method}
+        metrics.inc('http_requests_total', {**route, 'status': str(response.status_code)})
+        metrics.observe('http_request_duration_seconds', elapsed, route)
+        metrics.observe('http_request_queries', queries, route)
+
+
+@receiver(stock_changed, dispatch_uid='metrics.count_movements')
+def count_movements(sender, movements=(), **kwargs):
+    if settings.METRICS_ENABLED and movements:
+        transaction.on_commit(lambda: _count_movements(movements))
+
+
+def _count_movements(movements):
+    for movement in movements:
+        labels = {'type': movement.movement_type}
+        metrics.inc('stock_movements_total', labels)
+        metrics.inc('stock_movement_units_total', labels, abs(movement.quantity))
+
+
+@receiver(lots_allocated, dispatch_uid='metrics.count_allocations')
+def count_allocations(sender, split, **kwargs):
+    if settings.METRICS_ENABLED and split:
+        transaction.on_commit(lambda: _count_allocations(split))
+
+
+def _count_allocations(split):
+    metrics.inc('out_allocations_total', amount=len(split))
+    metrics.inc('out_allocated_units_total', amount=sum(taken for lot_id, taken in split))
+
+
+class MetricsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,197 @@
+import cProfile
+import json
+import logging
+import os
+import random
+import re
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from rest_framework.serializers import BaseSerializer
+
+from Backend.db_hooks import install_query_wrapper
+
+logger = logging.getLogger(__name__)
+
+# Timings of the request being handled in this context, or None outside a profiled request
+current_timings = ContextVar('current_timings', default=None)
+
+
+class RequestTimings:
+    """
+    What one request spent, in seconds. Database time spent inside serializers (lazy querysets,
+    related lookups) counts as database time only, so ``db + serializer`` never exceeds ``total``.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db = 0.0
+        self.serializer = 0.0
+        self.serializer_depth = 0
+
+    @property
+    def total(self):
+        return time.perf_counter() - self.started
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - started
+            self.queries += 1
+
+    @contextmanager
+    def serializing(self):
+        # Nested serializers are part of the outermost one's time
+        self.serializer_depth += 1
+        started, db_before = time.perf_counter(), self.db
+        try:
+            yield
+        finally:
+            self.serializer_depth -= 1
+            if not self.serializer_depth:
+                self.serializer += (time.perf_counter() - started) - (self.db - db_before)
+
+    def server_timing(self):
+        return (
+            f'db;dur={self.db * 1000:.1f};desc="{self.queries} queries", '
+            f'serialize;dur={self.serializer * 1000:.1f}, '
+            f'total;dur={self.total * 1000:.1f}'
+        )
+
+
+def record_query(execute, sql, params, many, context):
+    timings = current_timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    return timings.record_query(execute, sql, params, many, context)
+
+
+def timed_serializer_method(method):
+    def wrapper(self, *args, **kwargs):
+        timings = current_timings.get()
+        if timings is None:
+            return method(self, *args, **kwargs)
+        with timings.serializing():
+            return method(self, *args, **kwargs)
+    wrapper.__wrapped__ = method
+    return wrapper
+
+
+def instrument_serializers():
+    """Time every serializer's validation and output; a no-op outside profiled requests."""
+    if hasattr(BaseSerializer.is_valid, '__wrapped__'):
+        return
+    BaseSerializer.is_valid = timed_serializer_method(BaseSerializer.is_valid)
+    BaseSerializer.data = property(timed_serializer_method(BaseSerializer.data.fget))
+
+
+class ProfilingMiddleware:
+    """
+    Opt-in request profiling, enabled with PROFILING_ENABLED.
+
+    Every request gets a ``Server-Timing`` header (database time and query count, serializer
+    time, total) and one JSON log line on the ``Backend.profiling`` logger. A
+    PROFILING_SAMPLE_RATE fraction of requests also runs under cProfile, and the profile is
+    written to PROFILING_DIR when the request took longer than PROFILING_SLOW_MS. Streamed
+    responses are logged once their content has been sent, so the line includes the queries
+    made while streaming; their header only covers the time before the first byte.
+
+    Under ASGI, requests are timed the same way but never run under cProfile: it follows a
+    single thread, and an event loop interleaves the requests it serves.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        install_query_wrapper(record_query)
+        instrument_serializers()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings = RequestTimings()
+        profiler = cProfile.Profile() if random.random() < settings.PROFILING_SAMPLE_RATE else None
+
+        with self.measuring(timings, profiler):
+            response = self.get_response(request)
+        return self.respond(request, response, timings, profiler)
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        with self.measuring(timings, None):
+            response = await self.get_response(request)
+        return self.respond(request, response, timings, None)
+
+    def respond(self, request, response, timings, profiler):
+        response['Server-Timing'] = timings.server_timing()
+        if not response.streaming:
+            self.finish(request, response, timings, profiler)
+        elif response.is_async:
+            response.streaming_content = self.astream(response.streaming_content, request, response, timings)
+        else:
+            response.streaming_content = self.stream(response.streaming_content, request, response, timings, profiler)
+        return response
+
+    @contextmanager
+    def measuring(self, timings, profiler):
+        token = current_timings.set(timings)
+        try:
+            with ExitStack() as stack:
+                if profiler:
+                    profiler.enable()
+                    stack.callback(profiler.disable)
+                yield
+        finally:
+            current_timings.reset(token)
+
+    def stream(self, content, request, response, timings, profiler):
+        with self.measuring(timings, profiler):
+            yield from content
+        self.finish(request, response, timings, profiler)
+
+    async def astream(self, content, request, response, timings):
+        with self.measuring(timings, None):
+            async for chunk in content:
+                yield chunk
+        self.finish(request, response, timings, None)
+
+    def finish(self, request, response, timings, profiler):
+        total = timings.total
+        profile = None
+        if profiler and total * 1000 >= settings.PROFILING_SLOW_MS:
+            profile = self.dump(profiler, request, total)
+
+        match = request.resolver_match
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'route': match.route if match else None,
+            'status': response.status_code,
+            'queries': timings.queries,
+            'db_ms': round(timings.db * 1000, 1),
+            'serializer_ms': round(timings.serializer * 1000, 1),
+            'total_ms': round(total * 1000, 1),
+            'profile': profile,
+        }))
+
+    def dump(self, profiler, request, total):
+        os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+        slug = re.sub(r'[^A-Za-z0-9]+', '-', request.path).strip('-') or 'root'
+        path = os.path.join(
+            settings.PROFILING_DIR, f'{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}-{request.method}-{slug}-{total * 1000:.0f}ms.prof'
+        )
+        profiler.dump_stats(path)
+        return path
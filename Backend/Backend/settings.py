@@ -14,6 +14,7 @@ from pathlib import Path
 import os
 from datetime import timedelta
 from decouple import config
+from django.core.exceptions import ImproperlyConfigured
 
 
 
@@ -37,6 +38,8 @@ ALLOWED_HOSTS = ['*']
 # Application definition
 
 INSTALLED_APPS = [
+    # First, so runserver is daphne's and serves Backend.asgi, websocket routes included
+    'daphne',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -55,6 +58,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost, so its timings cover every other middleware; inert unless PROFILING_ENABLED
+    'Backend.profiling.ProfilingMiddleware',
+    'Backend.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
 
@@ -86,32 +92,119 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'Backend.wsgi.application'
-# ASGI_APPLICATION = 'Backend.asgi.application'
+ASGI_APPLICATION = 'Backend.asgi.application'
+
+# Route the dashboard, inventory, transaction and report reads to their async views
+# (store.api.async_views). Backend.asgi turns it on; under WSGI the sync views are cheaper
+ASYNC_READ_VIEWS = config('ASYNC_READ_VIEWS', default=False, cast=bool)
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DB_PROFILE selects the database:
+#   sqlite          SQLite tuned for concurrent requests (WAL, IMMEDIATE write transactions, busy timeout)
+#   sqlite-default  Django's stock SQLite settings, kept for comparing write throughput
+#   postgresql      PostgreSQL configured from DB_NAME/DB_USER/DB_PASSWORD/DB_HOST/DB_PORT
+
+DB_PROFILE = config('DB_PROFILE', default='sqlite')
+DB_CONN_MAX_AGE = config('DB_CONN_MAX_AGE', default=60, cast=int)
+
+if DB_PROFILE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config('DB_NAME'),
+            'USER': config('DB_USER'),
+            'PASSWORD': config('DB_PASSWORD', default=''),
+            'HOST': config('DB_HOST', default='localhost'),
+            'PORT': config('DB_PORT', default='5432'),
+            # Persistent connections, checked before reuse so a dropped one is replaced instead of failing a request
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+        }
     }
-}
+elif DB_PROFILE == 'sqlite':
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',  # readers no longer block the writer, nor it them
+        'synchronous': 'NORMAL',  # durable across crashes of the app; only a power loss can drop the last commits
+        'busy_timeout': config('SQLITE_BUSY_TIMEOUT', default=5000, cast=int),  # ms a writer waits for the lock
+        'mmap_size': config('SQLITE_MMAP_SIZE', default=256 * 1024 * 1024, cast=int),
+    }
+    DATABASES = {
+        'default': {
+            'ENGINE': 'Backend.sqlite3',
+            'NAME': config('DB_NAME', default=str(BASE_DIR / 'db.sqlite3')),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'OPTIONS': {
+                'init_command': ';'.join(f'PRAGMA {name} = {value}' for name, value in SQLITE_PRAGMAS.items()),
+                'transaction_mode': 'IMMEDIATE',
+            },
+        }
+    }
+elif DB_PROFILE == 'sqlite-default':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': config('DB_NAME', default=str(BASE_DIR / 'db.sqlite3')),
+        }
+    }
+else:
+    raise ImproperlyConfigured(f"Unknown DB_PROFILE {DB_PROFILE!r}; use sqlite, sqlite-default or postgresql.")
+
+
+# Cache
+# Set REDIS_CACHE_URL to share cached data (e.g. the dashboard snapshot) between worker processes
+
+REDIS_CACHE_URL = config('REDIS_CACHE_URL', default='')
+
+if REDIS_CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+DASHBOARD_CACHE_TIMEOUT = config('DASHBOARD_CACHE_TIMEOUT', default=60, cast=int)
+
+
+# Channel layer carrying the WebSocket notifications (store.consumers). The in-memory layer only
+# reaches sockets served by the same process; set CHANNEL_REDIS_URL to reach every worker's
+CHANNEL_REDIS_URL = config('CHANNEL_REDIS_URL', default='')
 
+if CHANNEL_REDIS_URL:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [CHANNEL_REDIS_URL]},
+        }
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        }
+    }
 
-# DATABASES = {
-#     'default': {
-#         'ENGINE': 'django.db.backends.postgresql_psycopg2',
-#         'NAME': config("NAME"),
-#         'USER': config("USER"),
-#         'PASSWORD': config("PASSWORD"),
-#         'HOST': 'localhost',
-#         'PORT': '5432',  # Specify the port number here
-#     }
-# }
+# Notifications arriving within this many ms of the first are pushed as one message
+NOTIFICATIONS_COALESCE_MS = config('NOTIFICATIONS_COALESCE_MS', default=250, cast=int)
 
 
+# Celery
+# Image variants are rendered by a worker reading CELERY_BROKER_URL. Without a broker they stay
+# pending, and products show the original, until `manage.py process_product_images` renders them.
+# CELERY_TASK_ALWAYS_EAGER=True runs tasks inside the request instead, for development only
 
+CELERY_BROKER_URL = config('CELERY_BROKER_URL', default='')
+CELERY_TASK_ALWAYS_EAGER = config('CELERY_TASK_ALWAYS_EAGER', default=False, cast=bool)
+CELERY_RESULT_BACKEND = 'django-db'
+CELERY_TASK_IGNORE_RESULT = True
 
 
 
@@ -180,6 +273,52 @@ MEDIA_URL = '/media/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Number of product/branch codes each worker process reserves at a time (1 = no gaps)
+STORE_CODE_BLOCK_SIZE = config('STORE_CODE_BLOCK_SIZE', default=1, cast=int)
+
+# Number of pre-generated barcodes kept in the pool / added when it runs dry
+BARCODE_POOL_SIZE = config('BARCODE_POOL_SIZE', default=1000, cast=int)
+
+# Barcode scans answered from a per-process LRU; the timeout bounds staleness from other workers' writes
+SCAN_CACHE_SIZE = config('SCAN_CACHE_SIZE', default=4096, cast=int)
+SCAN_CACHE_TIMEOUT = config('SCAN_CACHE_TIMEOUT', default=30, cast=int)
+
+# Largest page a client may request with ?page_size
+MAX_PAGE_SIZE = config('MAX_PAGE_SIZE', default=100, cast=int)
+
+# Rendered barcode images, cached on disk by content hash
+BARCODE_CACHE_DIR = config('BARCODE_CACHE_DIR', default=os.path.join(MEDIA_ROOT, 'barcodes'))
+
+# Label sheets: largest batch per request, and worker processes rendering pages (1 = in-process)
+LABEL_SHEET_MAX_LABELS = config('LABEL_SHEET_MAX_LABELS', default=2400, cast=int)
+LABEL_WORKERS = config('LABEL_WORKERS', default=min(4, os.cpu_count() or 1), cast=int)
+
+# Request profiling: Server-Timing headers and a JSON log line per request. A sampled fraction of
+# requests runs under cProfile; profiles of those slower than PROFILING_SLOW_MS are kept
+PROFILING_ENABLED = config('PROFILING_ENABLED', default=False, cast=bool)
+PROFILING_SAMPLE_RATE = config('PROFILING_SAMPLE_RATE', default=0.0, cast=float)
+PROFILING_SLOW_MS = config('PROFILING_SLOW_MS', default=500, cast=int)
+PROFILING_DIR = config('PROFILING_DIR', default=str(BASE_DIR / 'profiles'))
+
+# Prometheus metrics at /metrics (admin only), off unless enabled. Every worker process writes its
+# values to METRICS_DIR, which must be shared by the workers of one deployment
+METRICS_ENABLED = config('METRICS_ENABLED', default=False, cast=bool)
+METRICS_DIR = config('METRICS_DIR', default=str(BASE_DIR / 'metrics'))
+METRICS_FLUSH_INTERVAL = config('METRICS_FLUSH_INTERVAL', default=1.0, cast=float)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'Backend.profiling': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+        # Warnings only: logins are logged at INFO and would print on every sign-in
+        'account': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},
+    },
+}
+
 # AUTH_USER_MODEL = 'account.User'
 
 REST_FRAMEWORK = {
@@ -187,7 +326,7 @@ REST_FRAMEWORK = {
 
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'store.api.pagination.StorePageNumberPagination',
     'PAGE_SIZE': 10  ,
 }
 
@@ -222,7 +361,7 @@ SIMPLE_JWT = {
     "SLIDING_TOKEN_LIFETIME": timedelta(minutes=5),
     "SLIDING_TOKEN_REFRESH_LIFETIME": timedelta(days=1),
 
-    "TOKEN_OBTAIN_SERIALIZER": "accounts.api.serializers.MyTokenObtainPairSerializer",
+    "TOKEN_OBTAIN_SERIALIZER": "account.api.serializers.MyTokenObtainPairSerializer",
     "TOKEN_REFRESH_SERIALIZER": "rest_framework_simplejwt.serializers.TokenRefreshSerializer",
     "TOKEN_VERIFY_SERIALIZER": "rest_framework_simplejwt.serializers.TokenVerifySerializer",
     "TOKEN_BLACKLIST_SERIALIZER": "rest_framework_simplejwt.serializers.TokenBlacklistSerializer",
@@ -0,0 +1,31 @@
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    The stock SQLite backend plus the ``init_command`` and ``transaction_mode`` options of Django 5.1.
+
+    ``init_command`` runs its ``;``-separated statements (the PRAGMAs) on every new connection.
+    ``transaction_mode`` is used when opening ``atomic()`` blocks: with ``IMMEDIATE``, a writer
+    takes the lock up front and waits out ``busy_timeout``. A deferred transaction that reads
+    and then writes instead fails at once with "database is locked" if another writer got in
+    between. Once on Django 5.1, switch ENGINE back to ``django.db.backends.sqlite3``.
+    """
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        # Not sqlite3.connect() arguments
+        kwargs.pop('init_command', None)
+        kwargs.pop('transaction_mode', None)
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for statement in self.settings_dict['OPTIONS'].get('init_command', '').split(';'):
+            if statement.strip():
+                conn.execute(statement)
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.settings_dict['OPTIONS'].get('transaction_mode')
+        self.cursor().execute(f'BEGIN {mode}' if mode else 'BEGIN')
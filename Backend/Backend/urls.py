@@ -20,16 +20,26 @@ from django.urls import re_path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from Backend.metrics import MetricsView
+from store.consumers import StoreEventsConsumer
+
 
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('auth/', include("account.api.urls")),
-    path('store/',include("store.api.urls"))
+    path('store/',include("store.api.urls")),
+    path('metrics', MetricsView.as_view(), name='metrics'),
   
     
 
 ]
+# WebSocket routes, served by Backend.asgi
+websocket_urlpatterns = [
+    path('ws/store/', StoreEventsConsumer.as_asgi()),
+    path('ws/store/branches/<str:branch_code>/', StoreEventsConsumer.as_asgi()),
+]
+
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
@@ -0,0 +1,33 @@
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Sets ``scope['user']`` from the JWT access token in the ``token`` query parameter.
+
+    Browsers cannot set headers on a WebSocket handshake, so the token the API takes as
+    ``Authorization: Bearer`` travels in the URL instead. Missing or invalid tokens leave an
+    AnonymousUser for the consumer to refuse.
+    """
+
+    async def __call__(self, scope, receive, send):
+        scope = dict(scope, user=await get_user(scope.get('query_string', b'')))
+        return await super().__call__(scope, receive, send)
+
+
+@database_sync_to_async
+def get_user(query_string):
+    tokens = parse_qs(query_string.decode()).get('token')
+    if not tokens:
+        return AnonymousUser()
+    authentication = JWTAuthentication()
+    try:
+        return authentication.get_user(authentication.get_validated_token(tokens[0]))
+    except AuthenticationFailed:  # simplejwt's InvalidToken included
+        return AnonymousUser()
@@ -4,7 +4,6 @@ from rest_framework import serializers
 from django.contrib.auth.hashers import make_password
 from rest_framework_simplejwt.tokens import RefreshToken, Token,AccessToken
 from django.contrib.auth import get_user_model
-from account.models import Order
 
 User = get_user_model()
 
@@ -36,6 +36,9 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework import status
+import logging
+
+logger = logging.getLogger(__name__)
 
 User = get_user_model()
 
@@ -56,7 +59,6 @@ class UserLogin(APIView):
         try:
             username = request.data['username']
             password = request.data['password']
-            print(username, password)
 
         except KeyError:
             raise ParseError('All Fields Are Required')
@@ -74,7 +76,6 @@ class UserLogin(APIView):
             raise AuthenticationFailed('Invalid Password')
 
         refresh = RefreshToken.for_user(user)
-        print(request.data)
 
         refresh["first_name"] = str(user.first_name)
         # refresh["is_admin"] = str(user.is_superuser)
@@ -85,7 +86,7 @@ class UserLogin(APIView):
             'access': str(refresh.access_token),
             'isAdmin': user.is_superuser,
         }
-        print(content)
+        logger.info("User %s logged in", user.username)
         return Response(content, status=status.HTTP_200_OK)
     
 
@@ -103,8 +104,7 @@ class LogoutView(APIView):
 
             return Response({"detail": "Successfully logged out."}, status=status.HTTP_205_RESET_CONTENT)
         except Exception as e:
-            # Log the exception for debugging purposes
-            print(f"Logout failed: {str(e)}")
+            logger.warning("Logout failed for user %s: %s", request.user.pk, e)
             return Response({"error": "Invalid token or token blacklisting failed."}, status=status.HTTP_401_UNAUTHORIZED)
 
 
@@ -1,9 +1,10 @@
 from django.contrib import admin
-from .models import Product, TotalStock, ProductInTransactionDetail,ProductInTransaction
+from .models import Product, TotalStock, ProductInTransactionDetail,ProductInTransaction, StockMovement
 
 admin.site.register(Product)
 admin.site.register(TotalStock)
 admin.site.register(ProductInTransactionDetail)
 admin.site.register(ProductInTransaction)
+admin.site.register(StockMovement)
 
 # Register your models here.
@@ -0,0 +1,160 @@
+from inspect import isawaitable
+
+from asgiref.sync import sync_to_async
+from django.db.models import Sum
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from store.dashboard import aget_dashboard_snapshot
+from store.models import DailySalesRollup, ProductInTransaction
+from .exports import achain, aiter_values
+from .serializers import FullTransactionDetailSerializer, ProductDetailsReportSerializer, ProductInTransactionDetailSerializer
+from .views import DashboardView, InventoryListView, ReportView, TransactionView
+
+
+class AsyncAPIViewMixin:
+    """
+    DRF's dispatch() for views whose handlers are coroutines, which DRF 3.14 cannot await.
+
+    Authentication, permissions and throttling run as in any DRF view, in one sync_to_async
+    hop since authenticating may look the user up. Handlers await the database through the
+    async ORM, so under ASGI a request waiting on a query holds no thread of its own. The
+    views are still served correctly under WSGI, but each request then pays for an event loop;
+    store.api.urls only routes to them when ASYNC_READ_VIEWS is set, as Backend.asgi does.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            # OPTIONS and 405 responses come from DRF's own, sync, handlers
+            response = handler(request, *args, **kwargs)
+            if isawaitable(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+class AsyncDashboardView(AsyncAPIViewMixin, DashboardView):
+    async def get(self, request):
+        return Response(await aget_dashboard_snapshot())
+
+
+class AsyncInventoryListView(AsyncAPIViewMixin, InventoryListView):
+    async def get(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+
+        # DRF's paginators have no async API, so the count and the page are read in one
+        # sync_to_async hop, the same hop the async ORM makes for each of its queries
+        page = await sync_to_async(self.paginate_queryset)(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer([row async for row in queryset], many=True).data)
+
+
+class AsyncTransactionView(AsyncAPIViewMixin, TransactionView):
+    async def get(self, request, supplier_invoice_number=None):
+        if supplier_invoice_number:
+            try:
+                transaction = await ProductInTransaction.objects.with_details().aget(
+                    supplier_invoice_number=supplier_invoice_number,
+                    is_delivered=False
+                )
+            except ProductInTransaction.DoesNotExist:
+                return Response({'error': 'Transaction not found or already delivered'}, status=status.HTTP_404_NOT_FOUND)
+            return Response(self.serializer_class(transaction).data, status=status.HTTP_200_OK)
+
+        invoice_numbers = ProductInTransaction.objects.filter(is_delivered=False).values_list('supplier_invoice_number', flat=True)
+        return Response({'supplier_invoice_numbers': [number async for number in invoice_numbers]}, status=status.HTTP_200_OK)
+
+
+class AsyncReportView(AsyncAPIViewMixin, ReportView):
+    async def get(self, request, report_type=None):
+        export_format = request.GET.get('export')
+        if export_format:
+            # Streamed from an async iterator, so a long export holds no thread either
+            return self.export_report(request, report_type, export_format, values=aiter_values, chain=achain)
+
+        if report_type == 'transaction-in':
+            return await self.aget_transaction_report('transaction_in', is_delivered=False)
+        elif report_type == 'transaction-out':
+            return await self.aget_transaction_report('transaction_out', is_delivered=True)
+        elif report_type == 'sales':
+            return await self.aget_sales_report(request)
+        elif report_type == 'daily':
+            return await self.aget_daily_report(request)
+        elif report_type == 'product-details':
+            return await self.aget_product_details_report(request)
+        else:
+            return Response({'error': 'Invalid report type'}, status=400)
+
+    async def aget_transaction_report(self, key, **filters):
+        transactions = ProductInTransaction.objects.with_details().filter(**filters)
+        return Response({
+            key: await serialize_transactions(transactions)
+        }, status=200)
+
+    async def aget_sales_report(self, request):
+        start_date = request.GET.get('start_date')
+        end_date = request.GET.get('end_date')
+
+        if not start_date or not end_date:
+            return Response({'error': 'Please provide both start_date and end_date'}, status=400)
+
+        rollups = DailySalesRollup.objects.filter(day__range=[start_date, end_date])
+        total_sales = (await rollups.aaggregate(Sum('total')))['total__sum'] or 0
+
+        if request.GET.get('breakdown') == 'daily':
+            return Response({
+                'total_sales': total_sales,
+                'daily_sales': [row async for row in self.daily_sales(rollups)]
+            }, status=200)
+
+        details = [detail async for detail in self.sales_details(start_date, end_date)]
+        return Response({
+            'total_sales': total_sales,
+            'sales_details': ProductInTransactionDetailSerializer(details, many=True).data
+        }, status=200)
+
+    async def aget_daily_report(self, request):
+        today = timezone.now().date()
+
+        transactions_in = ProductInTransaction.objects.with_details().filter(inward_stock_date=today)
+        transactions_out = ProductInTransaction.objects.with_details().filter(delivery_date=today, is_delivered=True)
+
+        sales_today = (await DailySalesRollup.objects.filter(
+            delivery_date=today
+        ).aaggregate(Sum('total')))['total__sum'] or 0
+
+        return Response({
+            'transactions_in_today': await serialize_transactions(transactions_in),
+            'transactions_out_today': await serialize_transactions(transactions_out),
+            'total_sales_today': sales_today,
+            'outward_today': [row async for row in self.outward(today)]
+        }, status=200)
+
+    async def aget_product_details_report(self, request):
+        details = [detail async for detail in self.product_details()]
+        return Response({
+            'product_details': ProductDetailsReportSerializer(details, many=True).data
+        }, status=200)
+
+
+async def serialize_transactions(transactions):
+    # Iterating runs the prefetches too, so serializing touches no database
+    return FullTransactionDetailSerializer([transaction async for transaction in transactions], many=True).data
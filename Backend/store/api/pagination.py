@@ -0,0 +1,57 @@
+from django.conf import settings
+from rest_framework.pagination import BasePagination, CursorPagination, PageNumberPagination
+
+
+class StorePageNumberPagination(PageNumberPagination):
+    # ?page_size lets clients pick a page size, capped so no request can ask for the whole table
+    page_size_query_param = 'page_size'
+    max_page_size = settings.MAX_PAGE_SIZE
+
+
+class StoreCursorPagination(CursorPagination):
+    page_size_query_param = 'page_size'
+    max_page_size = settings.MAX_PAGE_SIZE
+    ordering = '-id'
+
+
+class OptInCursorPagination(BasePagination):
+    """
+    Page-number pagination by default, keyset (cursor) pagination on request.
+
+    Clients opt in with ``?pagination=cursor`` and then follow the ``next`` and
+    ``previous`` links. Cursor pages skip the ``COUNT(*)`` and seek on the primary
+    key, newest first, so a deep page costs the same as the first one.
+    """
+
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+
+    def __init__(self):
+        self.paginator = StorePageNumberPagination()
+
+    @property
+    def display_page_controls(self):
+        return getattr(self.paginator, 'display_page_controls', False)
+
+    def wants_cursor(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or self.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.wants_cursor(request):
+            self.paginator = StoreCursorPagination()
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.paginator.get_paginated_response_schema(schema)
+
+    def to_html(self):
+        return self.paginator.to_html()
+
+    def get_schema_operation_parameters(self, view):
+        return self.paginator.get_schema_operation_parameters(view)
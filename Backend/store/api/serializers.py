@@ -1,10 +1,13 @@
+import re
+from decimal import Decimal
 from rest_framework import serializers
-from django.db.models import Sum
 
 from store.models import (
     Customer, Category, Brand, Product, Branch,
-    ProductInTransaction, ProductInTransactionDetail, TotalStock, ProductOutTransaction, ProductOutTransactionDetail, ExpiredProduct, DefectiveProduct
+    ProductInTransaction, ProductInTransactionDetail, TotalStock, ProductOutTransaction, ProductOutTransactionDetail, ExpiredProduct, DefectiveProduct,
+    InsufficientStock, StockMovement
 )
+from django.conf import settings
 from django.utils.crypto import get_random_string
 from django.db import transaction
 
@@ -26,10 +29,19 @@ class BrandSerializer(serializers.ModelSerializer):
         model = Brand
         fields = '__all__'
 
+def image_variant_urls(product, request):
+    # Thumbnail and medium WebP/JPEG URLs, or None until the worker has rendered them
+    urls = product.image_asset.variant_urls() if product.image_asset_id else None
+    if urls and request is not None:
+        urls = {variant: {extension: request.build_absolute_uri(url) for extension, url in formats.items()} for variant, formats in urls.items()}
+    return urls
+
+
 class ProductSerializer(serializers.ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
     brand_name = serializers.CharField(source='brand.name', read_only=True)
     image_url = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
@@ -40,6 +52,7 @@ class ProductSerializer(serializers.ModelSerializer):
             'category': {'write_only': True},
             'brand': {'write_only': True},
             'price': {'read_only': False}, 
+            'image_asset': {'read_only': True},
         }
 
     def get_image_url(self, obj):
@@ -48,9 +61,29 @@ class ProductSerializer(serializers.ModelSerializer):
             return request.build_absolute_uri(obj.image.url)
         return None
 
+    def get_image_variants(self, obj):
+        return image_variant_urls(obj, self.context.get('request'))
+
     def create(self, validated_data):
         # No need to manually handle product_code, let the model's save method do it
         return super().create(validated_data)
+
+
+# One row of a bulk product import; category and brand are given by name
+class ProductImportRowSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=255)
+    category = serializers.CharField(max_length=255)
+    brand = serializers.CharField(max_length=255)
+    unit_type = serializers.CharField(max_length=100, default='pieces')
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, default=Decimal('0.00'))
+    product_code = serializers.CharField(max_length=100, required=False)
+    barcode = serializers.CharField(max_length=100, required=False)
+
+    def validate_product_code(self, value):
+        # P<number> codes are handed out by product_code_sequence, which would later issue the same one
+        if re.fullmatch(r'P\d+', value):
+            raise serializers.ValidationError("Codes of the form P<number> are generated by the store. Leave the code blank.")
+        return value
     
 # Branch Serializer
 class BranchSerializer(serializers.ModelSerializer):
@@ -58,9 +91,33 @@ class BranchSerializer(serializers.ModelSerializer):
         model = Branch
         fields = '__all__'
 
-# Product In Transaction Detail Serializer
+# Product field resolved from the products preloaded by the list serializer
+class PreloadedProductField(serializers.PrimaryKeyRelatedField):
+    def to_internal_value(self, data):
+        preloaded = getattr(self.parent, 'preloaded_products', None) or {}
+        try:
+            return preloaded[int(data)]
+        except (KeyError, TypeError, ValueError):
+            return super().to_internal_value(data)
+
+
+class PreloadedProductListSerializer(serializers.ListSerializer):
+    def to_internal_value(self, data):
+        # Load every referenced product with one query instead of one lookup per line
+        if isinstance(data, list):
+            product_ids = set()
+            for item in data:
+                try:
+                    product_ids.add(int(item.get('product')))
+                except (AttributeError, TypeError, ValueError):
+                    continue
+            self.child.preloaded_products = Product.objects.in_bulk(product_ids)
+        return super().to_internal_value(data)
+
+
 # Product In Transaction Detail Serializer
 class ProductInTransactionDetailSerializer(serializers.ModelSerializer):
+    product = PreloadedProductField(queryset=Product.objects.all())
     product_name = serializers.CharField(source='product.name', read_only=True)
     transaction = serializers.PrimaryKeyRelatedField(read_only=True)  # Mark transaction as read_only
     product_image = serializers.ImageField(source='product.image', read_only=True)  # Include the product image
@@ -68,6 +125,8 @@ class ProductInTransactionDetailSerializer(serializers.ModelSerializer):
     class Meta:
         model = ProductInTransactionDetail  # Adjust to your actual model name
         fields = '__all__'  # Add product_image if you want it to be part of all fields, or specify fields explicitly
+        read_only_fields = ['remaining_quantity']
+        list_serializer_class = PreloadedProductListSerializer
 
     def get_product_image(self, obj):
         request = self.context.get('request')
@@ -85,15 +144,24 @@ class ProductInTransactionSerializer(serializers.ModelSerializer):
     
     def create(self, validated_data):
         details_data = validated_data.pop('transaction_details')
-        transaction = ProductInTransaction.objects.create(**validated_data)
+        # Delivery is recorded after the lines exist so the sales rollup picks them up
+        is_delivered = validated_data.pop('is_delivered', False)
 
-        for detail_data in details_data:
-            ProductInTransactionDetail.objects.create(
-                transaction=transaction,  # Assign the transaction here
-                **detail_data
-            )
-        
-        return transaction
+        with transaction.atomic():
+            in_transaction = ProductInTransaction.objects.create(**validated_data)
+
+            # Totals are computed in memory and all lines go in with one bulk insert
+            ProductInTransactionDetail.objects.bulk_create_with_totals([
+                ProductInTransactionDetail(transaction=in_transaction, **detail_data)
+                for detail_data in details_data
+            ])
+
+            in_transaction.post_stock_movements()
+
+            if is_delivered:
+                in_transaction.is_delivered = True
+                in_transaction.save(update_fields=['is_delivered'])
+        return in_transaction
 
 
 
@@ -113,6 +181,7 @@ class InventorySerializer(serializers.ModelSerializer):
     quantity = serializers.IntegerField(read_only=True)
     transaction_id = serializers.IntegerField(source='transaction.id', read_only=True)  # Transaction ID
     product_image = serializers.ImageField(source='product.image', read_only=True)  # Product image
+    product_image_variants = serializers.SerializerMethodField()  # Thumbnail/medium URLs for list rows
     invoice_number = serializers.CharField(source='transaction.supplier_invoice_number', read_only=True)  # Invoice number
 
     class Meta:
@@ -120,9 +189,12 @@ class InventorySerializer(serializers.ModelSerializer):
         fields = [
             'product_id', 'product_code', 'name', 'barcode', 'category_name', 
             'brand_name', 'customer_name', 'inward_stock_date', 'washing_quantity', 
-            'quantity', 'delivery_date', 'transaction_id', 'product_image', 'invoice_number'  # Ensure all needed fields are included
+            'quantity', 'delivery_date', 'transaction_id', 'product_image', 'product_image_variants', 'invoice_number'  # Ensure all needed fields are included
         ]
 
+    def get_product_image_variants(self, obj):
+        return image_variant_urls(obj.product, self.context.get('request'))
+
 
 class FullTransactionDetailSerializer(serializers.ModelSerializer):
     transaction_details = ProductInTransactionDetailSerializer(many=True, read_only=True)  # Fetch product details
@@ -135,18 +207,40 @@ class FullTransactionDetailSerializer(serializers.ModelSerializer):
 
 
 class ProductOutTransactionDetailSerializer(serializers.ModelSerializer):
-    product = ProductSerializer()
+    product = PreloadedProductField(queryset=Product.objects.all())
 
     class Meta:
         model = ProductOutTransactionDetail
         fields = ['product', 'qty_requested']
+        list_serializer_class = PreloadedProductListSerializer
+
+    def to_representation(self, instance):
+        # Products are written by id but returned in full
+        data = super().to_representation(instance)
+        data['product'] = ProductSerializer(instance.product, context=self.context).data
+        return data
 
 class ProductOutTransactionSerializer(serializers.ModelSerializer):
-    transaction_details = ProductOutTransactionDetailSerializer(many=True, read_only=True)
+    transaction_details = ProductOutTransactionDetailSerializer(many=True)
 
     class Meta:
         model = ProductOutTransaction
-        fields = ['id', 'supplier_invoice_number', 'transaction_details']
+        fields = ['id', 'date', 'branch', 'transfer_invoice_number', 'branch_in_charge', 'remarks', 'transaction_details']
+
+    def create(self, validated_data):
+        details_data = validated_data.pop('transaction_details')
+
+        try:
+            with transaction.atomic():
+                out_transaction = ProductOutTransaction.objects.create(**validated_data)
+
+                # Each line takes its quantity from the product's lots; any shortfall rolls back the whole transfer
+                for detail_data in details_data:
+                    ProductOutTransactionDetail(transaction=out_transaction, **detail_data).save()
+        except InsufficientStock as e:
+            raise serializers.ValidationError({'transaction_details': e.messages})
+
+        return out_transaction
 
 
 
@@ -177,6 +271,41 @@ class DefectiveProductSerializer(serializers.ModelSerializer):
 
 
 
+class StockWriteOffItemSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField(min_value=1)
+    qty = serializers.IntegerField(min_value=1)
+    remarks = serializers.CharField(required=False, allow_blank=True, default='')
+
+
+class StockWriteOffBatchSerializer(serializers.Serializer):
+    type = serializers.ChoiceField(choices=[StockMovement.EXPIRED, StockMovement.DEFECTIVE])
+    remarks = serializers.CharField(required=False, allow_blank=True, default='')
+    items = StockWriteOffItemSerializer(many=True, allow_empty=False, max_length=1000)
+
+    def validate(self, attrs):
+        # Items without their own remarks take the batch remarks
+        for item in attrs['items']:
+            item['remarks'] = item['remarks'] or attrs['remarks']
+        return attrs
+
+
+class LabelSheetItemSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField(min_value=1)
+    copies = serializers.IntegerField(min_value=1, default=1)
+
+
+class LabelSheetSerializer(serializers.Serializer):
+    items = LabelSheetItemSerializer(many=True, allow_empty=False)
+
+    def validate_items(self, items):
+        limit = settings.LABEL_SHEET_MAX_LABELS
+        if sum(item['copies'] for item in items) > limit:
+            raise serializers.ValidationError(f"A label sheet can hold at most {limit} labels.")
+        return items
+
+
+
+
 #  **************************** Reports serializer ****************************************
 
 
@@ -236,10 +365,11 @@ class SupplierWiseReportSerializer(serializers.ModelSerializer):
         fields = ['date', 'supplier_invoice_number', 'supplier_name', 'product_detail', 'quantity', 'expiry_date']
 
 class ProductDetailsReportSerializer(serializers.ModelSerializer):
-    outward_qty = serializers.SerializerMethodField()
-    date = serializers.DateField(source='transaction.purchase_date')
+    # Serializes ProductInTransactionDetail.objects.with_outward_totals(), which annotates outward_total
+    outward_qty = serializers.IntegerField(source='outward_total', read_only=True)
+    date = serializers.DateField(source='transaction.inward_stock_date')
     supplier_invoice_number = serializers.CharField(source='transaction.supplier_invoice_number')
-    supplier_name = serializers.CharField(source='transaction.supplier.name')
+    supplier_name = serializers.CharField(source='transaction.customer.name')
     product_detail = serializers.CharField(source='product.name')
 
     class Meta:
@@ -249,15 +379,9 @@ class ProductDetailsReportSerializer(serializers.ModelSerializer):
             'supplier_invoice_number',  # Valid field path
             'supplier_name',  # Valid field path
             'product_detail',  # Valid field path
-            'manufacturing_date',
             'expiry_date',
             'quantity',
-            'purchased_quantity',
             'remaining_quantity',
             'outward_qty',
         ]
 
-    def get_outward_qty(self, obj):
-        outward_qty = ProductOutTransactionDetail.objects.filter(product=obj.product).aggregate(total_out=Sum('qty_requested'))['total_out']
-        return outward_qty if outward_qty else 0
-
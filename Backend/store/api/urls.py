@@ -1,13 +1,22 @@
+from django.conf import settings
 from django.urls import path
 from .views import (
     DashboardView, InventoryListView, ProductInTransactionUpdateView, ProductOutTransactionListCreateView, ReportView, SupplierListCreateView, SupplierDetailView,
     CategoryListCreateView, CategoryDetailView,
     BrandListCreateView, BrandDetailView,
-    ProductListCreateView, ProductDetailView, GetTotalStockView, ProductCodeSearchView,
+    ProductListCreateView, ProductDetailView, GetTotalStockView, ProductCodeSearchView, ProductImportView, ProductScanView,
+    ProductBarcodeView, LabelSheetView,
     BranchListCreateView, BranchDetailView,
-    ProductInTransactionListCreateView, ProductInTransactionDetailView,ExpiredProductListView, RemoveExpiredProductView, RemoveDefectiveProductView, TrackedExpiredProductListView, TransactionView
+    ProductInTransactionListCreateView, ProductInTransactionDetailView,ExpiredProductListView, RemoveExpiredProductView, RemoveDefectiveProductView, BatchRemoveProductView, TrackedExpiredProductListView, TransactionView
 )
 
+if settings.ASYNC_READ_VIEWS:
+    # Served under ASGI, the read-heavy endpoints wait on the database without holding a thread
+    from .async_views import (
+        AsyncDashboardView as DashboardView, AsyncInventoryListView as InventoryListView,
+        AsyncReportView as ReportView, AsyncTransactionView as TransactionView,
+    )
+
 urlpatterns = [
     
     path('dashboard/', DashboardView.as_view(), name='dashboard'),
@@ -29,6 +38,10 @@ urlpatterns = [
     path('products/<int:pk>/', ProductDetailView.as_view(), name='product-detail'),
     path('products/<str:product_code>/total_stock/', GetTotalStockView.as_view(), name='get_total_stock'),
     path('products/search_codes/', ProductCodeSearchView.as_view(), name='search_product_codes'),
+    path('scan/<str:barcode>/', ProductScanView.as_view(), name='product-scan'),
+    path('products/import/', ProductImportView.as_view(), name='product-import'),
+    path('products/<int:pk>/barcode.<str:image_format>', ProductBarcodeView.as_view(), name='product-barcode'),
+    path('products/labels/', LabelSheetView.as_view(), name='product-labels'),
 
     # Branch URLs
     path('branches/', BranchListCreateView.as_view(), name='branch-list-create'),
@@ -59,6 +72,7 @@ urlpatterns = [
     path('expired-products/', ExpiredProductListView.as_view(), name='expired-product-list'),
     path('remove-expired-product/', RemoveExpiredProductView.as_view(), name='remove-expired-product'),
     path('remove-defective-product/', RemoveDefectiveProductView.as_view(), name='remove-defective-product'),
+    path('remove-products/batch/', BatchRemoveProductView.as_view(), name='remove-products-batch'),
     path('tracked-expired-products/', TrackedExpiredProductListView.as_view(), name='tracked-expired-products'),
 
 
@@ -1,16 +1,29 @@
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
 from django.utils import timezone
 from rest_framework import generics, status
 from rest_framework.response import Response
 from store.models import (
     ProductOutTransactionDetail, Customer, Category, Brand, Product, Branch,
-    ProductInTransaction, ProductInTransactionDetail, TotalStock, ProductOutTransaction, ExpiredProduct, DefectiveProduct
+    ProductInTransaction, ProductInTransactionDetail, TotalStock, ProductOutTransaction, ExpiredProduct, DefectiveProduct,
+    StockMovement, DailySalesRollup, DailyOutwardRollup, LotAllocation, write_off_stock
 )
 from .serializers import (
     BranchWiseReportSerializer, ExpiredProductReportSerializer, ExpiredProductSerializer, FullTransactionDetailSerializer, InwardQtyReportSerializer, OutwardQtyReportSerializer, ProductDetailsReportSerializer, ProductInTransactionDetailSerializer, SupplierSerializer, CategorySerializer, BrandSerializer, ProductSerializer, BranchSerializer,
-    ProductInTransactionSerializer, InventorySerializer, ProductOutTransactionSerializer, DefectiveProductSerializer, SupplierWiseReportSerializer
+    ProductInTransactionSerializer, InventorySerializer, ProductOutTransactionSerializer, DefectiveProductSerializer, SupplierWiseReportSerializer, StockWriteOffBatchSerializer, LabelSheetSerializer
 )
 from rest_framework.views import APIView
 from rest_framework import generics
+from rest_framework.parsers import MultiPartParser, FormParser
+from store.barcodes import BARCODE_FORMATS, build_label_pdf, cached_barcode_path
+from store.importers import ImportFormatError, ProductImporter, read_product_rows
+from store.dashboard import get_dashboard_snapshot
+from store.scan import scan_barcode
+from store.search import search_products
+from .exports import EXPORT_FORMATS, iter_values, streaming_export
+from .pagination import OptInCursorPagination
+import itertools
+import csv
+import zipfile
 from django.db.models import F, Value, Case, When, IntegerField
 from django.db import transaction
 from django.db.models import Sum
@@ -20,21 +33,7 @@ from rest_framework.generics import GenericAPIView
 
 class DashboardView(APIView):
     def get(self, request):
-        total_orders = ProductInTransaction.objects.count()
-        pending_orders = ProductInTransaction.objects.filter(is_delivered=False).count()
-        completed_orders = ProductInTransaction.objects.filter(is_delivered=True).count()
-
-        # Calculate total revenue from completed transactions
-        total_revenue = ProductInTransactionDetail.objects.filter(
-            transaction__is_delivered=True
-        ).aggregate(total=Sum('total'))['total'] or 0.0
-
-        return Response({
-            'total_orders': total_orders,
-            'pending_orders': pending_orders,
-            'completed_orders': completed_orders,
-            'total_revenue': total_revenue,
-        })
+        return Response(get_dashboard_snapshot())
 
 # Supplier Views
 class SupplierListCreateView(generics.ListCreateAPIView):
@@ -65,8 +64,9 @@ class BrandDetailView(generics.RetrieveUpdateDestroyAPIView):
 
 # Product Views
 class ProductListCreateView(generics.ListCreateAPIView):
-    queryset = Product.objects.select_related('brand', 'category').all()
+    queryset = Product.objects.select_related('brand', 'category', 'image_asset').all()
     serializer_class = ProductSerializer
+    pagination_class = OptInCursorPagination
 
 class ProductDetailView(generics.RetrieveUpdateDestroyAPIView):
     queryset = Product.objects.all()
@@ -83,6 +83,24 @@ class ProductDetailView(generics.RetrieveUpdateDestroyAPIView):
         
         instance.delete()
 
+# Bulk product import from a CSV or XLSX upload
+class ProductImportView(APIView):
+    parser_classes = [MultiPartParser, FormParser]
+
+    def post(self, request, format=None):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'No file provided'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            report = ProductImporter().run(read_product_rows(upload))
+        except ImportFormatError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except (UnicodeDecodeError, csv.Error, zipfile.BadZipFile):
+            return Response({'error': 'The file could not be read'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(report, status=status.HTTP_200_OK)
+
 # Get total stock of a product
 class GetTotalStockView(APIView):
     def get(self, request, product_code, format=None):
@@ -93,14 +111,67 @@ class GetTotalStockView(APIView):
         except (Product.DoesNotExist, TotalStock.DoesNotExist):
             return Response({'error': 'Product not found or stock not available'}, status=status.HTTP_404_NOT_FOUND)
 
+# Barcode scan at the counter: product, price and stock, served from the scan cache when possible
+class ProductScanView(APIView):
+    def get(self, request, barcode, format=None):
+        product = scan_barcode(barcode)
+        if product is None:
+            return Response({'error': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(product, status=status.HTTP_200_OK)
+
+class BinaryResponseView(APIView):
+    # Success responses are files, so don't refuse image/* or application/pdf Accept headers;
+    # error responses still render as JSON
+    def perform_content_negotiation(self, request, force=False):
+        return super().perform_content_negotiation(request, force=True)
+
+
+class ProductBarcodeView(BinaryResponseView):
+    def get(self, request, pk, image_format):
+        if image_format not in BARCODE_FORMATS:
+            return Response({'error': f"Unsupported format. Use one of: {', '.join(BARCODE_FORMATS)}."}, status=status.HTTP_400_BAD_REQUEST)
+        code = Product.objects.filter(pk=pk).values_list('barcode', flat=True).first()
+        if not code:
+            return Response({'error': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        path, key = cached_barcode_path(code, image_format)
+        etag = f'"{key}"'
+        if etag in request.headers.get('If-None-Match', ''):
+            response = HttpResponseNotModified()
+        else:
+            response = FileResponse(open(path, 'rb'), content_type=BARCODE_FORMATS[image_format])
+        response['ETag'] = etag
+        response['Cache-Control'] = 'public, max-age=86400'
+        return response
+
+
+class LabelSheetView(BinaryResponseView):
+    def post(self, request):
+        serializer = LabelSheetSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data['items']
+
+        products = Product.objects.only('name', 'product_code', 'barcode', 'price').in_bulk({item['product_id'] for item in items})
+        missing = sorted({item['product_id'] for item in items} - products.keys())
+        if missing:
+            return Response({'error': 'Products not found', 'product_ids': missing}, status=status.HTTP_400_BAD_REQUEST)
+
+        labels = []
+        for item in items:
+            product = products[item['product_id']]
+            labels.extend([(product.barcode, product.name, product.product_code, str(product.price))] * item['copies'])
+
+        response = HttpResponse(build_label_pdf(labels), content_type='application/pdf')
+        response['Content-Disposition'] = 'attachment; filename="labels.pdf"'
+        return response
+
 # Search product codes
 class ProductCodeSearchView(APIView):
     def get(self, request, format=None):
         query = request.GET.get('query', '')
         if query:
-            products = Product.objects.filter(product_code__icontains=query)[:10]
-            product_codes = products.values('product_code')
-            return Response(product_codes, status=status.HTTP_200_OK)
+            # Code/barcode prefixes and fuzzy name matches, ranked, with current stock
+            return Response(search_products(query), status=status.HTTP_200_OK)
         return Response({'error': 'No query provided'}, status=status.HTTP_400_BAD_REQUEST)
 
 # Branch Views
@@ -122,14 +193,39 @@ class ProductInTransactionDetailView(generics.RetrieveUpdateDestroyAPIView):
     queryset = ProductInTransaction.objects.all()
     serializer_class = ProductInTransactionSerializer
 
-    def perform_destroy(self, instance):
-        # Decrease stock from TotalStock when a transaction is deleted
-        for detail in instance.transaction_details.all():
-            product_total_stock = TotalStock.objects.get(product=detail.product)
-            product_total_stock.total_quantity -= detail.quantity
-            product_total_stock.save()
-        
-        instance.delete()
+    def destroy(self, request, *args, **kwargs):
+        instance = self.get_object()
+
+        with transaction.atomic():
+            # Lock the lots so nothing is dispatched or written off from them while they are reversed
+            lots = list(
+                ProductInTransactionDetail.objects.select_for_update().filter(transaction=instance)
+                .values_list('id', 'product_id', 'remaining_quantity')
+            )
+            # Deleting the lots would take the dispatches' allocations with them
+            if LotAllocation.objects.filter(in_detail__transaction=instance).exists():
+                return Response(
+                    {'error': 'Stock from this transaction has already been dispatched.'}, status=status.HTTP_400_BAD_REQUEST
+                )
+
+            # Lots from before the ledger have a zero 'in' row (migration 0004), but their stock is in
+            # TotalStock all the same, so any 'in' row counts as booked
+            booked = set(instance.stock_movements.filter(movement_type=StockMovement.IN).values_list('in_detail_id', flat=True))
+
+            # Only what is still on hand is reversed; written-off stock already left the ledger
+            StockMovement.objects.record([
+                StockMovement(
+                    product_id=product_id,
+                    movement_type=StockMovement.ADJUSTMENT,
+                    quantity=-remaining,
+                    remarks=f"Reversal of in transaction {instance.id}",
+                )
+                for detail_id, product_id, remaining in lots
+                if detail_id in booked
+            ])
+            instance.delete()
+
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 class ProductInTransactionUpdateView(generics.UpdateAPIView):
@@ -148,6 +244,7 @@ class ProductInTransactionUpdateView(generics.UpdateAPIView):
 
 class InventoryListView(generics.ListAPIView):
     serializer_class = InventorySerializer
+    pagination_class = OptInCursorPagination
 
     def get_queryset(self):
         # Get the current date
@@ -157,7 +254,7 @@ class InventoryListView(generics.ListAPIView):
         exceeded_delivery = self.request.query_params.get('exceeded_delivery')
 
         queryset = ProductInTransactionDetail.objects.select_related(
-            'product', 'product__category', 'product__brand',
+            'product', 'product__category', 'product__brand', 'product__image_asset',
             'transaction', 'transaction__customer',
         ).annotate(
             product_code=F('product__product_code'),
@@ -174,8 +271,9 @@ class InventoryListView(generics.ListAPIView):
         if exceeded_delivery == "true":
             queryset = queryset.filter(delivery_date__lt=current_date)
 
-        # Filter to only show items where delivery is false
-        queryset = queryset.filter(transaction__is_delivered=False)
+        # Filter to only show items where delivery is false. As a subquery the pending transactions
+        # are read from their partial index and drive the join, instead of scanning every line
+        queryset = queryset.filter(transaction__in=ProductInTransaction.objects.filter(is_delivered=False))
 
         return queryset
 
@@ -186,7 +284,7 @@ class TransactionView(GenericAPIView):
         if supplier_invoice_number:
             # Fetch transaction by supplier_invoice_number and check is_delivered field
             try:
-                transaction = ProductInTransaction.objects.prefetch_related('transaction_details').get(
+                transaction = ProductInTransaction.objects.with_details().get(
                     supplier_invoice_number=supplier_invoice_number,
                     is_delivered=False  # Only fetch if is_delivered is False
                 )
@@ -204,16 +302,22 @@ class TransactionView(GenericAPIView):
 
 # Product Transaction Out format
 class ProductOutTransactionListCreateView(generics.ListCreateAPIView):
-    queryset = ProductOutTransaction.objects.all()
+    queryset = ProductOutTransaction.objects.prefetch_related(
+        'transaction_details__product__category', 'transaction_details__product__brand', 'transaction_details__product__image_asset'
+    )
     serializer_class = ProductOutTransactionSerializer
+    pagination_class = OptInCursorPagination
+
 
 
 
 
 
+# Shared single-product removal of expired or defective stock
+class StockWriteOffView(APIView):
+    movement_type = None
+    success_message = None
 
-# View to remove expired products and track them
-class RemoveExpiredProductView(APIView):
     def post(self, request, *args, **kwargs):
         product_id = request.data.get('product_id')
         qty_to_remove = request.data.get('qty_to_remove', None)
@@ -223,106 +327,52 @@ class RemoveExpiredProductView(APIView):
             return Response({"error": "Product ID and quantity to remove are required."}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            with transaction.atomic():
-                in_transaction_details = ProductInTransactionDetail.objects.filter(product_id=product_id, expiry_date__lt=date.today()).order_by('expiry_date')
-
-                remaining_qty_needed = qty_to_remove
-
-                for detail in in_transaction_details:
-                    if remaining_qty_needed <= 0:
-                        break
-
-                    if detail.remaining_quantity >= remaining_qty_needed:
-                        ExpiredProduct.objects.create(
-                            product_id=product_id,
-                            qty_expired=remaining_qty_needed,
-                            expiry_date=detail.expiry_date,
-                            remarks=remarks
-                        )
-
-                        detail.remaining_quantity -= remaining_qty_needed
-                        detail.save()
-                        remaining_qty_needed = 0
-                    else:
-                        ExpiredProduct.objects.create(
-                            product_id=product_id,
-                            qty_expired=detail.remaining_quantity,
-                            expiry_date=detail.expiry_date,
-                            remarks=remarks
-                        )
-
-                        remaining_qty_needed -= detail.remaining_quantity
-                        detail.remaining_quantity = 0
-                        detail.save()
-
-                # Update total stock after removal
-                total_stock = TotalStock.objects.get(product_id=product_id)
-                total_stock.total_quantity -= qty_to_remove
-                total_stock.save()
-
-            return Response({"success": "Expired product removed from inventory and details tracked."}, status=status.HTTP_200_OK)
-        except ProductInTransactionDetail.DoesNotExist:
-            return Response({"error": "Product not found or already removed."}, status=status.HTTP_404_NOT_FOUND)
+            item = {'product_id': int(product_id), 'qty': int(qty_to_remove), 'remarks': remarks}
+        except (TypeError, ValueError):
+            return Response({"error": "Product ID and quantity to remove must be numbers."}, status=status.HTTP_400_BAD_REQUEST)
+        if item['qty'] <= 0:
+            return Response({"error": "Quantity to remove must be positive."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            result, = write_off_stock(self.movement_type, [item])
         except TotalStock.DoesNotExist:
             return Response({"error": "Total stock not found for this product."}, status=status.HTTP_404_NOT_FOUND)
 
+        if result['status'] != 'removed':
+            return Response({"error": "Product not found or already removed."}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"success": self.success_message}, status=status.HTTP_200_OK)
+
+
 # View to remove defective products and track them
-class RemoveDefectiveProductView(APIView):
-    def post(self, request, *args, **kwargs):
-        product_id = request.data.get('product_id')
-        qty_to_remove = request.data.get('qty_to_remove', None)
-        remarks = request.data.get('remarks', '')
+class RemoveDefectiveProductView(StockWriteOffView):
+    movement_type = StockMovement.DEFECTIVE
+    success_message = "Defective product removed from inventory and details tracked."
 
-        if not product_id or qty_to_remove is None:
-            return Response({"error": "Product ID and quantity to remove are required."}, status=status.HTTP_400_BAD_REQUEST)
+
+# Batch removal of expired or defective stock for many products in one transaction
+class BatchRemoveProductView(APIView):
+    def post(self, request, *args, **kwargs):
+        serializer = StockWriteOffBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
 
         try:
-            with transaction.atomic():
-                in_transaction_details = ProductInTransactionDetail.objects.filter(product_id=product_id).order_by('expiry_date')
-
-                remaining_qty_needed = qty_to_remove
-
-                for detail in in_transaction_details:
-                    if remaining_qty_needed <= 0:
-                        break
-
-                    if detail.remaining_quantity >= remaining_qty_needed:
-                        DefectiveProduct.objects.create(
-                            product_id=product_id,
-                            qty_defective=remaining_qty_needed,
-                            remarks=remarks
-                        )
-
-                        detail.remaining_quantity -= remaining_qty_needed
-                        detail.save()
-                        remaining_qty_needed = 0
-                    else:
-                        DefectiveProduct.objects.create(
-                            product_id=product_id,
-                            qty_defective=detail.remaining_quantity,
-                            remarks=remarks
-                        )
-
-                        remaining_qty_needed -= detail.remaining_quantity
-                        detail.remaining_quantity = 0
-                        detail.save()
-
-                # Update total stock after removal
-                total_stock = TotalStock.objects.get(product_id=product_id)
-                total_stock.total_quantity -= qty_to_remove
-                total_stock.save()
-
-            return Response({"success": "Defective product removed from inventory and details tracked."}, status=status.HTTP_200_OK)
-        except ProductInTransactionDetail.DoesNotExist:
-            return Response({"error": "Product not found or already removed."}, status=status.HTTP_404_NOT_FOUND)
+            results = write_off_stock(serializer.validated_data['type'], serializer.validated_data['items'])
         except TotalStock.DoesNotExist:
-            return Response({"error": "Total stock not found for this product."}, status=status.HTTP_404_NOT_FOUND)
+            return Response({"error": "Total stock not found for one or more products."}, status=status.HTTP_404_NOT_FOUND)
+
+        removed = sum(1 for result in results if result['status'] == 'removed')
+        return Response({
+            'removed': removed,
+            'failed': len(results) - removed,
+            'results': results,
+        }, status=status.HTTP_200_OK)
 
 
 # List view to display all tracked expired products
 class TrackedExpiredProductListView(generics.ListAPIView):
-    queryset = ExpiredProduct.objects.select_related('product').all()
+    queryset = ExpiredProduct.objects.select_related('product__brand', 'product__category').all()
     serializer_class = ExpiredProductSerializer
+    pagination_class = OptInCursorPagination
 
 # List view to display expired products that are still in stock
 from django.db import transaction
@@ -335,76 +385,54 @@ class ExpiredProductListView(generics.ListAPIView):
     def get_queryset(self):
         current_date = timezone.now().date()
         return ProductInTransactionDetail.objects.select_related(
-            'product', 'product__category', 'product__brand', 'transaction', 'transaction__supplier'
+            'product', 'product__category', 'product__brand', 'transaction', 'transaction__customer'
         ).filter(
             expiry_date__lt=current_date,
             remaining_quantity__gt=0  # Ensures only products with remaining stock are shown
         )
 
 # View to remove expired products and mark them as removed
-class RemoveExpiredProductView(APIView):
-    def post(self, request, *args, **kwargs):
-        product_id = request.data.get('product_id')
-        qty_to_remove = request.data.get('qty_to_remove', None)
-        remarks = request.data.get('remarks', '')
-
-        if not product_id or qty_to_remove is None:
-            return Response({"error": "Product ID and quantity to remove are required."}, status=status.HTTP_400_BAD_REQUEST)
-
-        try:
-            with transaction.atomic():
-                in_transaction_details = ProductInTransactionDetail.objects.filter(
-                    product_id=product_id, 
-                    expiry_date__lt=date.today(),
-                    remaining_quantity__gt=0  # Only handle products with remaining stock
-                ).order_by('expiry_date')
-
-                remaining_qty_needed = qty_to_remove
-
-                for detail in in_transaction_details:
-                    if remaining_qty_needed <= 0:
-                        break
-
-                    if detail.remaining_quantity >= remaining_qty_needed:
-                        ExpiredProduct.objects.create(
-                            product_id=product_id,
-                            qty_expired=remaining_qty_needed,
-                            expiry_date=detail.expiry_date,
-                            remarks=remarks
-                        )
-
-                        detail.remaining_quantity -= remaining_qty_needed
-                        detail.save()
-                        remaining_qty_needed = 0
-                    else:
-                        ExpiredProduct.objects.create(
-                            product_id=product_id,
-                            qty_expired=detail.remaining_quantity,
-                            expiry_date=detail.expiry_date,
-                            remarks=remarks
-                        )
-
-                        remaining_qty_needed -= detail.remaining_quantity
-                        detail.remaining_quantity = 0
-                        detail.save()
-
-                # Update total stock after removal
-                total_stock = TotalStock.objects.get(product_id=product_id)
-                total_stock.total_quantity -= qty_to_remove
-                total_stock.save()
-
-            return Response({"success": "Expired product removed from inventory and details tracked."}, status=status.HTTP_200_OK)
-        except ProductInTransactionDetail.DoesNotExist:
-            return Response({"error": "Product not found or already removed."}, status=status.HTTP_404_NOT_FOUND)
-        except TotalStock.DoesNotExist:
-            return Response({"error": "Total stock not found for this product."}, status=status.HTTP_404_NOT_FOUND)
+class RemoveExpiredProductView(StockWriteOffView):
+    movement_type = StockMovement.EXPIRED
+    success_message = "Expired product removed from inventory and details tracked."
         
 
 
 #********************************** Reports **************************************** 
 
 class ReportView(APIView):
+    # Columns of the streamed exports: one row per transaction detail
+    EXPORT_FIELDS = [
+        ('supplier_invoice_number', 'transaction__supplier_invoice_number'),
+        ('customer_name', 'transaction__customer__name'),
+        ('inward_stock_date', 'transaction__inward_stock_date'),
+        ('delivery_date', 'transaction__delivery_date'),
+        ('is_delivered', 'transaction__is_delivered'),
+        ('product_id', 'product_id'),
+        ('product_code', 'product__product_code'),
+        ('product_name', 'product__name'),
+        ('quantity', 'quantity'),
+        ('washing_quantity', 'washing_quantity'),
+        ('total', 'total'),
+    ]
+    # The product details report is one row per lot, with its product's outward total
+    PRODUCT_DETAILS_EXPORT_FIELDS = [
+        ('date', 'transaction__inward_stock_date'),
+        ('supplier_invoice_number', 'transaction__supplier_invoice_number'),
+        ('supplier_name', 'transaction__customer__name'),
+        ('product_detail', 'product__name'),
+        ('expiry_date', 'expiry_date'),
+        ('quantity', 'quantity'),
+        ('remaining_quantity', 'remaining_quantity'),
+        ('outward_qty', 'outward_total'),
+    ]
+
     def get(self, request, report_type=None):
+        # ?export=csv|ndjson streams the report instead of building one JSON response
+        export_format = request.GET.get('export')
+        if export_format:
+            return self.export_report(request, report_type, export_format)
+
         if report_type == 'transaction-in':
             return self.get_transaction_in_report(request)
         elif report_type == 'transaction-out':
@@ -413,18 +441,20 @@ class ReportView(APIView):
             return self.get_sales_report(request)
         elif report_type == 'daily':
             return self.get_daily_report(request)
+        elif report_type == 'product-details':
+            return self.get_product_details_report(request)
         else:
             return Response({'error': 'Invalid report type'}, status=400)
 
     def get_transaction_in_report(self, request):
-        in_transactions = ProductInTransaction.objects.filter(is_delivered=False)
+        in_transactions = ProductInTransaction.objects.with_details().filter(is_delivered=False)
         serializer = FullTransactionDetailSerializer(in_transactions, many=True)
         return Response({
             'transaction_in': serializer.data
         }, status=200)
 
     def get_transaction_out_report(self, request):
-        out_transactions = ProductInTransaction.objects.filter(is_delivered=True)
+        out_transactions = ProductInTransaction.objects.with_details().filter(is_delivered=True)
         serializer = FullTransactionDetailSerializer(out_transactions, many=True)
         return Response({
             'transaction_out': serializer.data
@@ -437,27 +467,47 @@ class ReportView(APIView):
         if not start_date or not end_date:
             return Response({'error': 'Please provide both start_date and end_date'}, status=400)
 
-        sales_transactions = ProductInTransactionDetail.objects.filter(
-            transaction__is_delivered=True,
-            transaction__inward_stock_date__range=[start_date, end_date]
-        )
-        total_sales = sales_transactions.aggregate(Sum('total'))['total__sum'] or 0
+        # Read from the daily rollup: one row per day, product and customer instead of every line
+        rollups = DailySalesRollup.objects.filter(day__range=[start_date, end_date])
+        total_sales = rollups.aggregate(Sum('total'))['total__sum'] or 0
+
+        # ?breakdown=daily skips the line-level details for the rollup's per-day rows
+        if request.GET.get('breakdown') == 'daily':
+            return Response({
+                'total_sales': total_sales,
+                'daily_sales': list(self.daily_sales(rollups))
+            }, status=200)
 
-        serializer = ProductInTransactionDetailSerializer(sales_transactions, many=True)
+        serializer = ProductInTransactionDetailSerializer(self.sales_details(start_date, end_date), many=True)
         return Response({
             'total_sales': total_sales,
             'sales_details': serializer.data
         }, status=200)
 
+    @staticmethod
+    def sales_details(start_date, end_date):
+        return ProductInTransactionDetail.objects.select_related('product').filter(
+            transaction__is_delivered=True,
+            transaction__inward_stock_date__range=[start_date, end_date]
+        ).order_by('id')
+
+    @staticmethod
+    def daily_sales(rollups):
+        return rollups.values('day', 'product_id', 'customer_id').annotate(
+            product_name=F('product__name'),
+            customer_name=F('customer__name'),
+            quantity_sold=Sum('quantity'),
+            sales_total=Sum('total'),
+        ).order_by('day', 'product_id', 'customer_id')
+
     def get_daily_report(self, request):
         today = timezone.now().date()
 
-        transactions_in = ProductInTransaction.objects.filter(inward_stock_date=today)
-        transactions_out = ProductInTransaction.objects.filter(delivery_date=today, is_delivered=True)
+        transactions_in = ProductInTransaction.objects.with_details().filter(inward_stock_date=today)
+        transactions_out = ProductInTransaction.objects.with_details().filter(delivery_date=today, is_delivered=True)
 
-        sales_today = ProductInTransactionDetail.objects.filter(
-            transaction__is_delivered=True,
-            transaction__delivery_date=today
+        sales_today = DailySalesRollup.objects.filter(
+            delivery_date=today
         ).aggregate(Sum('total'))['total__sum'] or 0
 
         in_serializer = FullTransactionDetailSerializer(transactions_in, many=True)
@@ -466,5 +516,63 @@ class ReportView(APIView):
         return Response({
             'transactions_in_today': in_serializer.data,
             'transactions_out_today': out_serializer.data,
-            'total_sales_today': sales_today
-        }, status=200)
\ No newline at end of file
+            'total_sales_today': sales_today,
+            'outward_today': list(self.outward(today))
+        }, status=200)
+
+    @staticmethod
+    def outward(day):
+        return DailyOutwardRollup.objects.filter(day=day).values(
+            'branch_id', 'product_id', 'quantity', branch_name=F('branch__name'), product_name=F('product__name')
+        ).order_by('branch_id', 'product_id')
+
+    def get_product_details_report(self, request):
+        serializer = ProductDetailsReportSerializer(self.product_details(), many=True)
+        return Response({
+            'product_details': serializer.data
+        }, status=200)
+
+    @staticmethod
+    def product_details():
+        # Outward totals are annotated in the same SELECT, so the report is one query
+        return ProductInTransactionDetail.objects.with_outward_totals().order_by('transaction_id', 'id')
+
+    def export_report(self, request, report_type, export_format, values=iter_values, chain=itertools.chain):
+        # The async view passes aiter_values and achain to stream the same rows asynchronously
+        if export_format not in EXPORT_FORMATS:
+            return Response({'error': 'Invalid export format, use csv or ndjson'}, status=400)
+
+        details = ProductInTransactionDetail.objects.order_by('transaction_id', 'id')
+        fields = self.EXPORT_FIELDS
+        extra = ()
+
+        if report_type == 'transaction-in':
+            rows = values(details.filter(transaction__is_delivered=False), self.EXPORT_FIELDS)
+        elif report_type == 'transaction-out':
+            rows = values(details.filter(transaction__is_delivered=True), self.EXPORT_FIELDS)
+        elif report_type == 'sales':
+            start_date = request.GET.get('start_date')
+            end_date = request.GET.get('end_date')
+
+            if not start_date or not end_date:
+                return Response({'error': 'Please provide both start_date and end_date'}, status=400)
+
+            rows = values(details.filter(
+                transaction__is_delivered=True,
+                transaction__inward_stock_date__range=[start_date, end_date]
+            ), self.EXPORT_FIELDS)
+        elif report_type == 'daily':
+            today = timezone.now().date()
+            extra = (('section', None),)
+            rows = chain(
+                values(details.filter(transaction__inward_stock_date=today), self.EXPORT_FIELDS, extra=(('section', 'in'),)),
+                values(details.filter(transaction__delivery_date=today, transaction__is_delivered=True), self.EXPORT_FIELDS, extra=(('section', 'out'),)),
+            )
+        elif report_type == 'product-details':
+            fields = self.PRODUCT_DETAILS_EXPORT_FIELDS
+            rows = values(self.product_details(), fields)
+        else:
+            return Response({'error': 'Invalid report type'}, status=400)
+
+        headers = [header for header, _ in extra] + [header for header, _ in fields]
+        return streaming_export(rows, headers, export_format, f'{report_type}-report')
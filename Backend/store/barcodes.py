@@ -0,0 +1,136 @@
+import hashlib
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+from multiprocessing import get_context
+
+import barcode
+from barcode.writer import ImageWriter, SVGWriter
+from django.conf import settings
+from PIL import Image, ImageDraw, ImageFont
+
+BARCODE_FORMATS = {
+    'svg': 'image/svg+xml',
+    'png': 'image/png',
+}
+# Bump when the rendering below changes, so cached files are not reused
+RENDER_VERSION = 1
+PNG_OPTIONS = {'module_width': 0.3, 'module_height': 15, 'font_size': 10, 'text_distance': 4, 'quiet_zone': 3, 'dpi': 300}
+
+# Label sheet: A4 at 300 dpi, 3 x 8 labels of 63.5 x 33.9 mm
+DPI = 300
+PAGE_SIZE = (2480, 3508)
+COLUMNS, ROWS = 3, 8
+LABEL_SIZE = (750, 400)
+PAGE_MARGIN = (115, 154)
+LABELS_PER_PAGE = COLUMNS * ROWS
+
+
+def symbology(code):
+    # Valid EAN-13 codes are printed as such; anything else falls back to Code 128
+    if len(code) == 13 and code.isdigit() and barcode.get('ean13', code).get_fullcode() == code:
+        return 'ean13'
+    return 'code128'
+
+
+def render_barcode(code, image_format):
+    if image_format == 'svg':
+        return barcode.get(symbology(code), code, writer=SVGWriter()).render()
+    output = BytesIO()
+    barcode.get(symbology(code), code, writer=ImageWriter(mode='1')).render(PNG_OPTIONS).save(output, 'PNG')
+    return output.getvalue()
+
+
+def cached_barcode_path(code, image_format):
+    """
+    Return the path of ``code`` rendered as ``image_format``, rendering it on a cache miss.
+
+    Files are named by a hash of everything that affects the output, so they never
+    need invalidating; a product whose barcode changes simply maps to another file.
+    Files are written to a temporary name and renamed, so readers never see a partial one.
+    """
+    key = hashlib.sha256(f'{RENDER_VERSION}:{image_format}:{code}'.encode()).hexdigest()
+    path = os.path.join(settings.BARCODE_CACHE_DIR, key[:2], f'{key}.{image_format}')
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temporary = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as output:
+            output.write(render_barcode(code, image_format))
+        os.replace(temporary, path)
+    return path, key
+
+
+@lru_cache(maxsize=1024)
+def _label_barcode(code):
+    image = barcode.get(symbology(code), code, writer=ImageWriter(mode='1')).render(
+        {'module_width': 0.25, 'module_height': 9, 'font_size': 7, 'text_distance': 3, 'quiet_zone': 2, 'dpi': DPI}
+    )
+    image.thumbnail((LABEL_SIZE[0] - 40, 260))
+    return image
+
+
+@lru_cache(maxsize=4)
+def _font(size):
+    return ImageFont.load_default(size=size)
+
+
+def _fit(draw, text, font, width):
+    while text and draw.textlength(text, font=font) > width:
+        text = text[:-2] + '…'
+    return text
+
+
+def render_label_page(labels):
+    """
+    Lay out up to ``LABELS_PER_PAGE`` labels on one bilevel page and return its raw bits.
+
+    Each label is a ``(barcode, name, product code, price)`` tuple. This runs in the
+    worker processes, so it touches neither the database nor Django settings.
+    """
+    page = Image.new('1', PAGE_SIZE, 1)
+    draw = ImageDraw.Draw(page)
+    # The page is bilevel anyway; skipping antialiasing halves the text rendering time
+    draw.fontmode = '1'
+    width = LABEL_SIZE[0] - 40
+
+    for index, (code, name, product_code, price) in enumerate(labels):
+        left = PAGE_MARGIN[0] + (index % COLUMNS) * LABEL_SIZE[0] + 20
+        top = PAGE_MARGIN[1] + (index // COLUMNS) * LABEL_SIZE[1] + 16
+
+        draw.text((left, top), _fit(draw, name, _font(34), width), font=_font(34), fill=0)
+        draw.text((left, top + 44), _fit(draw, f'{product_code}   {price}', _font(28), width), font=_font(28), fill=0)
+        if code:
+            page.paste(_label_barcode(code), (left, top + 90))
+
+    # Raw 1-bit pixels are about 1 MB a page and cost nothing to encode on the way back
+    return page.tobytes()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def label_pool():
+    # One long-lived pool per web process; spawned workers only import this module
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=settings.LABEL_WORKERS, mp_context=get_context('spawn'))
+        return _pool
+
+
+def build_label_pdf(labels):
+    """Render ``labels`` onto A4 pages, one page per worker task, and return a single PDF."""
+    pages = [labels[start:start + LABELS_PER_PAGE] for start in range(0, len(labels), LABELS_PER_PAGE)] or [[]]
+    if settings.LABEL_WORKERS > 1 and len(pages) > 1:
+        rendered = list(label_pool().map(render_label_page, pages))
+    else:
+        rendered = [render_label_page(page) for page in pages]
+
+    images = [Image.frombytes('1', PAGE_SIZE, content) for content in rendered]
+    output = BytesIO()
+    images[0].save(output, 'PDF', resolution=DPI, save_all=True, append_images=images[1:])
+    return output.getvalue()
@@ -0,0 +1,210 @@
+import json
+import time
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from account.api import urls as account_urls
+from store.api import urls as store_urls
+from store.models import Branch, Brand, Category, Customer, Product, ProductInTransaction, ProductInTransactionDetail, TotalStock
+from store.scan import scan_cache
+
+BASELINE_PATH = Path(__file__).with_name('endpoint_budgets.json')
+
+# A run may take TIME_TOLERANCE times the baseline wall time plus TIME_SLACK_MS before it fails;
+# the slack keeps millisecond endpoints from failing on scheduler noise
+TIME_TOLERANCE = 3.0
+TIME_SLACK_MS = 25
+
+
+class Endpoint:
+    def __init__(self, name, route, method, path, data=None, format='json'):
+        self.name = name
+        self.route = route
+        self.method = method
+        self.path = path
+        self.data = data
+        self.format = format
+
+
+def budget_fixtures():
+    """Pick the existing rows the endpoint requests refer to, and an API user to act as."""
+    user, _ = get_user_model().objects.get_or_create(username='budget', defaults={'is_staff': True, 'is_superuser': True})
+    user.set_password('budget-password')
+    user.save()
+
+    stocked = TotalStock.objects.filter(total_quantity__gt=10).select_related('product').order_by('product_id').first()
+    expired_lot = ProductInTransactionDetail.objects.filter(expiry_date__lt=time.strftime('%Y-%m-%d'), remaining_quantity__gt=0).order_by('id').first()
+    return {
+        'user': user,
+        # Refreshing rotates and blacklists its token, so logout gets a token of its own
+        'refresh': str(RefreshToken.for_user(user)),
+        'logout_refresh': str(RefreshToken.for_user(user)),
+        'product': stocked.product,
+        'expired_lot': expired_lot,
+        'pending': ProductInTransaction.objects.filter(is_delivered=False).order_by('id').first(),
+        'in_transaction': ProductInTransaction.objects.order_by('id').first(),
+        'customer': Customer.objects.order_by('id').first(),
+        'category': Category.objects.order_by('id').first(),
+        'brand': Brand.objects.order_by('id').first(),
+        'branch': Branch.objects.order_by('branch_code').first(),
+        'products': list(Product.objects.order_by('id')[:5]),
+    }
+
+
+def budget_endpoints(fixtures):
+    """One request per route and report of the store and account APIs, reads first, then writes."""
+    product, products = fixtures['product'], fixtures['products']
+    pending, branch = fixtures['pending'], fixtures['branch']
+    today = time.strftime('%Y-%m-%d')
+    year_ago = time.strftime('%Y-%m-%d', time.localtime(time.time() - 365 * 86400))
+    csv_rows = 'name,category,brand,unit_type,price\n' + ''.join(f'Budget import {number},Budget,Budget,pieces,9.50\n' for number in range(20))
+
+    reads = [
+        Endpoint('dashboard', 'dashboard', 'get', reverse('dashboard')),
+        Endpoint('supplier list', 'supplier-list-create', 'get', reverse('supplier-list-create')),
+        Endpoint('supplier detail', 'supplier-detail', 'get', reverse('supplier-detail', args=[fixtures['customer'].pk])),
+        Endpoint('category list', 'category-list-create', 'get', reverse('category-list-create')),
+        Endpoint('category detail', 'category-detail', 'get', reverse('category-detail', args=[fixtures['category'].pk])),
+        Endpoint('brand list', 'brand-list-create', 'get', reverse('brand-list-create')),
+        Endpoint('brand detail', 'brand-detail', 'get', reverse('brand-detail', args=[fixtures['brand'].pk])),
+        Endpoint('product list', 'product-list-create', 'get', reverse('product-list-create')),
+        Endpoint('product list, cursor', 'product-list-create', 'get', reverse('product-list-create') + '?pagination=cursor'),
+        Endpoint('product detail', 'product-detail', 'get', reverse('product-detail', args=[product.pk])),
+        Endpoint('total stock', 'get_total_stock', 'get', reverse('get_total_stock', args=[product.product_code])),
+        Endpoint('product search', 'search_product_codes', 'get', reverse('search_product_codes') + '?query=cotton towel'),
+        Endpoint('barcode scan', 'product-scan', 'get', reverse('product-scan', args=[product.barcode])),
+        Endpoint('barcode image', 'product-barcode', 'get', reverse('product-barcode', args=[product.pk, 'svg'])),
+        Endpoint('branch list', 'branch-list-create', 'get', reverse('branch-list-create')),
+        Endpoint('branch detail', 'branch-detail', 'get', reverse('branch-detail', args=[branch.branch_code])),
+        Endpoint('in-transaction list', 'product-in-transaction-list-create', 'get', reverse('product-in-transaction-list-create')),
+        Endpoint('in-transaction detail', 'product-in-transaction-detail', 'get', reverse('product-in-transaction-detail', args=[fixtures['in_transaction'].pk])),
+        Endpoint('inventory', 'inventory-list', 'get', reverse('inventory-list')),
+        Endpoint('inventory, overdue', 'inventory-list', 'get', reverse('inventory-list') + '?exceeded_delivery=true'),
+        Endpoint('pending invoices', 'all_supplier_invoices', 'get', reverse('all_supplier_invoices')),
+        Endpoint('transaction by invoice', 'transaction_by_invoice', 'get', reverse('transaction_by_invoice', args=[pending.supplier_invoice_number])),
+        Endpoint('out-transaction list', 'product-out-transaction-list-create', 'get', reverse('product-out-transaction-list-create')),
+        Endpoint('expired products', 'expired-product-list', 'get', reverse('expired-product-list')),
+        Endpoint('tracked expired products', 'tracked-expired-products', 'get', reverse('tracked-expired-products')),
+        Endpoint('report transaction-in', 'report_view', 'get', reverse('report_view', args=['transaction-in'])),
+        Endpoint('report transaction-out', 'report_view', 'get', reverse('report_view', args=['transaction-out'])),
+        Endpoint('report sales', 'report_view', 'get', reverse('report_view', args=['sales']) + f'?start_date={year_ago}&end_date={today}'),
+        Endpoint('report sales, daily', 'report_view', 'get', reverse('report_view', args=['sales']) + f'?start_date={year_ago}&end_date={today}&breakdown=daily'),
+        Endpoint('report daily', 'report_view', 'get', reverse('report_view', args=['daily'])),
+        Endpoint('report product-details', 'report_view', 'get', reverse('report_view', args=['product-details'])),
+        Endpoint('report export', 'report_view', 'get', reverse('report_view', args=['sales']) + f'?start_date={year_ago}&end_date={today}&export=csv'),
+        Endpoint('user details', 'user-details', 'get', reverse('user-details')),
+    ]
+    writes = [
+        Endpoint('supplier create', 'supplier-list-create', 'post', reverse('supplier-list-create'), {
+            'name': 'Budget supplier', 'mobile_number': '9000000000', 'email': 'budget-supplier@example.com', 'location': 'Kochi',
+        }),
+        Endpoint('category create', 'category-list-create', 'post', reverse('category-list-create'), {'name': 'Budget category'}),
+        Endpoint('brand create', 'brand-list-create', 'post', reverse('brand-list-create'), {'name': 'Budget brand'}),
+        Endpoint('product create', 'product-list-create', 'post', reverse('product-list-create'), {
+            'name': 'Budget product', 'category': fixtures['category'].pk, 'brand': fixtures['brand'].pk, 'price': '12.00',
+        }),
+        Endpoint('product import', 'product-import', 'post', reverse('product-import'), {
+            'file': SimpleUploadedFile('products.csv', csv_rows.encode(), content_type='text/csv'),
+        }, format='multipart'),
+        Endpoint('label sheet', 'product-labels', 'post', reverse('product-labels'), {
+            'items': [{'product_id': item.pk, 'copies': 6} for item in products[:4]],
+        }),
+        Endpoint('branch create', 'branch-list-create', 'post', reverse('branch-list-create'), {
+            'name': 'Budget branch', 'location': 'Kochi', 'contact_details': '0484000000',
+        }),
+        Endpoint('in-transaction create', 'product-in-transaction-list-create', 'post', reverse('product-in-transaction-list-create'), {
+            'customer': fixtures['customer'].pk, 'inward_stock_date': today, 'supplier_invoice_number': 'BUDGET-IN', 'delivery_date': today,
+            'transaction_details': [
+                {'product': item.pk, 'delivery_date': today, 'quantity': 5, 'washing_quantity': 0} for item in products
+            ],
+        }),
+        Endpoint('out-transaction create', 'product-out-transaction-list-create', 'post', reverse('product-out-transaction-list-create'), {
+            'branch': branch.branch_code, 'transfer_invoice_number': 'BUDGET-OUT', 'branch_in_charge': 'Budget',
+            'transaction_details': [{'product': item.pk, 'qty_requested': 2} for item in products],
+        }),
+        Endpoint('delivery update', 'update-delivery-status', 'patch', reverse('update-delivery-status', args=[pending.supplier_invoice_number])),
+        Endpoint('remove defective', 'remove-defective-product', 'post', reverse('remove-defective-product'), {
+            'product_id': product.pk, 'qty_to_remove': 1,
+        }),
+        Endpoint('remove batch', 'remove-products-batch', 'post', reverse('remove-products-batch'), {
+            'type': 'defective', 'items': [{'product_id': item.pk, 'qty': 1} for item in products],
+        }),
+        Endpoint('token', 'token_obtain_pair', 'post', reverse('token_obtain_pair'), {'username': 'budget', 'password': 'budget-password'}),
+        Endpoint('token refresh', 'token_refresh', 'post', reverse('token_refresh'), {'refresh': fixtures['refresh']}),
+        Endpoint('login', 'user-login', 'post', reverse('user-login'), {'username': 'budget', 'password': 'budget-password'}),
+        Endpoint('logout', 'logout', 'post', reverse('logout'), {'refresh_token': fixtures['logout_refresh']}),
+    ]
+    if fixtures['expired_lot']:
+        writes.append(Endpoint('remove expired', 'remove-expired-product', 'post', reverse('remove-expired-product'), {
+            'product_id': fixtures['expired_lot'].product_id, 'qty_to_remove': 1,
+        }))
+    return reads + writes
+
+
+def unbudgeted_routes(endpoints):
+    """Names of store and account API routes that no endpoint in ``endpoints`` requests."""
+    routes = {pattern.name for module in (store_urls, account_urls) for pattern in module.urlpatterns}
+    return sorted(routes - {endpoint.route for endpoint in endpoints})
+
+
+def measure_endpoints(endpoints, user):
+    """
+    Request each endpoint once with cold caches and return ``{name: {'queries', 'ms', 'status'}}``.
+
+    Streamed bodies are read inside the measurement, since their queries run while streaming.
+    """
+    client = APIClient()
+    client.force_authenticate(user)
+    results = {}
+    for endpoint in endpoints:
+        cache.clear()
+        scan_cache.invalidate()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = getattr(client, endpoint.method)(endpoint.path, endpoint.data, format=endpoint.format)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - started
+        results[endpoint.name] = {'queries': len(queries), 'ms': round(elapsed * 1000, 1), 'status': response.status_code}
+    return results
+
+
+def budget_violations(results, budgets, check_time=True):
+    """
+    Describe every result that errored, is missing from ``budgets`` or exceeds its budget.
+
+    ``check_time=False`` compares query counts only, for runs on machines unlike the baseline's.
+    """
+    violations = []
+    for name, result in results.items():
+        budget = budgets.get(name)
+        if result['status'] >= 400:
+            violations.append(f"{name}: responded {result['status']}")
+        elif budget is None:
+            violations.append(f"{name}: no baseline")
+        else:
+            if result['queries'] > budget['queries']:
+                violations.append(f"{name}: {result['queries']} queries, budget {budget['queries']}")
+            limit = budget['ms'] * TIME_TOLERANCE + TIME_SLACK_MS
+            if check_time and result['ms'] > limit:
+                violations.append(f"{name}: {result['ms']} ms, budget {limit:.0f} ms")
+    return violations
+
+
+def load_baseline():
+    with open(BASELINE_PATH) as baseline:
+        return json.load(baseline)
+
+
+def save_baseline(baseline):
+    with open(BASELINE_PATH, 'w') as output:
+        json.dump(baseline, output, indent=2, sort_keys=True)
+        output.write('\n')
@@ -0,0 +1,69 @@
+import asyncio
+
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.conf import settings
+
+from store.models import Branch
+from store.notifications import ADMIN_GROUP, STOCK_GROUP, EventBatch, branch_group
+
+
+class StoreEventsConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Pushes stock, delivery and dispatch changes to the frontend, so it need not poll.
+
+    ``ws/store/`` is the staff stream and carries every change; ``ws/store/branches/<code>/``
+    carries stock changes and the out-transactions created for that branch. Clients
+    authenticate with a JWT access token in the ``token`` query parameter (see
+    Backend.websocket_auth); other connections are refused.
+
+    Events are collected for NOTIFICATIONS_COALESCE_MS after the first one arrives and then sent
+    as one message (see store.notifications.EventBatch for its format).
+    """
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.close()
+            return
+
+        branch_code = self.scope['url_route']['kwargs'].get('branch_code')
+        if branch_code is None:
+            if not user.is_staff:
+                await self.close()
+                return
+            self.subscriptions = [ADMIN_GROUP]
+        else:
+            if not await branch_exists(branch_code):
+                await self.close()
+                return
+            self.subscriptions = [STOCK_GROUP, branch_group(branch_code)]
+
+        self.batch = EventBatch()
+        self.flush_task = None
+        for group in self.subscriptions:
+            await self.channel_layer.group_add(group, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        if getattr(self, 'flush_task', None):
+            self.flush_task.cancel()
+        for group in getattr(self, 'subscriptions', []):
+            await self.channel_layer.group_discard(group, self.channel_name)
+
+    async def store_event(self, message):
+        self.batch.add(message['event'])
+        if self.flush_task is None:
+            self.flush_task = asyncio.create_task(self.flush_later())
+
+    async def flush_later(self):
+        await asyncio.sleep(settings.NOTIFICATIONS_COALESCE_MS / 1000)
+        batch, self.batch, self.flush_task = self.batch, EventBatch(), None
+        message = batch.message()
+        if message:
+            await self.send_json(message)
+
+
+@database_sync_to_async
+def branch_exists(branch_code):
+    return Branch.objects.filter(branch_code=branch_code).exists()
@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+
+from store.models import ProductInTransaction, ProductInTransactionDetail
+
+DASHBOARD_CACHE_KEY = 'store:dashboard-snapshot'
+
+
+ORDER_COUNTS = {
+    'total_orders': Count('id'),
+    'pending_orders': Count('id', filter=Q(is_delivered=False)),
+    'completed_orders': Count('id', filter=Q(is_delivered=True)),
+}
+
+
+def build_dashboard_snapshot():
+    counts = ProductInTransaction.objects.aggregate(**ORDER_COUNTS)
+
+    # Calculate total revenue from completed transactions
+    total_revenue = ProductInTransactionDetail.objects.filter(
+        transaction__is_delivered=True
+    ).aggregate(total=Sum('total'))['total'] or 0.0
+
+    return {**counts, 'total_revenue': total_revenue}
+
+
+async def abuild_dashboard_snapshot():
+    counts = await ProductInTransaction.objects.aaggregate(**ORDER_COUNTS)
+    revenue = await ProductInTransactionDetail.objects.filter(transaction__is_delivered=True).aaggregate(total=Sum('total'))
+    return {**counts, 'total_revenue': revenue['total'] or 0.0}
+
+
+def get_dashboard_snapshot():
+    """
+    Return the dashboard figures from the cache, building them on a miss.
+
+    The snapshot is dropped whenever an in transaction or one of its details changes
+    (see store.signals); the timeout only bounds staleness for per-process caches.
+    """
+    return cache.get_or_set(DASHBOARD_CACHE_KEY, build_dashboard_snapshot, settings.DASHBOARD_CACHE_TIMEOUT)
+
+
+async def aget_dashboard_snapshot():
+    """Async get_dashboard_snapshot(), for async views."""
+    snapshot = await cache.aget(DASHBOARD_CACHE_KEY)
+    if snapshot is None:
+        snapshot = await abuild_dashboard_snapshot()
+        await cache.aadd(DASHBOARD_CACHE_KEY, snapshot, settings.DASHBOARD_CACHE_TIMEOUT)
+    return snapshot
+
+
+def invalidate_dashboard_snapshot():
+    cache.delete(DASHBOARD_CACHE_KEY)
@@ -0,0 +1,49 @@
+import hashlib
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+# Longest edge of each generated variant, in pixels
+VARIANT_SIZES = {
+    'thumbnail': 160,
+    'medium': 640,
+}
+# File extension -> Pillow format and encoder options
+VARIANT_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def content_hash(upload):
+    # Read in chunks so large uploads are never held in memory at once
+    digest = hashlib.sha256()
+    upload.seek(0)
+    for chunk in upload.chunks() if hasattr(upload, 'chunks') else iter(lambda: upload.read(65536), b''):
+        digest.update(chunk)
+    upload.seek(0)
+    return digest.hexdigest()
+
+
+def render_variants(source):
+    """
+    Yield ``(variant, extension, bytes)`` for every size and format of the image in ``source``.
+
+    The image is decoded once, rotated upright from its EXIF orientation and flattened
+    onto white, then each size is scaled down from the previous (larger) one.
+    """
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode != 'RGB':
+            background = Image.new('RGB', image.size, 'white')
+            rgba = image.convert('RGBA')
+            background.paste(rgba, mask=rgba.getchannel('A'))
+            image = background
+
+        for variant, edge in sorted(VARIANT_SIZES.items(), key=lambda item: -item[1]):
+            image = image.copy()
+            image.thumbnail((edge, edge), Image.LANCZOS)
+            for extension, (image_format, options) in VARIANT_FORMATS.items():
+                output = BytesIO()
+                image.save(output, image_format, **options)
+                yield variant, extension, output.getvalue()
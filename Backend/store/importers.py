@@ -0,0 +1,187 @@
+import codecs
+import csv
+
+from django.db import IntegrityError, transaction
+from rest_framework import serializers
+
+from store.api.serializers import ProductImportRowSerializer
+from store.models import Category, Brand, Product, BarcodePool, product_code_sequence
+from store.search import index_products
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+def _normalise_header(header):
+    return str(header or '').strip().lower().replace(' ', '_')
+
+
+def _clean_row(row):
+    # Blank cells are dropped so serializer defaults apply; integral XLSX floats lose their ".0"
+    cleaned = {}
+    for key, value in row.items():
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        if value is None or (isinstance(value, str) and not value.strip()):
+            continue
+        cleaned[_normalise_header(key)] = value
+    return cleaned
+
+
+def read_csv_rows(upload):
+    # File iteration yields lines chunk by chunk, so the upload is never read into memory at once
+    reader = csv.DictReader(codecs.iterdecode(upload, 'utf-8-sig'))
+    for row_number, row in enumerate(reader, start=2):
+        yield row_number, _clean_row(row)
+
+
+def read_xlsx_rows(upload):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportFormatError("XLSX import requires openpyxl to be installed.")
+
+    workbook = load_workbook(upload, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        headers = next(rows, None) or ()
+        for row_number, values in enumerate(rows, start=2):
+            if any(value is not None for value in values):
+                yield row_number, _clean_row(dict(zip(headers, values)))
+    finally:
+        workbook.close()
+
+
+def read_product_rows(upload):
+    name = (upload.name or '').lower()
+    if name.endswith('.csv'):
+        return read_csv_rows(upload)
+    if name.endswith('.xlsx'):
+        return read_xlsx_rows(upload)
+    raise ImportFormatError("Unsupported file type. Upload a .csv or .xlsx file.")
+
+
+class ProductImporter:
+    """
+    Imports product rows chunk by chunk with bulk queries.
+
+    Only one chunk of rows is held in memory at a time. Categories and brands are
+    resolved (or created) by name once per chunk, product codes and barcodes are
+    reserved in bulk, and every valid row is written with ``bulk_create``.
+    """
+
+    chunk_size = 500
+
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.errors = []
+        self._categories = {}
+        self._brands = {}
+        self._seen_codes = set()
+        self._seen_barcodes = set()
+        # One serializer instance validates every row, avoiding per-row field setup
+        self._row_serializer = ProductImportRowSerializer()
+
+    def run(self, rows):
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                self._import_chunk(chunk)
+                chunk = []
+        if chunk:
+            self._import_chunk(chunk)
+        return self.report()
+
+    def report(self):
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'failed': len(self.errors),
+            'errors': self.errors,
+        }
+
+    def _import_chunk(self, chunk):
+        self.rows += len(chunk)
+        valid = []
+        for row_number, data in chunk:
+            try:
+                valid.append((row_number, self._row_serializer.run_validation(data)))
+            except serializers.ValidationError as e:
+                self.errors.append({'row': row_number, 'errors': e.detail})
+
+        valid = self._drop_duplicates(valid)
+        if not valid:
+            return
+
+        categories = self._resolve(Category, self._categories, {row['category'] for _, row in valid})
+        brands = self._resolve(Brand, self._brands, {row['brand'] for _, row in valid})
+
+        needs_code = sum(1 for _, row in valid if not row.get('product_code'))
+        needs_barcode = sum(1 for _, row in valid if not row.get('barcode'))
+
+        try:
+            with transaction.atomic():
+                # A supplied barcode still in the pool must never be handed to another product
+                BarcodePool.objects.discard([row['barcode'] for _, row in valid if row.get('barcode')])
+                codes = iter(product_code_sequence.take(needs_code))
+                barcodes = iter(BarcodePool.objects.allocate(needs_barcode) if needs_barcode else [])
+
+                products = Product.objects.bulk_create([
+                    Product(
+                        name=row['name'],
+                        unit_type=row['unit_type'],
+                        price=row['price'],
+                        category_id=categories[row['category']],
+                        brand_id=brands[row['brand']],
+                        product_code=row.get('product_code') or f'P{next(codes)}',
+                        barcode=row.get('barcode') or next(barcodes),
+                    )
+                    for _, row in valid
+                ])
+                # bulk_create skips the post_save signal that keeps the search index in sync
+                index_products(products)
+        except IntegrityError as e:
+            # Products created concurrently can still collide; earlier chunks stay imported
+            self._seen_codes.difference_update(row.get('product_code') for _, row in valid)
+            self._seen_barcodes.difference_update(row.get('barcode') for _, row in valid)
+            self.errors.extend({'row': row_number, 'errors': {'non_field_errors': [str(e)]}} for row_number, _ in valid)
+            return
+        self.created += len(valid)
+
+    def _drop_duplicates(self, valid):
+        # Supplied codes must be unique within the upload and against existing products
+        codes = [row['product_code'] for _, row in valid if row.get('product_code')]
+        barcodes = [row['barcode'] for _, row in valid if row.get('barcode')]
+        existing_codes = set(Product.objects.filter(product_code__in=codes).values_list('product_code', flat=True)) if codes else set()
+        existing_barcodes = set(Product.objects.filter(barcode__in=barcodes).values_list('barcode', flat=True)) if barcodes else set()
+
+        kept = []
+        for row_number, row in valid:
+            errors = {}
+            code, barcode = row.get('product_code'), row.get('barcode')
+            if code and (code in existing_codes or code in self._seen_codes):
+                errors['product_code'] = ["Product with this product code already exists."]
+            if barcode and (barcode in existing_barcodes or barcode in self._seen_barcodes):
+                errors['barcode'] = ["Product with this barcode already exists."]
+            if errors:
+                self.errors.append({'row': row_number, 'errors': errors})
+                continue
+            if code:
+                self._seen_codes.add(code)
+            if barcode:
+                self._seen_barcodes.add(barcode)
+            kept.append((row_number, row))
+        return kept
+
+    def _resolve(self, model, cache, names):
+        missing = names - cache.keys()
+        if missing:
+            cache.update(model.objects.filter(name__in=missing).values_list('name', 'id'))
+            new = missing - cache.keys()
+            if new:
+                model.objects.bulk_create([model(name=name) for name in new], ignore_conflicts=True)
+                cache.update(model.objects.filter(name__in=new).values_list('name', 'id'))
+        return cache
@@ -0,0 +1,210 @@
+import asyncio
+import io
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date, timedelta
+from multiprocessing import get_context
+from urllib.parse import urlsplit
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.urls import reverse
+
+from Backend.db_hooks import install_query_wrapper
+
+# mode: (application, async read views)
+MODES = {
+    'wsgi': ('wsgi', False),
+    'asgi': ('asgi', True),
+    'asgi-sync': ('asgi', False),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the throughput of concurrent read requests (dashboard, inventory, transactions, "
+        "reports) served through Backend.wsgi by a fixed pool of threads, like a threaded WSGI "
+        "server, and through Backend.asgi by one event loop, with the async views (asgi) and with "
+        "the sync ones (asgi-sync). Requests are driven in-process, so HTTP parsing and the server "
+        "itself are left out. --query-latency adds a round trip to every query, to see how a "
+        "database on another host changes the picture. It only reads; seed a scratch database "
+        "first (seed_store) and point DB_NAME at it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', nargs='+', choices=list(MODES), default=list(MODES), help="Deployments to measure, one process each.")
+        parser.add_argument('--concurrency', type=int, default=16, help="Clients, each sending its next request once the last one is answered.")
+        parser.add_argument('--threads', type=int, default=4, help="WSGI worker threads; requests beyond them wait for one.")
+        parser.add_argument('--query-latency', type=float, default=0.0, help="Milliseconds added to every query, spent waiting like a network round trip.")
+        parser.add_argument('--duration', type=float, default=10.0, help="Seconds to measure each deployment for.")
+        parser.add_argument('--path', action='append', dest='paths', help="Request this path (with its query string) instead of the default mix; repeatable.")
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or default_paths()
+        if not paths:
+            raise CommandError("Nothing to request.")
+
+        self.stdout.write(
+            f"{len(paths)} paths, {options['concurrency']} clients, {options['threads']} WSGI threads, "
+            f"{options['query_latency']:g} ms added per query, {options['duration']:g}s per deployment"
+        )
+        for mode in options['modes']:
+            application, async_views = MODES[mode]
+            # Settings (and so the URLconf) are read once per process, so each deployment gets its own
+            os.environ['ASYNC_READ_VIEWS'] = str(async_views)
+            connections.close_all()
+            with ProcessPoolExecutor(1, mp_context=get_context('spawn'), initializer=django.setup) as pool:
+                latencies, failures, elapsed = pool.submit(
+                    run_clients, application, paths, options['concurrency'], options['threads'], options['query_latency'], options['duration']
+                ).result()
+            self.report(mode, latencies, failures, elapsed)
+
+    def report(self, mode, latencies, failures, elapsed):
+        if not latencies:
+            self.stdout.write(self.style.WARNING(f"{mode:<10} no successful requests, e.g. {failures[0] if failures else 'none sent'}"))
+            return
+        latencies.sort()
+        self.stdout.write(
+            f"{mode:<10} {len(latencies)} requests in {elapsed:.1f}s ({len(latencies) / elapsed:.1f}/s); "
+            f"latency p50 {statistics.median(latencies) * 1000:.1f} ms, "
+            f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f} ms"
+        )
+        if failures:
+            self.stdout.write(self.style.WARNING(f"{' ' * 10} {len(failures)} failed requests, e.g. {failures[0]}"))
+
+
+def default_paths():
+    from store.models import ProductInTransaction
+
+    today = date.today()
+    month_ago = today - timedelta(days=30)
+    paths = [
+        reverse('dashboard'),
+        reverse('inventory-list'),
+        reverse('inventory-list') + '?pagination=cursor',
+        reverse('inventory-list') + '?exceeded_delivery=true',
+        reverse('all_supplier_invoices'),
+        reverse('report_view', args=['daily']),
+        reverse('report_view', args=['sales']) + f'?start_date={month_ago}&end_date={today}',
+    ]
+    pending = ProductInTransaction.objects.filter(is_delivered=False).order_by('id').first()
+    if pending:
+        paths.append(reverse('transaction_by_invoice', args=[pending.supplier_invoice_number]))
+    return paths
+
+
+def run_clients(application, paths, concurrency, threads, query_latency, duration):
+    """Request ``paths`` round-robin for ``duration`` seconds; return latencies, failures and elapsed time."""
+    if query_latency:
+        install_query_wrapper(delayed_query(query_latency / 1000))
+    requests = [urlsplit(path) for path in paths]
+    if application == 'wsgi':
+        result = run_wsgi(requests, concurrency, threads, duration)
+    else:
+        result = asyncio.run(run_asgi(requests, concurrency, duration))
+    connections.close_all()
+    return result
+
+
+def delayed_query(seconds):
+    def wrapper(execute, sql, params, many, context):
+        time.sleep(seconds)
+        return execute(sql, params, many, context)
+    return wrapper
+
+
+def run_wsgi(requests, concurrency, threads, duration):
+    from Backend.wsgi import application
+
+    def client(number):
+        latencies, failures = [], []
+        while time.perf_counter() < deadline:
+            url = requests[number % len(requests)]
+            number += concurrency
+            started = time.perf_counter()
+            status = workers.submit(wsgi_get, application, url).result()
+            if status < 400:
+                latencies.append(time.perf_counter() - started)
+            else:
+                failures.append(f'{url.geturl()} responded {status}')
+        return latencies, failures
+
+    started = time.perf_counter()
+    deadline = started + duration
+    with ThreadPoolExecutor(threads) as workers, ThreadPoolExecutor(concurrency) as clients:
+        results = list(clients.map(client, range(concurrency)))
+    return merge(results, time.perf_counter() - started)
+
+
+def wsgi_get(application, url):
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': url.path, 'QUERY_STRING': url.query,
+        'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1', 'HTTP_HOST': 'localhost',
+        'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+    }
+    status = []
+    body = application(environ, lambda line, headers, exc_info=None: status.append(int(line.split()[0])))
+    try:
+        for _ in body:
+            pass
+    finally:
+        # Fires request_finished, like a server would
+        body.close()
+    return status[0]
+
+
+async def run_asgi(requests, concurrency, duration):
+    from Backend.asgi import application
+
+    async def client(number):
+        latencies, failures = [], []
+        while time.perf_counter() < deadline:
+            url = requests[number % len(requests)]
+            number += concurrency
+            started = time.perf_counter()
+            status = await asgi_get(application, url)
+            if status < 400:
+                latencies.append(time.perf_counter() - started)
+            else:
+                failures.append(f'{url.geturl()} responded {status}')
+        return latencies, failures
+
+    started = time.perf_counter()
+    deadline = started + duration
+    results = await asyncio.gather(*(client(number) for number in range(concurrency)))
+    return merge(results, time.perf_counter() - started)
+
+
+async def asgi_get(application, url):
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': url.path, 'raw_path': url.path.encode(), 'query_string': url.query.encode(),
+        'headers': [(b'host', b'localhost')], 'server': ('localhost', 80), 'client': ('127.0.0.1', 0),
+    }
+    received = asyncio.Event()
+    status = []
+
+    async def receive():
+        if not received.is_set():
+            received.set()
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # The client never disconnects
+        await asyncio.Future()
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+
+    await application(scope, receive, send)
+    return status[0]
+
+
+def merge(results, elapsed):
+    latencies = [latency for client_latencies, _ in results for latency in client_latencies]
+    failures = [failure for _, client_failures in results for failure in client_failures]
+    return latencies, failures, elapsed
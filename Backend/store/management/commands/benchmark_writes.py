@@ -0,0 +1,126 @@
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from multiprocessing import get_context
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+
+from store.api.serializers import ProductInTransactionSerializer, ProductOutTransactionSerializer
+from store.models import Branch, Brand, Category, Customer, Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure write throughput of the configured database profile (DB_PROFILE) with concurrent "
+        "intake and dispatch transactions. It writes benchmark rows, so run it against a scratch "
+        "database, e.g. DB_NAME=/tmp/bench.sqlite3 after migrate, using a fresh file per SQLite profile."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4, help="Concurrent writer processes.")
+        parser.add_argument('--operations', type=int, default=100, help="Transactions per writer.")
+        parser.add_argument('--noinput', '--no-input', action='store_false', dest='interactive', help="Do not ask for confirmation.")
+
+    def handle(self, *args, **options):
+        if options['interactive']:
+            answer = input(f"This writes benchmark data to {connection.settings_dict['NAME']!r}. Type 'yes' to continue: ")
+            if answer != 'yes':
+                raise CommandError("Benchmark cancelled.")
+
+        fixtures = setup_fixtures()
+        # Writers are separate processes, like web workers, so they contend for the database and not the GIL
+        connections.close_all()
+        with ProcessPoolExecutor(options['processes'], mp_context=get_context('spawn'), initializer=django.setup) as pool:
+            # Wait for every worker to start before timing
+            list(pool.map(time.sleep, [0.1] * options['processes']))
+            started = time.perf_counter()
+            results = list(pool.map(run_writer, [fixtures] * options['processes'], range(options['processes']), [options['operations']] * options['processes']))
+            elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency for worker_latencies, _ in results for latency in worker_latencies)
+        failures = [failure for _, worker_failures in results for failure in worker_failures]
+
+        self.stdout.write(f"Profile: {settings.DB_PROFILE} ({connection.vendor}), {options['processes']} writer processes")
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                journal_mode, = cursor.execute('PRAGMA journal_mode').fetchone()
+            self.stdout.write(f"Journal mode: {journal_mode}")
+        if latencies:
+            self.stdout.write(
+                f"Committed {len(latencies)} transactions in {elapsed:.2f}s ({len(latencies) / elapsed:.1f}/s); "
+                f"latency p50 {statistics.median(latencies) * 1000:.1f} ms, "
+                f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f} ms"
+            )
+        if failures:
+            self.stdout.write(self.style.WARNING(f"{len(failures)} transactions failed, e.g. {failures[0]}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("No failed transactions."))
+
+
+def setup_fixtures():
+    category, _ = Category.objects.get_or_create(name='Benchmark')
+    brand, _ = Brand.objects.get_or_create(name='Benchmark')
+    customer, _ = Customer.objects.get_or_create(
+        name='Benchmark supplier', defaults={'mobile_number': '0000000000', 'email': 'bench@example.com', 'location': 'Bench'}
+    )
+    branch = Branch.objects.filter(name='Benchmark branch').first() or Branch.objects.create(
+        name='Benchmark branch', location='Bench', contact_details='0'
+    )
+    products = list(Product.objects.filter(category=category).values_list('id', flat=True)[:20])
+    for number in range(len(products), 20):
+        products.append(Product.objects.create(name=f'Benchmark product {number}', category=category, brand=brand).id)
+    return {'customer': customer.id, 'branch': branch.branch_code, 'products': products}
+
+
+def run_writer(fixtures, number, operations):
+    """Run ``operations`` API write transactions in this worker; return their latencies and failures."""
+    latencies, failures = [], []
+    for operation in range(operations):
+        # Intakes and dispatches alternate; each intake books more than the following dispatch takes
+        serializer = (intake if operation % 2 == 0 else dispatch)(fixtures, number, operation)
+        started = time.perf_counter()
+        try:
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+        except OperationalError as e:
+            failures.append(str(e))
+        else:
+            latencies.append(time.perf_counter() - started)
+    connections.close_all()
+    return latencies, failures
+
+
+def lines(fixtures, number, operation):
+    products = fixtures['products']
+    start = (number * 7 + operation // 2) % len(products)
+    return [products[(start + offset) % len(products)] for offset in range(3)]
+
+
+def intake(fixtures, number, operation):
+    today = date.today().isoformat()
+    return ProductInTransactionSerializer(data={
+        'customer': fixtures['customer'],
+        'inward_stock_date': today,
+        'delivery_date': today,
+        'supplier_invoice_number': f'BENCH-{number}-{operation}',
+        'is_delivered': True,
+        'transaction_details': [
+            {'product': product, 'delivery_date': today, 'quantity': 5, 'washing_quantity': 0}
+            for product in lines(fixtures, number, operation)
+        ],
+    })
+
+
+def dispatch(fixtures, number, operation):
+    return ProductOutTransactionSerializer(data={
+        'branch': fixtures['branch'],
+        'transfer_invoice_number': f'BENCH-{number}-{operation}',
+        'branch_in_charge': 'Benchmark',
+        'transaction_details': [
+            {'product': product, 'qty_requested': 1} for product in lines(fixtures, number, operation)
+        ],
+    })
@@ -0,0 +1,73 @@
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from store.budgets import budget_endpoints, budget_fixtures, budget_violations, load_baseline, measure_endpoints, save_baseline, unbudgeted_routes
+from store.seeding import StoreSeeder
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database at each dataset size, request every API endpoint once and "
+        "compare its query count and latency with the checked-in baseline (store/endpoint_budgets.json)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000], help="In-transaction lines to seed, one run per size.")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed for the generated datasets.")
+        parser.add_argument('--update-baseline', action='store_true', help="Record the measurements as the new baseline instead of checking them.")
+
+    def handle(self, *args, **options):
+        try:
+            baseline = load_baseline()
+        except FileNotFoundError:
+            if not options['update_baseline']:
+                raise CommandError("No baseline yet, run with --update-baseline first.")
+            baseline = {}
+
+        failures = []
+        for rows in options['rows']:
+            results = self.measure(rows, options['seed'])
+            for name, result in results.items():
+                self.stdout.write(f"{rows:>9} rows  {name:<28} {result['status']}  {result['queries']:>4} queries  {result['ms']:>9.1f} ms")
+            if options['update_baseline']:
+                baseline[str(rows)] = {name: {'queries': result['queries'], 'ms': result['ms']} for name, result in results.items()}
+                failures += [f"{rows} rows, {name}: responded {result['status']}" for name, result in results.items() if result['status'] >= 400]
+            elif str(rows) not in baseline:
+                failures.append(f"{rows} rows: no baseline, run with --update-baseline")
+            else:
+                failures += [f"{rows} rows, {violation}" for violation in budget_violations(results, baseline[str(rows)])]
+
+        if failures:
+            raise CommandError("Endpoint budgets exceeded:\n" + "\n".join(failures))
+        if options['update_baseline']:
+            save_baseline(baseline)
+            self.stdout.write(self.style.SUCCESS("Baseline updated."))
+        else:
+            self.stdout.write(self.style.SUCCESS("All endpoints are within budget."))
+
+    def measure(self, rows, seed):
+        # Every size gets its own database, so the budgets never depend on what the real one holds.
+        # SQLite test databases are kept on disk: an in-memory one survives destroy_test_db and
+        # would carry rows over into the next size
+        with tempfile.TemporaryDirectory() as workdir:
+            test_settings = connection.settings_dict['TEST']
+            test_name = test_settings['NAME']
+            if connection.vendor == 'sqlite':
+                test_settings['NAME'] = os.path.join(workdir, f'budget-{rows}.sqlite3')
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=False)
+            try:
+                StoreSeeder(rows, seed=seed).run()
+                with override_settings(BARCODE_CACHE_DIR=os.path.join(workdir, 'barcodes')):
+                    fixtures = budget_fixtures()
+                    endpoints = budget_endpoints(fixtures)
+                    missing = unbudgeted_routes(endpoints)
+                    if missing:
+                        raise CommandError(f"Routes without a budgeted endpoint: {', '.join(missing)}")
+                    return measure_endpoints(endpoints, fixtures['user'])
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=False)
+                test_settings['NAME'] = test_name
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from store.models import Product, ProductImage
+from store.tasks import can_queue_tasks, generate_image_variants
+
+
+class Command(BaseCommand):
+    help = (
+        "Store existing product images by content hash and queue their thumbnail/medium variants. "
+        "Without a Celery broker, pending variants are rendered here instead."
+    )
+
+    def handle(self, *args, **options):
+        # Images attached below are queued by their post_save signal; these were left pending earlier
+        pending = list(ProductImage.objects.filter(variants_ready=False).values_list('pk', flat=True))
+
+        attached = 0
+        for product in Product.objects.filter(image_asset__isnull=True).exclude(image='').exclude(image__isnull=True).iterator():
+            if not product.image.storage.exists(product.image.name):
+                self.stderr.write(f"Skipping product {product.pk}: {product.image.name} is missing.")
+                continue
+            with transaction.atomic(), product.image.open('rb') as upload:
+                image = ProductImage.objects.for_upload(upload)
+                Product.objects.filter(pk=product.pk).update(image_asset=image, image=image.original.name)
+            attached += 1
+        self.stdout.write(self.style.SUCCESS(f"Attached {attached} product images."))
+
+        if can_queue_tasks():
+            for image_id in pending:
+                generate_image_variants.delay(image_id)
+            self.stdout.write(self.style.SUCCESS(f"Queued variants of {len(pending)} pending images."))
+            return
+
+        rendered = 0
+        for image in ProductImage.objects.filter(variants_ready=False).iterator():
+            image.generate_variants()
+            rendered += 1
+        self.stdout.write(self.style.SUCCESS(f"Rendered variants of {rendered} images."))
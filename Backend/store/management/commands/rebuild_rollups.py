@@ -0,0 +1,23 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily sales and outward rollups from the raw transaction lines."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help="First day to rebuild (YYYY-MM-DD). Defaults to the earliest day.")
+        parser.add_argument('--end', help="Last day to rebuild (YYYY-MM-DD). Defaults to the latest day.")
+
+    def handle(self, *args, **options):
+        try:
+            start = date.fromisoformat(options['start']) if options['start'] else None
+            end = date.fromisoformat(options['end']) if options['end'] else None
+        except ValueError as e:
+            raise CommandError(f"Invalid date: {e}")
+
+        sales, outward = rebuild_rollups(start, end)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {sales} sales and {outward} outward rollup rows."))
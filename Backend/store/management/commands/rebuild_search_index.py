@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from store.models import Product
+from store.search import index_products
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product search index from the product table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Products indexed per batch.")
+
+    def handle(self, *args, **options):
+        chunk, indexed = [], 0
+        for product in Product.objects.only('id', 'name', 'product_code', 'barcode').iterator(chunk_size=options['chunk_size']):
+            chunk.append(product)
+            if len(chunk) >= options['chunk_size']:
+                index_products(chunk)
+                indexed, chunk = indexed + len(chunk), []
+        if chunk:
+            index_products(chunk)
+            indexed += len(chunk)
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} products."))
@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from store.models import BarcodePool
+
+
+class Command(BaseCommand):
+    help = "Top up the pre-generated barcode pool so product creation never waits on generation."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=settings.BARCODE_POOL_SIZE, help="Target number of pooled barcodes.")
+
+    def handle(self, *args, **options):
+        missing = options['size'] - BarcodePool.objects.count()
+        added = BarcodePool.objects.refill(missing) if missing > 0 else 0
+        self.stdout.write(self.style.SUCCESS(f"Added {added} barcodes to the pool."))
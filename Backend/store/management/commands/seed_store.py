@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from store.seeding import StoreSeeder
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with a synthetic store dataset for load testing: customers, categories, brands, "
+        "products, branches, in/out transactions with their lines, and expired/defective write-offs. "
+        "Run it against a scratch database, e.g. DB_NAME=/tmp/load.sqlite3 after migrate."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, default=100000, help="In-transaction lines to create; everything else scales with it.")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed; the same seed gives the same dataset.")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Rows per bulk_create batch.")
+        parser.add_argument('--noinput', '--no-input', action='store_false', dest='interactive', help="Do not ask for confirmation.")
+
+    def handle(self, *args, **options):
+        if options['lines'] < 1:
+            raise CommandError("--lines must be at least 1.")
+        if options['interactive']:
+            answer = input(f"This writes {options['lines']} generated lines to {connection.settings_dict['NAME']!r}. Type 'yes' to continue: ")
+            if answer != 'yes':
+                raise CommandError("Seeding cancelled.")
+
+        started = time.perf_counter()
+
+        def progress(lines):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"{lines}/{options['lines']} lines after {time.perf_counter() - started:.1f}s")
+
+        rows = StoreSeeder(options['lines'], seed=options['seed'], batch_size=options['batch_size'], progress=progress).run()
+        elapsed = time.perf_counter() - started
+
+        for model, count in rows.most_common():
+            self.stdout.write(f"{model:<28} {count:>10}")
+        total = sum(rows.values())
+        self.stdout.write(self.style.SUCCESS(f"Created {total} rows in {elapsed:.1f}s ({total / elapsed:.0f} rows/s)."))
@@ -0,0 +1,89 @@
+# Generated by Django 5.0.1 on 2026-10-17 13:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def merge_duplicate_total_stock(apps, schema_editor):
+    TotalStock = apps.get_model('store', 'TotalStock')
+    duplicated = (
+        TotalStock.objects.values('product_id')
+        .annotate(rows=models.Count('id'), quantity=Sum('total_quantity'))
+        .filter(rows__gt=1)
+    )
+    for row in duplicated:
+        stocks = TotalStock.objects.filter(product_id=row['product_id']).order_by('id')
+        keep = stocks.first()
+        stocks.exclude(id=keep.id).delete()
+        keep.total_quantity = row['quantity']
+        keep.save(update_fields=['total_quantity'])
+
+
+def open_ledger(apps, schema_editor):
+    # Existing balances become opening adjustments, and existing in details get a
+    # zero 'in' row so they are not booked a second time on their next save.
+    TotalStock = apps.get_model('store', 'TotalStock')
+    StockMovement = apps.get_model('store', 'StockMovement')
+    ProductInTransactionDetail = apps.get_model('store', 'ProductInTransactionDetail')
+
+    StockMovement.objects.bulk_create(
+        [
+            StockMovement(product_id=product_id, movement_type='adjustment', quantity=quantity, remarks='Opening balance')
+            for product_id, quantity in TotalStock.objects.filter(total_quantity__gt=0).values_list('product_id', 'total_quantity')
+        ],
+        batch_size=1000,
+    )
+    StockMovement.objects.bulk_create(
+        [
+            StockMovement(product_id=product_id, movement_type='in', quantity=0, in_transaction_id=transaction_id, in_detail_id=detail_id)
+            for detail_id, product_id, transaction_id in ProductInTransactionDetail.objects.values_list('id', 'product_id', 'transaction_id')
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0003_productintransaction_is_delivered'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('movement_type', models.CharField(choices=[('in', 'In'), ('out', 'Out'), ('expired', 'Expired'), ('defective', 'Defective'), ('adjustment', 'Adjustment')], max_length=20)),
+                ('quantity', models.IntegerField()),
+                ('remarks', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RunPython(merge_duplicate_total_stock, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='totalstock',
+            constraint=models.UniqueConstraint(fields=('product',), name='unique_total_stock_per_product'),
+        ),
+        migrations.AddField(
+            model_name='stockmovement',
+            name='in_detail',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_movements', to='store.productintransactiondetail'),
+        ),
+        migrations.AddField(
+            model_name='stockmovement',
+            name='in_transaction',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_movements', to='store.productintransaction'),
+        ),
+        migrations.AddField(
+            model_name='stockmovement',
+            name='out_transaction',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_movements', to='store.productouttransaction'),
+        ),
+        migrations.AddField(
+            model_name='stockmovement',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='store.product'),
+        ),
+        migrations.RunPython(open_ledger, migrations.RunPython.noop),
+    ]
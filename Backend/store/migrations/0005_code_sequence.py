@@ -0,0 +1,45 @@
+# Generated by Django 5.0.1 on 2026-10-17 13:02
+
+from django.db import migrations, models
+
+
+def highest_code(codes, prefix):
+    highest = None
+    for code in codes:
+        if code and code.startswith(prefix) and code[len(prefix):].isdigit():
+            value = int(code[len(prefix):])
+            highest = value if highest is None else max(highest, value)
+    return highest
+
+
+def seed_sequences(apps, schema_editor):
+    # Continue from the highest code already issued so existing rows never collide
+    CodeSequence = apps.get_model('store', 'CodeSequence')
+    Product = apps.get_model('store', 'Product')
+    Branch = apps.get_model('store', 'Branch')
+
+    product_code = highest_code(Product.objects.values_list('product_code', flat=True).iterator(), 'P')
+    branch_code = highest_code(Branch.objects.values_list('branch_code', flat=True).iterator(), 'BR')
+
+    CodeSequence.objects.bulk_create([
+        CodeSequence(name='product_code', last_value=product_code if product_code is not None else 5000),
+        CodeSequence(name='branch_code', last_value=branch_code if branch_code is not None else 121210),
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0004_stock_movement_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CodeSequence',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('last_value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(seed_sequences, migrations.RunPython.noop),
+    ]
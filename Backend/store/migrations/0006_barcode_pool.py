@@ -0,0 +1,20 @@
+# Generated by Django 5.0.1 on 2026-10-17 13:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0005_code_sequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BarcodePool',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=13, unique=True)),
+            ],
+        ),
+    ]
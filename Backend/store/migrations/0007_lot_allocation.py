@@ -0,0 +1,58 @@
+# Generated by Django 5.0.1 on 2026-10-17 13:06
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def open_existing_lots(apps, schema_editor):
+    # Nothing has been dispatched from existing lots yet, so they are fully available
+    ProductInTransactionDetail = apps.get_model('store', 'ProductInTransactionDetail')
+    ProductInTransactionDetail.objects.update(remaining_quantity=models.F('quantity'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0006_barcode_pool'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LotAllocation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='productintransactiondetail',
+            name='expiry_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='productintransactiondetail',
+            name='remaining_quantity',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='productintransactiondetail',
+            index=models.Index(condition=models.Q(('remaining_quantity__gt', 0)), fields=['product', 'expiry_date', 'id'], name='in_detail_open_lots_idx'),
+        ),
+        migrations.AddField(
+            model_name='lotallocation',
+            name='in_detail',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lot_allocations', to='store.productintransactiondetail'),
+        ),
+        migrations.AddField(
+            model_name='lotallocation',
+            name='out_detail',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lot_allocations', to='store.productouttransactiondetail'),
+        ),
+        migrations.AlterField(
+            model_name='productouttransaction',
+            name='date',
+            field=models.DateField(default=django.utils.timezone.localdate),
+        ),
+        migrations.RunPython(open_existing_lots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 5.0.1 on 2026-10-17 13:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def build_rollups(apps, schema_editor):
+    # Aggregate the existing lines once; new activity keeps the rollups current from here on
+    ProductInTransactionDetail = apps.get_model('store', 'ProductInTransactionDetail')
+    ProductOutTransactionDetail = apps.get_model('store', 'ProductOutTransactionDetail')
+    DailySalesRollup = apps.get_model('store', 'DailySalesRollup')
+    DailyOutwardRollup = apps.get_model('store', 'DailyOutwardRollup')
+
+    sales = ProductInTransactionDetail.objects.filter(transaction__is_delivered=True).values_list(
+        'transaction__inward_stock_date', 'transaction__delivery_date', 'transaction__customer_id', 'product_id'
+    ).annotate(Sum('quantity'), Sum('total'), Count('id')).order_by()
+    DailySalesRollup.objects.bulk_create(
+        (
+            DailySalesRollup(
+                day=day, delivery_date=delivery_date, customer_id=customer_id, product_id=product_id,
+                quantity=quantity, total=total, lines=lines,
+            )
+            for day, delivery_date, customer_id, product_id, quantity, total, lines in sales.iterator()
+        ),
+        batch_size=1000,
+    )
+
+    outward = ProductOutTransactionDetail.objects.values_list(
+        'transaction__date', 'transaction__branch_id', 'product_id'
+    ).annotate(Sum('qty_requested'), Count('id')).order_by()
+    DailyOutwardRollup.objects.bulk_create(
+        (
+            DailyOutwardRollup(day=day, branch_id=branch_id, product_id=product_id, quantity=quantity, lines=lines)
+            for day, branch_id, product_id, quantity, lines in outward.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0007_lot_allocation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyOutwardRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('quantity', models.IntegerField(default=0)),
+                ('lines', models.IntegerField(default=0)),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='store.branch')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='store.product')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('delivery_date', models.DateField()),
+                ('quantity', models.IntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('lines', models.IntegerField(default=0)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='store.customer')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='store.product')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='dailyoutwardrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'branch', 'product'), name='unique_daily_outward_rollup'),
+        ),
+        migrations.AddIndex(
+            model_name='dailysalesrollup',
+            index=models.Index(fields=['delivery_date'], name='daily_sales_delivery_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailysalesrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'delivery_date', 'product', 'customer'), name='unique_daily_sales_rollup'),
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.0.1 on 2026-10-17 13:47
+
+import itertools
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from store.search import product_tokens, word_grams
+
+
+def index_existing_products(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    ProductSearchToken = apps.get_model('store', 'ProductSearchToken')
+    SearchTermGram = apps.get_model('store', 'SearchTermGram')
+
+    # Bulk insert a slice at a time so large catalogues are not materialised in memory
+    words = set()
+    tokens = (
+        ProductSearchToken(product_id=product_id, kind=kind, token=token)
+        for product_id, product_code, barcode, name in Product.objects.values_list('id', 'product_code', 'barcode', 'name').iterator()
+        for kind, token in product_tokens(product_code, barcode, name)
+    )
+    while batch := list(itertools.islice(tokens, 1000)):
+        ProductSearchToken.objects.bulk_create(batch)
+        words.update(token.token for token in batch if token.kind == 'word')
+
+    SearchTermGram.objects.bulk_create(
+        [SearchTermGram(gram=gram, term=word) for word in words for gram in word_grams(word)],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_daily_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTermGram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gram', models.CharField(max_length=3)),
+                ('term', models.CharField(max_length=255)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProductSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('code', 'Code or barcode'), ('word', 'Name word')], max_length=4)),
+                ('token', models.CharField(max_length=255)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='store.product')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='searchtermgram',
+            constraint=models.UniqueConstraint(fields=('gram', 'term'), name='unique_search_term_gram'),
+        ),
+        migrations.AddIndex(
+            model_name='productsearchtoken',
+            index=models.Index(fields=['kind', 'token', 'product'], name='product_search_token_idx'),
+        ),
+        migrations.RunPython(index_existing_products, migrations.RunPython.noop),
+    ]
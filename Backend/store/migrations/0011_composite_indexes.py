@@ -0,0 +1,29 @@
+# Generated by Django 5.0.1 on 2026-10-17 14:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0010_product_image'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productintransaction',
+            index=models.Index(fields=['supplier_invoice_number'], name='in_txn_invoice_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productintransaction',
+            index=models.Index(condition=models.Q(('is_delivered', False)), fields=['delivery_date'], name='in_txn_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productintransaction',
+            index=models.Index(condition=models.Q(('is_delivered', True)), fields=['delivery_date'], name='in_txn_delivered_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productintransaction',
+            index=models.Index(fields=['inward_stock_date'], name='in_txn_inward_date_idx'),
+        ),
+    ]
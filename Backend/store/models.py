@@ -1,3 +1,6 @@
+import random
+import threading
+from django.conf import settings
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 from django.core.validators import MinValueValidator
@@ -7,15 +10,22 @@ from barcode.writer import ImageWriter
 from django.db import models
 from django.core.validators import MinValueValidator
 from django.utils.crypto import get_random_string
-from django.dispatch import receiver
-from django.db.models.signals import post_save, pre_save
+from django.dispatch import Signal
 from django.utils.crypto import get_random_string
 import barcode
 from barcode.writer import ImageWriter
-from io import BytesIO
 from django.utils import timezone
-from django.db import models, transaction
+from django.db import IntegrityError, models, transaction
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import F, Q, Case, OuterRef, Subquery, Sum, Value, When, IntegerField
+from django.db.models.functions import Coalesce
 from django.core.exceptions import ValidationError
+from store.images import VARIANT_FORMATS, VARIANT_SIZES, content_hash, render_variants
+
+class InsufficientStock(ValidationError):
+    pass
+
 
 # Customer model
 class Customer(models.Model):  # Changed from Supplier to Customer
@@ -43,9 +53,245 @@ class Brand(models.Model):
 
 
 
+# Code sequences
+class CodeSequenceManager(models.Manager):
+    def reserve(self, name, count=1, start=1):
+        """
+        Atomically reserve ``count`` consecutive values of sequence ``name`` and return the first.
+
+        The counter row is bumped with a single F() update, so concurrent callers never
+        receive the same value. A missing row is created so the first value is ``start``.
+        """
+        with transaction.atomic():
+            if not self.filter(name=name).update(last_value=F('last_value') + count):
+                self.bulk_create([CodeSequence(name=name, last_value=start - 1)], ignore_conflicts=True)
+                self.filter(name=name).update(last_value=F('last_value') + count)
+            last_value = self.filter(name=name).values_list('last_value', flat=True).get()
+        return last_value - count + 1
+
+
+class CodeSequence(models.Model):
+    name = models.CharField(max_length=50, primary_key=True)
+    last_value = models.BigIntegerField(default=0)
+
+    objects = CodeSequenceManager()
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_value}"
+
+
+class SequenceAllocator:
+    """
+    Hands out values of a CodeSequence, optionally reserving a block per worker process.
+
+    Blocks are only cached when reserved in autocommit mode; inside an atomic block the
+    reservation could still be rolled back, so exactly the requested values are taken.
+    """
+
+    def __init__(self, name, start, block_size=None):
+        self.name = name
+        self.start = start
+        self._block_size = block_size
+        self._next = self._end = 0
+        self._lock = threading.Lock()
+
+    @property
+    def block_size(self):
+        if self._block_size is not None:
+            return self._block_size
+        return max(1, getattr(settings, 'STORE_CODE_BLOCK_SIZE', 1))
+
+    def next_value(self):
+        return self.take(1)[0]
+
+    def take(self, count):
+        """Return ``count`` unused values, reserving them from the database in one statement."""
+        with self._lock:
+            values = []
+            cached = min(count, self._end - self._next)
+            if cached > 0:
+                values.extend(range(self._next, self._next + cached))
+                self._next += cached
+
+            needed = count - len(values)
+            if needed:
+                cache = not transaction.get_connection().in_atomic_block
+                size = max(needed, self.block_size) if cache else needed
+                first = CodeSequence.objects.reserve(self.name, size, self.start)
+                values.extend(range(first, first + needed))
+                if cache:
+                    self._next, self._end = first + needed, first + size
+            return values
+
+
+product_code_sequence = SequenceAllocator('product_code', start=5001)
+branch_code_sequence = SequenceAllocator('branch_code', start=121211)
+
+
+# Barcode pool
+def ean13_check_digit(digits):
+    """Return the EAN-13 check digit for a 12 digit string."""
+    odd = sum(int(digit) for digit in digits[0::2])
+    even = sum(int(digit) for digit in digits[1::2])
+    return str((10 - (odd + even * 3) % 10) % 10)
+
+
+_random = random.SystemRandom()
+
+
+def generate_ean13():
+    # GS1 prefix 2 is reserved for restricted in-store numbering
+    digits = '2' + ''.join(_random.choice('0123456789') for _ in range(11))
+    return digits + ean13_check_digit(digits)
+
+
+class BarcodeConflict(RuntimeError):
+    pass
+
+
+class BarcodePoolManager(models.Manager):
+    # Keeps IN (...) lists below the SQLite bound-parameter limit
+    batch_size = 500
+    # Allocations started over when concurrent callers keep taking the same codes
+    claim_attempts = 3
+
+    def allocate(self, count=1):
+        """
+        Take ``count`` barcodes out of the pool, refilling it in bulk when it runs short.
+
+        Codes were checked for uniqueness when the pool was filled, so no per-candidate
+        existence queries are made here. Raises BarcodeConflict when another caller took the
+        same codes and the allocation cannot be started over (see _claim()).
+        """
+        # Only a transaction of our own can be rolled back and retried
+        attempts = 1 if transaction.get_connection().in_atomic_block else self.claim_attempts
+        for attempt in range(attempts):
+            try:
+                with transaction.atomic():
+                    codes = self._claim(count)
+                    if len(codes) < count:
+                        self.refill(max(count - len(codes), getattr(settings, 'BARCODE_POOL_SIZE', 1000)))
+                        codes += self._claim(count - len(codes))
+                break
+            except BarcodeConflict:
+                if attempt == attempts - 1:
+                    raise
+
+        if len(codes) < count:
+            raise RuntimeError("Barcode pool could not be refilled.")
+        return codes
+
+    def _claim(self, count):
+        queryset = self.order_by('id')
+        if transaction.get_connection().features.has_select_for_update_skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True)
+
+        claimed = self._free_codes(queryset, count)
+        ids = [pool_id for pool_id, code in claimed]
+        deleted = 0
+        for start in range(0, len(ids), self.batch_size):
+            deleted += self.filter(id__in=ids[start:start + self.batch_size]).delete()[0]
+        # Without SKIP LOCKED two callers can read the same free rows; only one deletes them
+        if deleted != len(ids):
+            raise BarcodeConflict("Barcodes were claimed by a concurrent allocation.")
+        return [code for pool_id, code in claimed]
+
+    @staticmethod
+    def _free_codes(queryset, count):
+        return list(queryset.values_list('id', 'code')[:count])
+
+    def discard(self, codes):
+        """Remove ``codes`` from the pool, for barcodes supplied by hand."""
+        for start in range(0, len(codes), self.batch_size):
+            self.filter(code__in=codes[start:start + self.batch_size]).delete()
+
+    def refill(self, count):
+        """Add ``count`` new EAN-13 codes that are used by no product and not already pooled."""
+        added = 0
+        while added < count:
+            candidates = list({generate_ean13() for _ in range(count - added)})
+            taken = set()
+            for start in range(0, len(candidates), self.batch_size):
+                batch = candidates[start:start + self.batch_size]
+                taken.update(Product.objects.filter(barcode__in=batch).values_list('barcode', flat=True))
+                taken.update(self.filter(code__in=batch).values_list('code', flat=True))
+
+            fresh = [BarcodePool(code=code) for code in candidates if code not in taken]
+            self.bulk_create(fresh, batch_size=self.batch_size, ignore_conflicts=True)
+            added += len(fresh)
+        return added
+
+
+class BarcodePool(models.Model):
+    code = models.CharField(max_length=13, unique=True)
+
+    objects = BarcodePoolManager()
+
+    def __str__(self):
+        return self.code
+
+
+# Uploaded product images, one row per distinct content
+class ProductImageManager(models.Manager):
+    def for_upload(self, upload):
+        """
+        Return the image stored for ``upload``'s bytes, storing them first if they are new.
+
+        Identical uploads share one stored original and one set of variants.
+        """
+        digest = content_hash(upload)
+        existing = self.filter(sha256=digest).first()
+        if existing:
+            return existing
+
+        extension = os.path.splitext(upload.name or '')[1].lower() or '.jpg'
+        image = self.model(sha256=digest)
+        image.original.save(f'{digest}{extension}', upload, save=False)
+        try:
+            with transaction.atomic():
+                image.save()
+        except IntegrityError:
+            # The same bytes were stored concurrently; keep theirs and drop our copy
+            image.original.delete(save=False)
+            return self.get(sha256=digest)
+        return image
+
+
+class ProductImage(models.Model):
+    sha256 = models.CharField(max_length=64, unique=True)
+    original = models.ImageField(upload_to='product_images/')
+    variants_ready = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = ProductImageManager()
+
+    def variant_name(self, variant, extension):
+        return f'product_images/variants/{self.sha256}/{variant}.{extension}'
+
+    def generate_variants(self):
+        # Runs in the background worker; files are written before the row is marked ready
+        with self.original.open('rb') as source:
+            for variant, extension, content in render_variants(source):
+                name = self.variant_name(variant, extension)
+                if default_storage.exists(name):
+                    default_storage.delete(name)
+                default_storage.save(name, ContentFile(content))
+        ProductImage.objects.filter(pk=self.pk).update(variants_ready=True)
+        self.variants_ready = True
+
+    def variant_urls(self):
+        if not self.variants_ready:
+            return None
+        return {
+            variant: {extension: default_storage.url(self.variant_name(variant, extension)) for extension in VARIANT_FORMATS}
+            for variant in VARIANT_SIZES
+        }
+
+    def __str__(self):
+        return self.sha256
+
+
 # Product Model
-from django.db import models
-from django.utils.crypto import get_random_string
 
 class Product(models.Model):
     name = models.CharField(max_length=255)
@@ -56,33 +302,79 @@ class Product(models.Model):
     barcode = models.CharField(max_length=100, unique=True, blank=True, null=True)
     image = models.ImageField(upload_to='product_images/', blank=True, null=True)
     price = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)  # Add price field
+    image_asset = models.ForeignKey(ProductImage, on_delete=models.SET_NULL, blank=True, null=True, related_name='products')
 
     def save(self, *args, **kwargs):
         # Generate a product code if not provided
         if not self.product_code:
-            last_product = Product.objects.filter(product_code__startswith='P').order_by('-id').first()
-            if last_product and last_product.product_code:
-                last_code = int(last_product.product_code[1:])  # Strip the 'P' and convert to int
-                self.product_code = f'P{last_code + 1}'
-            else:
-                self.product_code = 'P5001'  # Start from P5001 if no products exist
+            self.product_code = f'P{product_code_sequence.next_value()}'  # Codes start from P5001
 
         # Generate barcode if not provided
         if not self.barcode:
             self.barcode = self.generate_unique_barcode()
 
+        # A newly uploaded image is stored by content hash; variants are generated in the background
+        if self.image and not self.image._committed:
+            self.image_asset = ProductImage.objects.for_upload(self.image.file)
+            self.image = self.image_asset.original.name
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'image_asset'}
+        elif not self.image:
+            self.image_asset = None
+
         super().save(*args, **kwargs)
 
     def generate_unique_barcode(self):
-        while True:
-            barcode_number = get_random_string(12, allowed_chars='0123456789')
-            if not Product.objects.filter(barcode=barcode_number).exists():
-                return barcode_number
+        return BarcodePool.objects.allocate(1)[0]
 
     def __str__(self):
         return f"{self.name} ({self.product_code})"
 
 
+# Search postings: whole codes/barcodes for prefix lookups and name words for fuzzy matches
+class ProductSearchToken(models.Model):
+    CODE = 'code'
+    WORD = 'word'
+    KIND_CHOICES = [
+        (CODE, 'Code or barcode'),
+        (WORD, 'Name word'),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='search_tokens')
+    kind = models.CharField(max_length=4, choices=KIND_CHOICES)
+    token = models.CharField(max_length=255)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'token', 'product'], name='product_search_token_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}:{self.token} -> {self.product_id}"
+
+
+# Trigrams of every word seen in a product name, used to find the words a misspelt query means
+class SearchTermGram(models.Model):
+    gram = models.CharField(max_length=3)
+    term = models.CharField(max_length=255)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['gram', 'term'], name='unique_search_term_gram'),
+        ]
+
+    def __str__(self):
+        return f"{self.gram} -> {self.term}"
+
+
+class ProductInTransactionQuerySet(models.QuerySet):
+    def with_details(self):
+        # Everything FullTransactionDetailSerializer reads, in two queries regardless of row count
+        return self.select_related('customer').prefetch_related(
+            models.Prefetch('transaction_details', queryset=ProductInTransactionDetail.objects.select_related('product'))
+        )
+
+
 # ProductInTransaction Model
 class ProductInTransaction(models.Model):
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
@@ -91,19 +383,201 @@ class ProductInTransaction(models.Model):
     delivery_date = models.DateField()  # Date provided by the supplier
     remarks = models.TextField(blank=True, null=True)  # Remarks or comments about the transaction
     is_delivered = models.BooleanField(default=False)
+
+    objects = ProductInTransactionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Invoice lookups when viewing or delivering a transaction
+            models.Index(fields=['supplier_invoice_number'], name='in_txn_invoice_idx'),
+            # Pending and delivered transactions by delivery date. Boolean filters compile to a bare
+            # "is_delivered" / NOT "is_delivered" on SQLite, which only a partial index can serve
+            models.Index(fields=['delivery_date'], condition=Q(is_delivered=False), name='in_txn_pending_idx'),
+            models.Index(fields=['delivery_date'], condition=Q(is_delivered=True), name='in_txn_delivered_idx'),
+            # Intake on a day or over a date range
+            models.Index(fields=['inward_stock_date'], name='in_txn_inward_date_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored rollup key so a later save knows what it changes
+        if {'is_delivered', 'inward_stock_date', 'delivery_date', 'customer_id'} <= set(field_names):
+            instance._stored_rollup_key = instance.sales_rollup_key()
+        return instance
+
+    def sales_rollup_key(self):
+        # Delivered transactions are rolled up per inward date, delivery date and customer
+        if not self.is_delivered:
+            return None
+        return {'day': self.inward_stock_date, 'delivery_date': self.delivery_date, 'customer_id': self.customer_id}
+
     def save(self, *args, **kwargs):
-        super(ProductInTransaction, self).save(*args, **kwargs)
-        # Update stock for all products after the transaction is saved
-        for detail in self.transaction_details.all():
-            product_total_stock, created = TotalStock.objects.get_or_create(product=detail.product)
-            product_total_stock.total_quantity += detail.quantity
-            product_total_stock.save()  
+        with transaction.atomic():
+            super(ProductInTransaction, self).save(*args, **kwargs)
+            # Book stock for any details that are not in the ledger yet
+            self.post_stock_movements()
+
+    def post_stock_movements(self):
+        # Only details without an 'in' ledger row are booked, so saving again never double counts
+        pending = self.transaction_details.exclude(
+            stock_movements__movement_type=StockMovement.IN
+        ).values_list('id', 'product_id', 'quantity')
+
+        return StockMovement.objects.record([
+            StockMovement(
+                product_id=product_id,
+                movement_type=StockMovement.IN,
+                quantity=quantity,
+                in_transaction=self,
+                in_detail_id=detail_id,
+            )
+            for detail_id, product_id, quantity in pending
+        ])
 
     def __str__(self):
         return f"Transaction {self.id} - {self.supplier.name} on {self.purchase_date}"
 
 
 # ProductInTransactionDetail Model
+class ProductInTransactionDetailManager(models.Manager):
+    def with_outward_totals(self):
+        """
+        Annotate each line with ``outward_total``, the quantity of its product sent out so far.
+
+        The total comes from one grouped subquery in the same SELECT, so a report costs a
+        single query however many lines it covers.
+        """
+        outward = ProductOutTransactionDetail.objects.filter(product=OuterRef('product')).order_by().values(
+            'product'
+        ).annotate(total=Sum('qty_requested')).values('total')
+
+        return self.select_related('transaction__customer', 'product').annotate(
+            outward_total=Coalesce(Subquery(outward), 0)
+        )
+
+    def bulk_create_with_totals(self, details, batch_size=500):
+        """
+        Price ``details`` in memory and insert them with ``bulk_create``.
+
+        Products that are not already loaded on a detail are fetched with one query, so
+        the cost does not grow with the number of lines.
+        """
+        field = ProductInTransactionDetail.product.field
+        missing = {detail.product_id for detail in details if not field.is_cached(detail)}
+        prices = dict(Product.objects.filter(id__in=missing).values_list('id', 'price')) if missing else {}
+
+        for detail in details:
+            price = detail.product.price if field.is_cached(detail) else prices.get(detail.product_id)
+            if detail.quantity and price is not None:
+                detail.total = price * detail.quantity
+            detail.remaining_quantity = detail.quantity
+
+        return self.bulk_create(details, batch_size=batch_size)
+
+    # Open lots are locked this many at a time until a request is covered
+    lock_batch_size = 20
+    # Keeps the CASE expression well below the SQLite bound-parameter limit
+    update_batch_size = 500
+
+    def allocate(self, product_id, quantity):
+        """
+        Take ``quantity`` of ``product_id`` out of its open lots and return ``[(lot_id, qty), ...]``.
+
+        Lots are consumed earliest expiry first (FEFO), oldest first among equal expiries
+        (FIFO). Only the lots needed are locked with select_for_update, and all decrements
+        are written with one UPDATE. Raises InsufficientStock when the open lots cannot
+        cover the request.
+        """
+        lots = self.select_for_update().filter(
+            product_id=product_id, remaining_quantity__gt=0
+        ).order_by(F('expiry_date').asc(nulls_last=True), 'id')
+
+        split = []
+        seen = []
+        needed = quantity
+        with transaction.atomic():
+            while needed > 0:
+                batch = list(lots.exclude(id__in=seen).values_list('id', 'remaining_quantity')[:self.lock_batch_size])
+                if not batch:
+                    break
+                for lot_id, remaining in batch:
+                    taken = min(remaining, needed)
+                    split.append((lot_id, taken))
+                    needed -= taken
+                    if not needed:
+                        break
+                seen.extend(lot_id for lot_id, remaining in batch)
+
+            if needed > 0:
+                raise InsufficientStock(
+                    f"Only {quantity - needed} of {quantity} units of product {product_id} are in stock."
+                )
+
+            self._take_from_lots(dict(split))
+        return split
+
+    def allocate_many(self, requests, expired_before=None):
+        """
+        Allocate several ``(product_id, quantity)`` requests with one locking read and one UPDATE.
+
+        Every open lot of the requested products is locked and split in memory in FEFO
+        order; ``expired_before`` restricts the lots to those expiring before that date.
+        Returns a list aligned with ``requests`` holding each request's
+        ``[(lot_id, qty, expiry_date), ...]`` split, or None when its lots cannot cover it
+        (nothing is taken for that request).
+        """
+        lots = self.select_for_update().filter(
+            product_id__in={product_id for product_id, quantity in requests}, remaining_quantity__gt=0
+        )
+        if expired_before is not None:
+            lots = lots.filter(expiry_date__lt=expired_before)
+
+        with transaction.atomic():
+            open_lots = {}
+            rows = lots.order_by('product_id', F('expiry_date').asc(nulls_last=True), 'id').values_list(
+                'id', 'product_id', 'remaining_quantity', 'expiry_date'
+            )
+            for lot_id, product_id, remaining, expiry_date in rows:
+                open_lots.setdefault(product_id, []).append([lot_id, remaining, expiry_date])
+
+            splits = []
+            taken_by_lot = {}
+            for product_id, quantity in requests:
+                available = open_lots.get(product_id, [])
+                if sum(lot[1] for lot in available) < quantity:
+                    splits.append(None)
+                    continue
+
+                split = []
+                needed = quantity
+                for lot in available:
+                    if not needed:
+                        break
+                    taken = min(lot[1], needed)
+                    if taken:
+                        lot[1] -= taken
+                        needed -= taken
+                        split.append((lot[0], taken, lot[2]))
+                        taken_by_lot[lot[0]] = taken_by_lot.get(lot[0], 0) + taken
+                splits.append(split)
+
+            self._take_from_lots(taken_by_lot)
+        return splits
+
+    def _take_from_lots(self, taken_by_lot):
+        # Relative decrements, so the CHECK constraint still guards against going negative
+        lot_ids = list(taken_by_lot)
+        for start in range(0, len(lot_ids), self.update_batch_size):
+            batch = lot_ids[start:start + self.update_batch_size]
+            self.filter(id__in=batch).update(
+                remaining_quantity=Case(
+                    *[When(id=lot_id, then=F('remaining_quantity') - taken_by_lot[lot_id]) for lot_id in batch],
+                    output_field=IntegerField(),
+                )
+            )
+
+
 class ProductInTransactionDetail(models.Model):
     transaction = models.ForeignKey(ProductInTransaction, on_delete=models.CASCADE, related_name='transaction_details')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
@@ -111,27 +585,149 @@ class ProductInTransactionDetail(models.Model):
     quantity = models.PositiveIntegerField()  
     washing_quantity = models.PositiveIntegerField()   
     total = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)  # Total for the product in the transaction
+    expiry_date = models.DateField(blank=True, null=True)
+    remaining_quantity = models.PositiveIntegerField(default=0)  # Quantity of this lot still available for dispatch
+
+    objects = ProductInTransactionDetailManager()
+
+    class Meta:
+        indexes = [
+            # Open lots per product in FEFO order; only lots with stock left are indexed
+            models.Index(
+                fields=['product', 'expiry_date', 'id'],
+                condition=Q(remaining_quantity__gt=0),
+                name='in_detail_open_lots_idx',
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         # Calculate total based on product price and quantity
         if self.quantity and self.product.price is not None:
             self.total = self.product.price * self.quantity
+
+        # A new lot starts out fully available
+        if self._state.adding:
+            self.remaining_quantity = self.quantity
         
         super(ProductInTransactionDetail, self).save(*args, **kwargs)
 
 
 
 
+# Sent with the ids of products whose TotalStock balance changed through a set-based update,
+# the ``{product_id: delta}`` applied to them and the ledger ``movements`` that caused it, if any
+stock_changed = Signal()
+
+# Sent with an out line and the ``[(lot_id, qty), ...]`` taken from its product's lots
+lots_allocated = Signal()
+
+
 # TotalStock Model
+class TotalStockManager(models.Manager):
+    # Keeps the CASE expression well below the SQLite bound-parameter limit
+    batch_size = 500
+
+    def apply_deltas(self, deltas, movements=()):
+        """
+        Add ``{product_id: delta}`` to ``total_quantity`` with set-based F() updates.
+
+        Balances are changed inside the database, so concurrent writers never lose
+        updates. Rows are created for products receiving stock; removing stock from a
+        product that has no TotalStock row raises ``TotalStock.DoesNotExist``.
+        """
+        deltas = {product_id: delta for product_id, delta in deltas.items() if delta}
+        if not deltas:
+            return
+
+        with transaction.atomic():
+            incoming = [TotalStock(product_id=product_id) for product_id, delta in deltas.items() if delta > 0]
+            if incoming:
+                self.bulk_create(incoming, ignore_conflicts=True)
+
+            product_ids = list(deltas)
+            updated = 0
+            for start in range(0, len(product_ids), self.batch_size):
+                batch = product_ids[start:start + self.batch_size]
+                updated += self.filter(product_id__in=batch).update(
+                    total_quantity=Case(
+                        *[When(product_id=product_id, then=F('total_quantity') + deltas[product_id]) for product_id in batch],
+                        output_field=IntegerField(),
+                    )
+                )
+
+            if updated < len(product_ids):
+                raise TotalStock.DoesNotExist("Total stock not found for one or more products.")
+
+            stock_changed.send(sender=TotalStock, product_ids=product_ids, deltas=deltas, movements=movements)
+
+
 class TotalStock(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     total_quantity = models.PositiveIntegerField(default=0)
     remaining_quantity = models.PositiveIntegerField(default=0)  # Add this line
 
+    objects = TotalStockManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product'], name='unique_total_stock_per_product'),
+        ]
+
     def __str__(self):
         return f"{self.product.name} - {self.remaining_quantity} remaining"
 
 
+# Stock movement ledger
+class StockMovementManager(models.Manager):
+    def record(self, movements):
+        """
+        Append ``movements`` to the ledger and apply them to TotalStock in one DB transaction.
+
+        The cost is one bulk INSERT plus the TotalStock statements, however many lines are booked.
+        """
+        movements = [movement for movement in movements if movement.quantity]
+        if not movements:
+            return []
+
+        deltas = {}
+        for movement in movements:
+            deltas[movement.product_id] = deltas.get(movement.product_id, 0) + movement.quantity
+
+        with transaction.atomic():
+            created = self.bulk_create(movements)
+            TotalStock.objects.apply_deltas(deltas, movements)
+        return created
+
+
+class StockMovement(models.Model):
+    IN = 'in'
+    OUT = 'out'
+    EXPIRED = 'expired'
+    DEFECTIVE = 'defective'
+    ADJUSTMENT = 'adjustment'
+    MOVEMENT_TYPES = [
+        (IN, 'In'),
+        (OUT, 'Out'),
+        (EXPIRED, 'Expired'),
+        (DEFECTIVE, 'Defective'),
+        (ADJUSTMENT, 'Adjustment'),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_movements')
+    movement_type = models.CharField(max_length=20, choices=MOVEMENT_TYPES)
+    quantity = models.IntegerField()  # Signed delta applied to TotalStock.total_quantity
+    in_transaction = models.ForeignKey(ProductInTransaction, on_delete=models.SET_NULL, null=True, blank=True, related_name='stock_movements')
+    in_detail = models.ForeignKey(ProductInTransactionDetail, on_delete=models.SET_NULL, null=True, blank=True, related_name='stock_movements')
+    out_transaction = models.ForeignKey('ProductOutTransaction', on_delete=models.SET_NULL, null=True, blank=True, related_name='stock_movements')
+    remarks = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = StockMovementManager()
+
+    def __str__(self):
+        return f"{self.product_id} {self.movement_type} {self.quantity:+d}"
+
+
 # Branch model
 class Branch(models.Model):
     name = models.CharField(max_length=255)
@@ -141,13 +737,7 @@ class Branch(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.branch_code:
-            last_branch = Branch.objects.order_by('-branch_code').first()
-            if last_branch and last_branch.branch_code.startswith("BR"):
-                last_code = int(last_branch.branch_code[2:])
-                new_code = last_code + 1
-            else:
-                new_code = 121211
-            self.branch_code = f'BR{new_code}'
+            self.branch_code = f'BR{branch_code_sequence.next_value()}'  # Codes start from BR121211
 
         super().save(*args, **kwargs)
 
@@ -159,7 +749,7 @@ class Branch(models.Model):
 
 
 class ProductOutTransaction(models.Model):
-    date = models.DateField(default=timezone.now)
+    date = models.DateField(default=timezone.localdate)
     branch = models.ForeignKey('Branch', on_delete=models.CASCADE)
     transfer_invoice_number = models.CharField(max_length=255)
     branch_in_charge = models.CharField(max_length=255)
@@ -176,27 +766,113 @@ class ProductOutTransactionDetail(models.Model):
 
     def save(self, *args, **kwargs):
         with transaction.atomic():
-            # Update remaining_quantity in ProductInTransactionDetail
-            in_transaction_details = ProductInTransactionDetail.objects.filter(product=self.product).order_by('expiry_date')
-
-            remaining_qty_needed = self.qty_requested
-
-            for detail in in_transaction_details:
-                if detail.remaining_quantity >= remaining_qty_needed:
-                    detail.remaining_quantity -= remaining_qty_needed
-                    detail.save()
-                    break
-                else:
-                    remaining_qty_needed -= detail.remaining_quantity
-                    detail.remaining_quantity = 0
-                    detail.save()
+            adding = self._state.adding
+            # Take the requested quantity out of the product's lots (FEFO)
+            split = ProductInTransactionDetail.objects.allocate(self.product_id, self.qty_requested) if adding else []
 
             super(ProductOutTransactionDetail, self).save(*args, **kwargs)
 
+            if adding:
+                LotAllocation.objects.bulk_create([
+                    LotAllocation(out_detail=self, in_detail_id=lot_id, quantity=taken)
+                    for lot_id, taken in split
+                ])
+                lots_allocated.send(sender=ProductOutTransactionDetail, out_detail=self, split=split)
+                StockMovement.objects.record([
+                    StockMovement(
+                        product_id=self.product_id,
+                        movement_type=StockMovement.OUT,
+                        quantity=-self.qty_requested,
+                        out_transaction_id=self.transaction_id,
+                    )
+                ])
+
     def __str__(self):
         return f"{self.product.name} - {self.qty_requested} units"
     
 
+# Which in lots fed which out line
+class LotAllocation(models.Model):
+    out_detail = models.ForeignKey(ProductOutTransactionDetail, on_delete=models.CASCADE, related_name='lot_allocations')
+    in_detail = models.ForeignKey(ProductInTransactionDetail, on_delete=models.CASCADE, related_name='lot_allocations')
+    quantity = models.PositiveIntegerField()
+
+    def __str__(self):
+        return f"{self.quantity} from lot {self.in_detail_id} to out line {self.out_detail_id}"
+
+
+
+# Daily rollups
+class RollupManager(models.Manager):
+    # Keeps the CASE expressions well below the SQLite bound-parameter limit
+    batch_size = 300
+
+    def bump(self, key, deltas):
+        """
+        Add ``deltas`` (``{product_id: {measure: delta}}``) to the rollup rows at ``key``.
+
+        Missing rows are created and every measure is moved with one set-based F()
+        update per batch, so concurrent writers never lose increments. Rows left
+        without any lines are removed.
+        """
+        product_ids = [product_id for product_id, measures in deltas.items() if any(measures.values())]
+        for start in range(0, len(product_ids), self.batch_size):
+            batch = product_ids[start:start + self.batch_size]
+            self.bulk_create([self.model(product_id=product_id, **key) for product_id in batch], ignore_conflicts=True)
+
+            # Products may move different measures; a measure missing for one moves it by 0
+            measures = list(dict.fromkeys(measure for product_id in batch for measure in deltas[product_id]))
+            rows = self.filter(product_id__in=batch, **key)
+            rows.update(**{
+                measure: Case(
+                    *[When(product_id=product_id, then=F(measure) + Value(deltas[product_id].get(measure, 0))) for product_id in batch],
+                    output_field=self.model._meta.get_field(measure),
+                )
+                for measure in measures
+            })
+            rows.filter(lines__lte=0).delete()
+
+
+class DailySalesRollup(models.Model):
+    day = models.DateField()  # Inward stock date of the delivered transaction
+    delivery_date = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='+')
+    quantity = models.IntegerField(default=0)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    lines = models.IntegerField(default=0)
+
+    objects = RollupManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'delivery_date', 'product', 'customer'], name='unique_daily_sales_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['delivery_date'], name='daily_sales_delivery_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.product_id}/{self.customer_id}: {self.total}"
+
+
+class DailyOutwardRollup(models.Model):
+    day = models.DateField()
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE, related_name='+')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    quantity = models.IntegerField(default=0)
+    lines = models.IntegerField(default=0)
+
+    objects = RollupManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'branch', 'product'], name='unique_daily_outward_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.branch_id}/{self.product_id}: {self.quantity}"
+
 
 # Expired Product Details
 
@@ -222,4 +898,46 @@ class DefectiveProduct(models.Model):
         return f"{self.product.name} - Defective: {self.qty_defective} on {self.removal_date}"
 
 
+def write_off_stock(movement_type, items):
+    """
+    Remove expired or defective stock for many products in one DB transaction.
+
+    ``items`` are dicts with ``product_id``, ``qty`` and optional ``remarks``. Expired
+    write-offs only draw from lots past their expiry date. Lot decrements, write-off rows
+    and ledger entries are all written with bulk statements. Returns one result dict per
+    item; items whose lots cannot cover the quantity are reported as failed and left untouched.
+    """
+    expired = movement_type == StockMovement.EXPIRED
+    results = []
+    write_offs = []
+    movements = []
+
+    with transaction.atomic():
+        splits = ProductInTransactionDetail.objects.allocate_many(
+            [(item['product_id'], item['qty']) for item in items],
+            expired_before=timezone.localdate() if expired else None,
+        )
+
+        for item, split in zip(items, splits):
+            result = {'product_id': item['product_id'], 'qty': item['qty']}
+            if split is None:
+                results.append({**result, 'status': 'failed', 'error': 'Not enough stock to remove.'})
+                continue
+
+            remarks = item.get('remarks', '')
+            for lot_id, taken, expiry_date in split:
+                if expired:
+                    write_offs.append(ExpiredProduct(product_id=item['product_id'], qty_expired=taken, expiry_date=expiry_date, remarks=remarks))
+                else:
+                    write_offs.append(DefectiveProduct(product_id=item['product_id'], qty_defective=taken, remarks=remarks))
+            movements.append(StockMovement(product_id=item['product_id'], movement_type=movement_type, quantity=-item['qty'], remarks=remarks))
+            results.append({**result, 'status': 'removed'})
+
+        model = ExpiredProduct if expired else DefectiveProduct
+        model.objects.bulk_create(write_offs, batch_size=500)
+        StockMovement.objects.record(movements)
+
+    return results
+
+
 
@@ -0,0 +1,113 @@
+import logging
+import re
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+logger = logging.getLogger(__name__)
+
+# Staff see every change; a branch sees stock changes and the dispatches addressed to it
+ADMIN_GROUP = 'store.admins'
+STOCK_GROUP = 'store.stock'
+
+# A stock event for more products than this tells clients to reload stock instead of listing deltas
+STOCK_DELTA_LIMIT = 500
+
+
+def branch_group(branch_code):
+    # Group names may only hold ASCII letters, digits, hyphens, underscores and periods
+    return 'store.branch.' + re.sub(r'[^A-Za-z0-9_.-]', '_', branch_code)
+
+
+def publish(groups, event):
+    """
+    Send ``event`` to the WebSocket consumers of ``groups`` (see store.consumers).
+
+    Called once the change is committed. Notifications are best effort: a channel layer that
+    cannot be reached is logged and never fails the request that made the change.
+    """
+    layer = get_channel_layer()
+    if layer is None:
+        return
+    try:
+        async_to_sync(_group_send)(layer, groups, {'type': 'store.event', 'event': event})
+    except Exception:
+        logger.exception("Could not publish a %s event", event['kind'])
+
+
+async def _group_send(layer, groups, message):
+    for group in groups:
+        await layer.group_send(group, message)
+
+
+def stock_changed(deltas):
+    if len(deltas) > STOCK_DELTA_LIMIT:
+        event = {'kind': 'stock', 'deltas': None}
+    else:
+        # JSON object keys are strings, so they are made strings before the layer serializes them
+        event = {'kind': 'stock', 'deltas': {str(product_id): delta for product_id, delta in deltas.items()}}
+    publish([ADMIN_GROUP, STOCK_GROUP], event)
+
+
+def in_transaction_delivered(in_transaction):
+    publish([ADMIN_GROUP], {
+        'kind': 'delivered', 'id': in_transaction.pk, 'supplier_invoice_number': in_transaction.supplier_invoice_number,
+    })
+
+
+def out_transaction_created(out_transaction):
+    publish([ADMIN_GROUP, branch_group(out_transaction.branch_id)], {
+        'kind': 'dispatched', 'id': out_transaction.pk, 'branch': out_transaction.branch_id,
+        'transfer_invoice_number': out_transaction.transfer_invoice_number,
+    })
+
+
+class EventBatch:
+    """
+    Events received within one coalescing window, merged into the single message sent for it.
+
+    Stock deltas of the same product are summed (and dropped when they cancel out), and a
+    transaction announced twice is listed once, so a bulk intake that books stock in several
+    statements still reaches clients as one compact message::
+
+        {"type": "store.update", "stock": {"12": 40, "15": -3},
+         "delivered": [{"id": 7, "supplier_invoice_number": "INV-7"}],
+         "dispatched": [{"id": 3, "branch": "BR121211", "transfer_invoice_number": "TR-3"}]}
+
+    Keys without changes are left out. ``"stock": null`` means too many products changed to
+    list, and clients should reload stock.
+    """
+
+    def __init__(self):
+        self.stock = {}
+        self.reload_stock = False
+        self.delivered = {}
+        self.dispatched = {}
+
+    def add(self, event):
+        kind = event['kind']
+        if kind == 'stock' and event['deltas'] is None:
+            self.reload_stock = True
+        elif kind == 'stock':
+            for product_id, delta in event['deltas'].items():
+                self.stock[product_id] = self.stock.get(product_id, 0) + delta
+        elif kind == 'delivered':
+            self.delivered[event['id']] = {'id': event['id'], 'supplier_invoice_number': event['supplier_invoice_number']}
+        elif kind == 'dispatched':
+            self.dispatched[event['id']] = {
+                'id': event['id'], 'branch': event['branch'], 'transfer_invoice_number': event['transfer_invoice_number'],
+            }
+
+    def message(self):
+        """The merged message, or None when the events cancelled out."""
+        message = {'type': 'store.update'}
+        stock = {product_id: delta for product_id, delta in self.stock.items() if delta}
+        if self.reload_stock or len(stock) > STOCK_DELTA_LIMIT:
+            message['stock'] = None
+        elif stock:
+            message['stock'] = stock
+        if self.delivered:
+            message['delivered'] = list(self.delivered.values())
+        if self.dispatched:
+            message['dispatched'] = list(self.dispatched.values())
+        return message if len(message) > 1 else None
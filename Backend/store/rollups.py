@@ -0,0 +1,91 @@
+from django.db import connections, transaction
+from django.db.models import Count, Sum
+
+from store.models import (
+    DailyOutwardRollup, DailySalesRollup, ProductInTransactionDetail, ProductOutTransactionDetail
+)
+
+
+def apply_in_transaction(transaction_id, key, sign):
+    """Add (``sign=1``) or remove (``sign=-1``) a delivered in transaction's details at rollup ``key``."""
+    rows = ProductInTransactionDetail.objects.filter(transaction_id=transaction_id).values('product_id').annotate(
+        line_quantity=Sum('quantity'), line_total=Sum('total'), line_count=Count('id')
+    ).order_by()
+
+    DailySalesRollup.objects.bump(key, {
+        row['product_id']: {
+            'quantity': sign * row['line_quantity'],
+            'total': sign * row['line_total'],
+            'lines': sign * row['line_count'],
+        }
+        for row in rows
+    })
+
+
+def apply_in_detail(transaction_key, product_id, quantity, total, sign):
+    """Add or remove a single line of a delivered in transaction."""
+    DailySalesRollup.objects.bump(transaction_key, {
+        product_id: {'quantity': sign * quantity, 'total': sign * total, 'lines': sign},
+    })
+
+
+def apply_out_detail(detail, sign):
+    """Add (``sign=1``) or remove (``sign=-1``) one outward line from the outward rollup."""
+    out_transaction = detail.transaction
+    DailyOutwardRollup.objects.bump(
+        {'day': out_transaction.date, 'branch_id': out_transaction.branch_id},
+        {detail.product_id: {'quantity': sign * detail.qty_requested, 'lines': sign}},
+    )
+
+
+def insert_from_select(model, fields, queryset):
+    """
+    Copy the rows of ``queryset`` into ``model`` with one INSERT ... SELECT and return how many were written.
+
+    ``queryset`` is a ``values_list()`` whose columns line up with ``fields``. The SELECT lists
+    annotations after plain columns whatever the ``values_list()`` order, so name them last.
+    The rows never pass through Python, so no model instances are built for them.
+    """
+    connection = connections[queryset.db]
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(model._meta.get_field(field).column) for field in fields)
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'INSERT INTO {quote(model._meta.db_table)} ({columns}) {sql}', params)
+        return cursor.rowcount
+
+
+def rebuild_rollups(start=None, end=None):
+    """
+    Recompute the sales and outward rollups from the raw lines between ``start`` and ``end``.
+
+    Either bound may be omitted to rebuild from the beginning or up to the latest day.
+    The aggregation runs in the database. Returns the number of sales and outward rollup rows written.
+    """
+    def in_range(queryset, field):
+        if start is not None:
+            queryset = queryset.filter(**{f'{field}__gte': start})
+        if end is not None:
+            queryset = queryset.filter(**{f'{field}__lte': end})
+        return queryset
+
+    sales = in_range(
+        ProductInTransactionDetail.objects.filter(transaction__is_delivered=True), 'transaction__inward_stock_date'
+    ).values_list(
+        'transaction__inward_stock_date', 'transaction__delivery_date', 'transaction__customer_id', 'product_id'
+    ).annotate(Sum('quantity'), Sum('total'), Count('id')).order_by()
+
+    outward = in_range(ProductOutTransactionDetail.objects.all(), 'transaction__date').values_list(
+        'transaction__date', 'transaction__branch_id', 'product_id'
+    ).annotate(Sum('qty_requested'), Count('id')).order_by()
+
+    with transaction.atomic():
+        in_range(DailySalesRollup.objects.all(), 'day').delete()
+        in_range(DailyOutwardRollup.objects.all(), 'day').delete()
+
+        sales_rows = insert_from_select(
+            DailySalesRollup, ['day', 'delivery_date', 'customer', 'product', 'quantity', 'total', 'lines'], sales
+        )
+        outward_rows = insert_from_select(DailyOutwardRollup, ['day', 'branch', 'product', 'quantity', 'lines'], outward)
+
+    return sales_rows, outward_rows
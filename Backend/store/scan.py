@@ -0,0 +1,96 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import F
+from django.db.models.functions import Coalesce
+
+from store.models import Product
+
+
+class ScanCache:
+    """
+    Bounded, thread-safe LRU of scan results keyed by barcode.
+
+    Entries are dropped by product id when a product or its stock changes in this
+    process, and expire after ``timeout`` seconds so writes made by other worker
+    processes are picked up too. Every invalidation bumps ``generation``; a lookup
+    that raced with one does not store its (possibly stale) result.
+    """
+
+    def __init__(self, maxsize, timeout):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.generation = 0
+        self._entries = OrderedDict()  # barcode -> (expires_at, payload)
+        self._barcodes = {}  # product id -> cached barcode
+        self._lock = threading.Lock()
+
+    def get(self, barcode):
+        with self._lock:
+            entry = self._entries.get(barcode)
+            if entry is None:
+                return None
+            expires_at, payload = entry
+            if expires_at < time.monotonic():
+                self._discard(barcode)
+                return None
+            self._entries.move_to_end(barcode)
+            return payload
+
+    def set(self, barcode, payload, generation):
+        with self._lock:
+            if generation != self.generation or self.maxsize <= 0:
+                return
+            self._entries[barcode] = (time.monotonic() + self.timeout, payload)
+            self._entries.move_to_end(barcode)
+            self._barcodes[payload['id']] = barcode
+            while len(self._entries) > self.maxsize:
+                self._discard(next(iter(self._entries)))
+
+    def invalidate(self, product_ids=None):
+        # None drops everything, e.g. when a category or brand is renamed
+        with self._lock:
+            self.generation += 1
+            if product_ids is None:
+                self._entries.clear()
+                self._barcodes.clear()
+                return
+            for product_id in product_ids:
+                barcode = self._barcodes.pop(product_id, None)
+                if barcode is not None:
+                    self._entries.pop(barcode, None)
+
+    def _discard(self, barcode):
+        _, payload = self._entries.pop(barcode)
+        if self._barcodes.get(payload['id']) == barcode:
+            del self._barcodes[payload['id']]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+scan_cache = ScanCache(settings.SCAN_CACHE_SIZE, settings.SCAN_CACHE_TIMEOUT)
+
+
+def scan_barcode(barcode):
+    """Return product, price and current stock for ``barcode``, or None if no product has it."""
+    payload = scan_cache.get(barcode)
+    if payload is not None:
+        return payload
+
+    generation = scan_cache.generation
+    # Product, category, brand and stock come back from one joined query
+    rows = Product.objects.filter(barcode=barcode).values(
+        'id', 'name', 'product_code', 'barcode', 'unit_type', 'price',
+        category_name=F('category__name'),
+        brand_name=F('brand__name'),
+        stock=Coalesce('totalstock__total_quantity', 0),
+    )[:1]
+    if not rows:
+        return None
+
+    payload = rows[0]
+    scan_cache.set(barcode, payload, generation)
+    return payload
@@ -0,0 +1,105 @@
+import math
+import re
+
+from django.db import connection, transaction
+
+from store.models import Product, ProductSearchToken, SearchTermGram, TotalStock
+
+GRAM_SIZE = 3
+# Share of a query word's trigrams a name word must contain to count as a match
+MIN_SIMILARITY = 0.5
+# Code and barcode prefix hits always rank above name matches
+CODE_MATCH_SCORE = 1000
+# Products considered per query term; bounds the cost of very common words
+CANDIDATES_PER_TERM = 500
+# Further query words are ignored; autocomplete queries are short
+MAX_QUERY_WORDS = 5
+
+
+def normalise(text):
+    return ' '.join(str(text or '').lower().split())
+
+
+def name_words(name):
+    return set(re.findall(r'\w+', normalise(name)))
+
+
+def word_grams(word):
+    # Padded like pg_trgm, so "tow" already shares its leading grams with "towel"
+    padded = f"  {word} "
+    return {padded[i:i + GRAM_SIZE] for i in range(len(padded) - GRAM_SIZE + 1)}
+
+
+def product_tokens(product_code, barcode, name):
+    tokens = {(ProductSearchToken.CODE, normalise(code)) for code in (product_code, barcode) if code}
+    tokens.update((ProductSearchToken.WORD, word) for word in name_words(name))
+    return tokens
+
+
+def index_products(products):
+    """Replace the search postings of ``products`` in a fixed number of queries."""
+    products = [product for product in products if product.pk]
+    tokens = [
+        ProductSearchToken(product_id=product.pk, kind=kind, token=token)
+        for product in products
+        for kind, token in product_tokens(product.product_code, product.barcode, product.name)
+    ]
+    words = {token.token for token in tokens if token.kind == ProductSearchToken.WORD}
+
+    with transaction.atomic():
+        ProductSearchToken.objects.filter(product__in=[product.pk for product in products]).delete()
+        ProductSearchToken.objects.bulk_create(tokens, batch_size=1000)
+        # The vocabulary only grows; words no product uses any more simply match nothing
+        SearchTermGram.objects.bulk_create(
+            [SearchTermGram(gram=gram, term=word) for word in words for gram in word_grams(word)],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+
+
+def _table(model):
+    return connection.ops.quote_name(model._meta.db_table)
+
+
+def search_products(query, limit=10):
+    """
+    Rank products by code/barcode prefix and fuzzy name match in a single query.
+
+    A code prefix is a range seek on the posting index. Each query word is matched to
+    the known name words sharing enough trigrams with it, and a product scores one
+    point per query word it matches. Every branch is capped at ``CANDIDATES_PER_TERM``
+    postings, so common words cost no more than rare ones. The statement is written
+    out directly because compiling the equivalent ORM expression costs several times
+    more than running it. Results carry id, code, barcode, name, current stock and score.
+    """
+    term = normalise(query)
+    if not term:
+        return []
+
+    tokens, terms = _table(ProductSearchToken), _table(SearchTermGram)
+    branches = [f"SELECT DISTINCT product_id, %s AS weight FROM {tokens} WHERE kind = %s AND token >= %s AND token < %s LIMIT %s"]
+    params = [CODE_MATCH_SCORE, ProductSearchToken.CODE, term, term + '\uffff', CANDIDATES_PER_TERM]
+
+    for word in sorted(name_words(term))[:MAX_QUERY_WORDS]:
+        grams = sorted(word_grams(word))
+        branches.append(
+            f"SELECT DISTINCT product_id, 1 AS weight FROM {tokens} WHERE kind = %s AND token IN ("
+            f"SELECT term FROM {terms} WHERE gram IN ({', '.join(['%s'] * len(grams))}) GROUP BY term HAVING COUNT(*) >= %s"
+            f") LIMIT %s"
+        )
+        params += [ProductSearchToken.WORD, *grams, math.ceil(len(grams) * MIN_SIMILARITY), CANDIDATES_PER_TERM]
+
+    candidates = ' UNION ALL '.join(f"SELECT * FROM ({branch}) AS branch_{i}" for i, branch in enumerate(branches))
+    sql = (
+        f"SELECT p.id, p.product_code, p.barcode, p.name, COALESCE(s.total_quantity, 0) AS stock, m.score "
+        f"FROM (SELECT product_id, SUM(weight) AS score FROM ({candidates}) AS candidates GROUP BY product_id) AS m "
+        f"JOIN {_table(Product)} p ON p.id = m.product_id "
+        # TotalStock holds one row per product, so the join never duplicates a result
+        f"LEFT JOIN {_table(TotalStock)} s ON s.product_id = p.id "
+        f"ORDER BY m.score DESC, p.name, p.id LIMIT %s"
+    )
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params + [limit])
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
@@ -0,0 +1,219 @@
+import random
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DateTimeField, Value
+from django.utils import timezone
+
+from store.models import (
+    Customer, Category, Brand, Product, Branch, ProductInTransaction, ProductInTransactionDetail, ProductOutTransaction,
+    ProductOutTransactionDetail, LotAllocation, StockMovement, TotalStock, ExpiredProduct, DefectiveProduct,
+    product_code_sequence, branch_code_sequence, ean13_check_digit
+)
+from store.rollups import insert_from_select, rebuild_rollups
+from store.search import index_products
+
+MATERIALS = ['Cotton', 'Linen', 'Bamboo', 'Microfibre', 'Terry', 'Flannel', 'Satin', 'Jersey']
+ITEMS = ['Bath Towel', 'Hand Towel', 'Bed Sheet', 'Pillow Cover', 'Duvet Cover', 'Table Cloth', 'Apron', 'Napkin', 'Bath Robe', 'Curtain']
+SIZES = ['Small', 'Medium', 'Large', 'King', 'Queen', 'Single', 'Double']
+CITIES = ['Kochi', 'Kozhikode', 'Thrissur', 'Kollam', 'Kannur', 'Alappuzha', 'Palakkad', 'Kottayam']
+
+
+class StoreSeeder:
+    """
+    Fills the store with a synthetic dataset of ``lines`` in-transaction lines and everything around them.
+
+    Reference data (customers, categories, brands, products, branches) is scaled from the
+    line count. Lines are generated a chunk at a time, together with the transfers that
+    draw from their lots and the write-offs of expired and defective stock, and every
+    table is written with ``bulk_create``. Lot balances, allocations, the stock ledger,
+    TotalStock, the daily rollups and the search index all agree with each other.
+
+    The same ``seed`` and ``today`` produce the same data; only ids and product/branch
+    codes depend on what the database already holds. ``progress`` is called with the
+    number of lines written so far after every chunk.
+    """
+
+    lines_per_chunk = 5000
+
+    def __init__(self, lines, seed=0, today=None, batch_size=1000, progress=None):
+        self.lines = lines
+        self.progress = progress
+        self.random = random.Random(seed)
+        self.today = today or timezone.localdate()
+        self.batch_size = batch_size
+        self.rows = Counter()
+        self.stock = Counter()
+
+    def run(self):
+        """Write the dataset and return the number of rows created per model."""
+        with transaction.atomic():
+            self.create_reference_data()
+        for start in range(0, self.lines, self.lines_per_chunk):
+            with transaction.atomic():
+                self.create_chunk(min(self.lines_per_chunk, self.lines - start))
+            if self.progress:
+                self.progress(start + min(self.lines_per_chunk, self.lines - start))
+        with transaction.atomic():
+            TotalStock.objects.apply_deltas(self.stock)
+            self.rows['TotalStock'] += len(self.stock)
+            sales, outward = rebuild_rollups()
+            self.rows.update({'DailySalesRollup': sales, 'DailyOutwardRollup': outward})
+        return self.rows
+
+    def bulk_create(self, model, objects, **kwargs):
+        created = model.objects.bulk_create(objects, batch_size=self.batch_size, **kwargs)
+        self.rows[model.__name__] += len(objects)
+        return created
+
+    def create_reference_data(self):
+        rng = self.random
+        # Named rows are shared between runs; they are looked up again after inserting
+        self.bulk_create(Category, [Category(name=f'{item}s') for item in ITEMS], ignore_conflicts=True)
+        self.bulk_create(Brand, [Brand(name=f'{material} House') for material in MATERIALS], ignore_conflicts=True)
+        customers = max(5, self.lines // 500)
+        self.bulk_create(Customer, [
+            Customer(name=f'Customer {number}', mobile_number=f'9{number:09d}', email=f'customer{number}@example.com', location=rng.choice(CITIES))
+            for number in range(customers)
+        ], ignore_conflicts=True)
+
+        categories = dict(Category.objects.filter(name__in=[f'{item}s' for item in ITEMS]).values_list('name', 'id'))
+        brands = list(Brand.objects.filter(name__in=[f'{material} House' for material in MATERIALS]).values_list('id', flat=True))
+        self.customers = list(Customer.objects.filter(email__in=[f'customer{number}@example.com' for number in range(customers)]).values_list('id', flat=True))
+
+        branches = max(3, min(50, self.lines // 10000))
+        self.branches = self.bulk_create(Branch, [
+            Branch(name=f'{city} {number}', location=city, contact_details=f'0484{number:06d}', branch_code=f'BR{code}')
+            for number, (city, code) in enumerate(zip(
+                (rng.choice(CITIES) for _ in range(branches)), branch_code_sequence.take(branches)
+            ))
+        ])
+
+        products = []
+        for code in product_code_sequence.take(max(50, self.lines // 20)):
+            material, item, size = rng.choice(MATERIALS), rng.choice(ITEMS), rng.choice(SIZES)
+            # Barcodes are derived from the product code, so they never collide with each other
+            digits = f'2{code:011d}'
+            products.append(Product(
+                name=f'{material} {item} {size}',
+                category_id=categories[f'{item}s'],
+                brand_id=rng.choice(brands),
+                product_code=f'P{code}',
+                barcode=digits + ean13_check_digit(digits),
+                price=Decimal(rng.randint(50, 5000)) / 100,
+            ))
+        self.products = self.bulk_create(Product, products)
+        # bulk_create skips the post_save signal that keeps the search index in sync
+        for start in range(0, len(self.products), self.batch_size):
+            index_products(self.products[start:start + self.batch_size])
+
+    def create_chunk(self, count):
+        rng = self.random
+        transactions, lines = [], []
+        while len(lines) < count:
+            inward = self.today - timedelta(days=rng.randint(0, 364))
+            delivery = inward + timedelta(days=rng.randint(0, 14))
+            in_transaction = ProductInTransaction(
+                customer_id=rng.choice(self.customers),
+                inward_stock_date=inward,
+                supplier_invoice_number=f'INV-{rng.getrandbits(48):012x}',
+                delivery_date=delivery,
+                is_delivered=delivery <= self.today and rng.random() < 0.85,
+            )
+            transactions.append(in_transaction)
+            for _ in range(min(rng.randint(1, 9), count - len(lines))):
+                product = rng.choice(self.products)
+                quantity = rng.randint(1, 60)
+                lines.append(ProductInTransactionDetail(
+                    transaction=in_transaction,
+                    product_id=product.id,
+                    delivery_date=delivery,
+                    quantity=quantity,
+                    washing_quantity=rng.randint(0, min(3, quantity)),
+                    total=product.price * quantity,
+                    expiry_date=inward + timedelta(days=rng.randint(30, 540)) if rng.random() < 0.4 else None,
+                    remaining_quantity=quantity,
+                ))
+
+        transfers, allocations, expired, defective = self.plan_stock_out(transactions, lines)
+
+        # Children are created after their parents, whose new ids Django copies into them
+        self.bulk_create(ProductInTransaction, transactions)
+        self.bulk_create(ProductInTransactionDetail, lines)
+
+        self.bulk_create(ProductOutTransaction, [out_transaction for out_transaction, _ in transfers])
+        out_lines = []
+        for out_transaction, transfer_lines in transfers:
+            for out_line in transfer_lines:
+                out_line.transaction = out_transaction
+                out_lines.append(out_line)
+        self.bulk_create(ProductOutTransactionDetail, out_lines)
+        self.bulk_create(LotAllocation, allocations)
+        self.bulk_create(ExpiredProduct, expired)
+        self.bulk_create(DefectiveProduct, defective)
+
+        # IN movements mirror the lines one to one, so the database copies them over
+        in_movements = ProductInTransactionDetail.objects.filter(id__range=(lines[0].id, lines[-1].id)).annotate(
+            kind=Value(StockMovement.IN), moment=Value(timezone.now(), output_field=DateTimeField()),
+        ).values_list('product_id', 'quantity', 'transaction_id', 'id', 'kind', 'moment').order_by()
+        self.rows['StockMovement'] += insert_from_select(
+            StockMovement, ['product', 'quantity', 'in_transaction', 'in_detail', 'movement_type', 'created_at'], in_movements
+        )
+        for line in lines:
+            self.stock[line.product_id] += line.quantity
+
+        movements = [
+            StockMovement(product_id=out_line.product_id, movement_type=StockMovement.OUT, quantity=-out_line.qty_requested, out_transaction_id=out_line.transaction_id)
+            for out_line in out_lines
+        ]
+        movements += [
+            StockMovement(product_id=row.product_id, movement_type=StockMovement.EXPIRED, quantity=-row.qty_expired, remarks=row.remarks)
+            for row in expired
+        ]
+        movements += [
+            StockMovement(product_id=row.product_id, movement_type=StockMovement.DEFECTIVE, quantity=-row.qty_defective, remarks=row.remarks)
+            for row in defective
+        ]
+        self.bulk_create(StockMovement, movements)
+        for movement in movements:
+            self.stock[movement.product_id] += movement.quantity
+
+    def plan_stock_out(self, transactions, lines):
+        """Draw transfers and write-offs from this chunk's lots, lowering their remaining quantities."""
+        rng = self.random
+        transfers, allocations, expired, defective = [], [], [], []
+
+        for _ in range(len(transactions) // 3):
+            lots = [lot for lot in rng.sample(lines, min(3, len(lines))) if lot.remaining_quantity]
+            if not lots:
+                continue
+            day = max(lot.transaction.inward_stock_date for lot in lots) + timedelta(days=rng.randint(0, 30))
+            out_transaction = ProductOutTransaction(
+                date=min(day, self.today),
+                branch=rng.choice(self.branches),
+                transfer_invoice_number=f'TR-{rng.getrandbits(48):012x}',
+                branch_in_charge=f'Manager {rng.randint(1, 40)}',
+            )
+            out_lines = []
+            for lot in lots:
+                taken = rng.randint(1, lot.remaining_quantity)
+                lot.remaining_quantity -= taken
+                out_line = ProductOutTransactionDetail(product_id=lot.product_id, qty_requested=taken)
+                out_lines.append(out_line)
+                allocations.append(LotAllocation(out_detail=out_line, in_detail=lot, quantity=taken))
+            transfers.append((out_transaction, out_lines))
+
+        for lot in lines:
+            if not lot.remaining_quantity:
+                continue
+            if lot.expiry_date and lot.expiry_date < self.today and rng.random() < 0.5:
+                expired.append(ExpiredProduct(product_id=lot.product_id, qty_expired=lot.remaining_quantity, expiry_date=lot.expiry_date, remarks='Expired'))
+                lot.remaining_quantity = 0
+            elif rng.random() < 0.02:
+                taken = rng.randint(1, min(3, lot.remaining_quantity))
+                defective.append(DefectiveProduct(product_id=lot.product_id, qty_defective=taken, remarks='Damaged'))
+                lot.remaining_quantity -= taken
+
+        return transfers, allocations, expired, defective
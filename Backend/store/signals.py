@@ -0,0 +1,161 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from store import notifications, rollups
+from store.scan import scan_cache
+from store.search import index_products
+from store.tasks import can_queue_tasks, generate_image_variants
+from store.dashboard import invalidate_dashboard_snapshot
+from store.models import (
+    Brand, Category, Product, ProductImage, ProductInTransaction, ProductInTransactionDetail, ProductOutTransaction, ProductOutTransactionDetail,
+    TotalStock, stock_changed
+)
+
+
+# Drop the dashboard snapshot once the change is committed, so no reader can re-cache stale figures
+@receiver([post_save, post_delete], sender=ProductInTransaction)
+@receiver([post_save, post_delete], sender=ProductInTransactionDetail)
+def in_transaction_changed(sender, **kwargs):
+    transaction.on_commit(invalidate_dashboard_snapshot)
+
+
+def _stored_rollup_key(instance):
+    if instance._state.adding:
+        return None
+    if not hasattr(instance, '_stored_rollup_key'):
+        stored = ProductInTransaction.objects.filter(pk=instance.pk).first()
+        instance._stored_rollup_key = stored.sales_rollup_key() if stored else None
+    return instance._stored_rollup_key
+
+
+@receiver(pre_save, sender=ProductInTransaction)
+def remember_sales_rollup_key(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance._previous_rollup_key = _stored_rollup_key(instance)
+
+
+# Connected before update_sales_rollup, which consumes the remembered key
+@receiver(post_save, sender=ProductInTransaction)
+def announce_delivery(sender, instance, raw=False, **kwargs):
+    # Only delivered transactions have a rollup key, so gaining one means it was just delivered
+    if not raw and instance.sales_rollup_key() and not getattr(instance, '_previous_rollup_key', None):
+        transaction.on_commit(lambda: notifications.in_transaction_delivered(instance))
+
+
+# Move a transaction's lines between rollup rows only when delivery, dates or customer change
+@receiver(post_save, sender=ProductInTransaction)
+def update_sales_rollup(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous, current = instance.__dict__.pop('_previous_rollup_key', None), instance.sales_rollup_key()
+    if previous != current:
+        if previous:
+            rollups.apply_in_transaction(instance.pk, previous, -1)
+        if current:
+            rollups.apply_in_transaction(instance.pk, current, 1)
+    instance._stored_rollup_key = current
+
+
+@receiver(pre_delete, sender=ProductInTransaction)
+def remove_sales_rollup(sender, instance, **kwargs):
+    key = _stored_rollup_key(instance)
+    if key:
+        rollups.apply_in_transaction(instance.pk, key, -1)
+
+
+# Lines edited or removed one by one (e.g. from the admin) on an already delivered transaction
+@receiver(pre_save, sender=ProductInTransactionDetail)
+def remember_sales_line(sender, instance, raw=False, **kwargs):
+    if not raw and not instance._state.adding:
+        instance._previous_line = ProductInTransactionDetail.objects.filter(pk=instance.pk).values_list(
+            'product_id', 'quantity', 'total'
+        ).first()
+
+
+@receiver(post_save, sender=ProductInTransactionDetail)
+def update_sales_line(sender, instance, raw=False, **kwargs):
+    previous = instance.__dict__.pop('_previous_line', None)
+    key = None if raw else instance.transaction.sales_rollup_key()
+    if key:
+        if previous:
+            rollups.apply_in_detail(key, *previous, -1)
+        rollups.apply_in_detail(key, instance.product_id, instance.quantity, instance.total, 1)
+
+
+@receiver(pre_delete, sender=ProductInTransactionDetail)
+def remove_sales_line(sender, instance, origin=None, **kwargs):
+    # Cascades from a transaction are already handled by remove_sales_rollup, and
+    # cascades from a product or customer delete the rollup rows themselves
+    if not isinstance(origin, ProductInTransactionDetail) and getattr(origin, 'model', None) is not ProductInTransactionDetail:
+        return
+    key = instance.transaction.sales_rollup_key()
+    if key:
+        rollups.apply_in_detail(key, instance.product_id, instance.quantity, instance.total, -1)
+
+
+@receiver(post_save, sender=ProductOutTransaction)
+def announce_dispatch(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        transaction.on_commit(lambda: notifications.out_transaction_created(instance))
+
+
+@receiver(post_save, sender=ProductOutTransactionDetail)
+def add_outward_rollup(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        rollups.apply_out_detail(instance, 1)
+
+
+@receiver(pre_delete, sender=ProductOutTransactionDetail)
+def remove_outward_rollup(sender, instance, **kwargs):
+    rollups.apply_out_detail(instance, -1)
+
+
+# Deleting a product cascades to its tokens, so only saves need re-indexing
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and not {'name', 'product_code', 'barcode'} & set(update_fields)):
+        return
+    index_products([instance])
+
+
+# Scan results are dropped right away and again on commit, so a scan that read the old row
+# before the commit cannot keep it cached
+def invalidate_scans(product_ids=None):
+    scan_cache.invalidate(product_ids)
+    transaction.on_commit(lambda: scan_cache.invalidate(product_ids))
+
+
+@receiver([post_save, post_delete], sender=Product)
+def product_scan_changed(sender, instance, **kwargs):
+    invalidate_scans([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=TotalStock)
+def total_stock_scan_changed(sender, instance, **kwargs):
+    invalidate_scans([instance.product_id])
+
+
+@receiver(stock_changed)
+def stock_scan_changed(sender, product_ids, **kwargs):
+    invalidate_scans(product_ids)
+
+
+@receiver(stock_changed)
+def announce_stock_change(sender, deltas, **kwargs):
+    transaction.on_commit(lambda: notifications.stock_changed(deltas))
+
+
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Brand)
+def catalog_scan_changed(sender, **kwargs):
+    invalidate_scans()
+
+
+# Variants are rendered by the worker only once the stored original is committed. Without a
+# broker they are left pending for the process_product_images command
+@receiver(post_save, sender=ProductImage)
+def queue_image_variants(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and can_queue_tasks():
+        transaction.on_commit(lambda: generate_image_variants.delay(instance.pk))
+
@@ -0,0 +1,16 @@
+from celery import shared_task
+from django.conf import settings
+
+from store.models import ProductImage
+
+
+def can_queue_tasks():
+    # Without a broker .delay() has no worker to reach; see the Celery settings
+    return bool(settings.CELERY_BROKER_URL or settings.CELERY_TASK_ALWAYS_EAGER)
+
+
+@shared_task
+def generate_image_variants(image_id):
+    image = ProductImage.objects.filter(pk=image_id).first()
+    if image is not None and not image.variants_ready:
+        image.generate_variants()
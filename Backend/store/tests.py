@@ -1,3 +1,1365 @@
-from django.test import TestCase
+import importlib
+import json
+import os
+import pstats
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+from io import BytesIO, StringIO
+import threading
+import time
+from datetime import date, timedelta
+from unittest import mock, skipUnless
+from urllib.parse import urlsplit
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from channels.layers import channel_layers
+from channels.routing import URLRouter
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.db.models import Sum
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from Backend.metrics import MetricsRegistry, process_running
+from Backend.sqlite3.base import DatabaseWrapper
+from Backend.urls import websocket_urlpatterns
+from Backend.websocket_auth import JWTAuthMiddleware
+from store.models import (
+    Customer, Category, Brand, Product, Branch, ProductInTransactionDetail, TotalStock, StockMovement,
+    CodeSequence, SequenceAllocator, BarcodePool, BarcodeConflict, BarcodePoolManager, ean13_check_digit,
+    ProductInTransaction, ProductOutTransaction, ProductOutTransactionDetail, LotAllocation, InsufficientStock,
+    ExpiredProduct, DefectiveProduct, DailySalesRollup, DailyOutwardRollup, ProductImage, write_off_stock
+)
+from store.api import urls as store_urls
+from store.api.async_views import AsyncDashboardView, AsyncInventoryListView, AsyncReportView, AsyncTransactionView
+from store.api.pagination import StorePageNumberPagination
+from store.api.views import DashboardView, InventoryListView, ReportView, TransactionView
+from store.api.serializers import ProductDetailsReportSerializer
+from store.barcodes import render_barcode, symbology
+from store.budgets import budget_endpoints, budget_fixtures, budget_violations, load_baseline, measure_endpoints, unbudgeted_routes
+from store.importers import ProductImporter
+from store.notifications import EventBatch
+from store.rollups import rebuild_rollups
+from store.scan import ScanCache, scan_cache
+from store.seeding import StoreSeeder
+
+
+class StoreFixturesMixin:
+    @classmethod
+    def create_reference_data(cls):
+        cls.customer = Customer.objects.create(name='Customer', mobile_number='9999999999', email='customer@example.com', location='Kochi')
+        cls.category = Category.objects.create(name='Linen')
+        cls.brand = Brand.objects.create(name='House')
+
+    def create_products(self, count, price=10):
+        return [
+            Product.objects.create(name=f'Product {i}', category=self.category, brand=self.brand, price=price)
+            for i in range(count)
+        ]
+
+    def create_lots(self, product, *lots):
+        # lots are (quantity, days until expiry) pairs
+        in_transaction = ProductInTransaction.objects.create(
+            customer=self.customer, inward_stock_date=date.today(), supplier_invoice_number=f'LOTS-{product.id}', delivery_date=date.today()
+        )
+        details = [
+            ProductInTransactionDetail.objects.create(
+                transaction=in_transaction, product=product, delivery_date=date.today(), quantity=quantity, washing_quantity=0,
+                expiry_date=date.today() + timedelta(days=days) if days is not None else None,
+            )
+            for quantity, days in lots
+        ]
+        in_transaction.post_stock_movements()
+        return details
+
+
+class StoreTestCase(StoreFixturesMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_reference_data()
+
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+        scan_cache.invalidate()
+
+
+class ProductInTransactionBulkCreateTests(StoreTestCase):
+    def post_intake(self, products, invoice):
+        payload = {
+            'customer': self.customer.id,
+            'inward_stock_date': date.today().isoformat(),
+            'supplier_invoice_number': invoice,
+            'delivery_date': date.today().isoformat(),
+            'transaction_details': [
+                {'product': product.id, 'delivery_date': date.today().isoformat(), 'quantity': 3, 'washing_quantity': 0}
+                for product in products
+            ],
+        }
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('product-in-transaction-list-create'), payload, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return len(queries)
+
+    def test_creates_details_with_totals_and_stock(self):
+        products = self.create_products(3, price=12)
+        self.post_intake(products, 'INV-1')
+
+        details = ProductInTransactionDetail.objects.filter(transaction__supplier_invoice_number='INV-1')
+        self.assertEqual(details.count(), 3)
+        self.assertTrue(all(detail.total == 36 for detail in details))
+        self.assertEqual(TotalStock.objects.get(product=products[0]).total_quantity, 3)
+        self.assertEqual(StockMovement.objects.filter(movement_type=StockMovement.IN).count(), 3)
+
+    def test_query_count_does_not_grow_with_lines(self):
+        small = self.post_intake(self.create_products(5), 'INV-SMALL')
+        large = self.post_intake(self.create_products(100), 'INV-LARGE')
+        self.assertEqual(small, large)
+
+
+class StockLedgerTests(StoreTestCase):
+    def test_record_books_movements_and_sums_deltas_per_product(self):
+        first, second = self.create_products(2)
+        StockMovement.objects.record([
+            StockMovement(product=first, movement_type=StockMovement.IN, quantity=10),
+            StockMovement(product=first, movement_type=StockMovement.OUT, quantity=-4),
+            StockMovement(product=second, movement_type=StockMovement.IN, quantity=3),
+            StockMovement(product=second, movement_type=StockMovement.ADJUSTMENT, quantity=0),
+        ])
+
+        self.assertEqual(dict(TotalStock.objects.values_list('product_id', 'total_quantity')), {first.id: 6, second.id: 3})
+        # Zero-quantity movements are not booked
+        self.assertEqual(StockMovement.objects.count(), 3)
+
+    def test_apply_deltas_refuses_to_remove_stock_that_was_never_booked(self):
+        product, = self.create_products(1)
+        with self.assertRaises(TotalStock.DoesNotExist):
+            TotalStock.objects.apply_deltas({product.id: -1})
+        self.assertFalse(TotalStock.objects.exists())
+
+    def test_saving_again_does_not_book_details_twice(self):
+        product, = self.create_products(1)
+        lot, = self.create_lots(product, (10, None))
+
+        lot.transaction.is_delivered = True
+        lot.transaction.save()
+        lot.save()
+        lot.transaction.post_stock_movements()
+
+        self.assertEqual(TotalStock.objects.get(product=product).total_quantity, 10)
+        self.assertEqual(StockMovement.objects.filter(movement_type=StockMovement.IN).count(), 1)
+
+    def test_delete_reverses_stock_still_on_hand(self):
+        product, = self.create_products(1)
+        lot, = self.create_lots(product, (10, None))
+        write_off_stock(StockMovement.DEFECTIVE, [{'product_id': product.id, 'qty': 3}])
+
+        response = self.client.delete(reverse('product-in-transaction-detail', args=[lot.transaction_id]))
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(ProductInTransaction.objects.exists())
+        self.assertEqual(TotalStock.objects.get(product=product).total_quantity, 0)
+        self.assertEqual(
+            list(StockMovement.objects.filter(movement_type=StockMovement.ADJUSTMENT).values_list('quantity', flat=True)), [-7]
+        )
+
+    def test_delete_reverses_lots_booked_before_the_ledger(self):
+        product, = self.create_products(1)
+        lot, = self.create_lots(product, (10, None))
+        # Migration 0004 gave existing lots a zero 'in' row; their stock came in as an opening balance
+        StockMovement.objects.filter(in_detail=lot).update(quantity=0)
+
+        response = self.client.delete(reverse('product-in-transaction-detail', args=[lot.transaction_id]))
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(TotalStock.objects.get(product=product).total_quantity, 0)
+
+    def test_delete_refuses_transactions_with_dispatched_stock(self):
+        product, = self.create_products(1)
+        lot, = self.create_lots(product, (10, None))
+        branch = Branch.objects.create(name='Branch', location='Kochi', contact_details='123')
+        out = ProductOutTransaction.objects.create(branch=branch, transfer_invoice_number='OUT-1', branch_in_charge='Manager')
+        ProductOutTransactionDetail(transaction=out, product=product, qty_requested=6).save()
+
+        response = self.client.delete(reverse('product-in-transaction-detail', args=[lot.transaction_id]))
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(ProductInTransaction.objects.filter(id=lot.transaction_id).exists())
+        self.assertEqual(TotalStock.objects.get(product=product).total_quantity, 4)
+        self.assertEqual(LotAllocation.objects.get().quantity, 6)
+
+
+class StockLedgerConcurrencyTests(StoreFixturesMixin, TransactionTestCase):
+    def test_interleaved_updates_keep_every_delta(self):
+        self.create_reference_data()
+        product, = self.create_products(1)
+        TotalStock.objects.apply_deltas({product.id: 100})
+        barrier = threading.Barrier(2)
+        errors = []
+
+        def update(delta):
+            try:
+                barrier.wait()
+                for attempt in range(200):
+                    try:
+                        StockMovement.objects.record([StockMovement(product=product, movement_type=StockMovement.ADJUSTMENT, quantity=delta)])
+                        return
+                    except OperationalError:
+                        # SQLite reports lock contention instead of waiting; retry like a client would
+                        time.sleep(0.005)
+                errors.append('gave up')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=update, args=(delta,)) for delta in (5, -30)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(TotalStock.objects.get(product=product).total_quantity, 75)
+
+
+class CodeSequenceTests(StoreTestCase):
+    def test_product_and_branch_codes_are_sequential(self):
+        first, second = self.create_products(2)
+        self.assertEqual(int(second.product_code[1:]), int(first.product_code[1:]) + 1)
+
+        branch = Branch.objects.create(name='Main', location='Kochi', contact_details='123')
+        self.assertTrue(branch.branch_code.startswith('BR'))
+
+    def test_take_reserves_a_contiguous_range_in_one_update(self):
+        allocator = SequenceAllocator('test_sequence', start=100)
+        self.assertEqual(allocator.take(3), [100, 101, 102])
+        self.assertEqual(allocator.next_value(), 103)
+        self.assertEqual(CodeSequence.objects.get(name='test_sequence').last_value, 103)
+
+
+class BarcodePoolTests(StoreTestCase):
+    def test_products_get_valid_unique_ean13_barcodes(self):
+        products = self.create_products(20)
+        barcodes = {product.barcode for product in products}
+        self.assertEqual(len(barcodes), 20)
+        for code in barcodes:
+            self.assertEqual(len(code), 13)
+            self.assertEqual(code[-1], ean13_check_digit(code[:12]))
+
+    def test_allocation_from_a_filled_pool_is_constant_cost(self):
+        BarcodePool.objects.refill(300)
+        with CaptureQueriesContext(connection) as queries:
+            codes = BarcodePool.objects.allocate(250)
+        self.assertEqual(len(set(codes)), 250)
+        self.assertLessEqual(len(queries), 4)
+        self.assertEqual(BarcodePool.objects.count(), 50)
+
+
+class BarcodePoolConflictTests(TransactionTestCase):
+    def take_first_code_concurrently(self):
+        free_codes = BarcodePoolManager._free_codes
+        stolen = []
+
+        def read_then_lose_one(queryset, count):
+            # The other caller committed, so the row stays gone after a rollback here
+            BarcodePool.objects.filter(code__in=stolen).delete()
+            claimed = free_codes(queryset, count)
+            if not stolen:
+                # Another caller deletes a row between this caller's read and its delete
+                stolen.append(claimed[0][1])
+                BarcodePool.objects.filter(id=claimed[0][0]).delete()
+            return claimed
+
+        return stolen, mock.patch.object(BarcodePoolManager, '_free_codes', side_effect=read_then_lose_one)
+
+    def test_allocation_starts_over_when_codes_are_taken(self):
+        BarcodePool.objects.refill(10)
+        stolen, lose_one = self.take_first_code_concurrently()
+        with lose_one:
+            codes = BarcodePool.objects.allocate(3)
+        self.assertEqual(len(set(codes)), 3)
+        self.assertNotIn(stolen[0], codes)
+        self.assertEqual(BarcodePool.objects.count(), 6)
+
+    def test_allocation_inside_a_transaction_raises(self):
+        BarcodePool.objects.refill(10)
+        stolen, lose_one = self.take_first_code_concurrently()
+        with lose_one, self.assertRaises(BarcodeConflict), transaction.atomic():
+            BarcodePool.objects.allocate(3)
+        self.assertEqual(BarcodePool.objects.count(), 10)
+
+
+class ProductImportTests(StoreTestCase):
+    def upload(self, content, name='products.csv'):
+        upload = SimpleUploadedFile(name, content.encode('utf-8'), content_type='text/csv')
+        return self.client.post(reverse('product-import'), {'file': upload}, format='multipart')
+
+    def test_imports_rows_and_reports_errors_per_row(self):
+        response = self.upload(
+            "name,category,brand,price,product_code\n"
+            "Bedsheet,Linen,House,40,\n"
+            "Towel,Bath,New Brand,15.5,\n"
+            ",Linen,House,10,\n"
+            "Pillow,Linen,House,abc,\n"
+            "Blanket,Linen,House,90,X1\n"
+            "Quilt,Linen,House,95,X1\n"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['rows'], 6)
+        self.assertEqual(response.data['created'], 3)
+        self.assertEqual([error['row'] for error in response.data['errors']], [4, 5, 7])
+
+        towel = Product.objects.get(name='Towel')
+        self.assertEqual(towel.brand.name, 'New Brand')
+        self.assertTrue(towel.product_code.startswith('P'))
+        self.assertEqual(len(towel.barcode), 13)
+
+    def test_rejects_unknown_file_types(self):
+        self.assertEqual(self.upload("name\n", name='products.txt').status_code, 400)
+
+    def test_rejects_codes_reserved_for_the_sequence(self):
+        response = self.upload(
+            "name,category,brand,product_code\n"
+            "Bedsheet,Linen,House,\n"
+            "Towel,Linen,House,P5001\n"
+            "Pillow,Linen,House,P5003\n"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual([(error['row'], list(error['errors'])) for error in response.data['errors']], [(3, ['product_code']), (4, ['product_code'])])
+
+        # Generated codes keep working past the rejected ones
+        codes = {Product.objects.create(name='Next', category=self.category, brand=self.brand).product_code for _ in range(3)}
+        self.assertEqual(len(codes | {Product.objects.get(name='Bedsheet').product_code}), 4)
+
+    def test_supplied_barcodes_leave_the_pool(self):
+        BarcodePool.objects.refill(3)
+        pooled = BarcodePool.objects.order_by('id').values_list('code', flat=True).first()
+
+        response = self.upload(f"name,category,brand,barcode\nBedsheet,Linen,House,{pooled}\n")
+        self.assertEqual(response.data['created'], 1)
+        self.assertFalse(BarcodePool.objects.filter(code=pooled).exists())
+        self.assertNotIn(pooled, BarcodePool.objects.allocate(2))
+
+    def test_failed_chunk_is_reported_and_earlier_chunks_are_kept(self):
+        bulk_create = Product.objects.bulk_create
+
+        def collide(products, *args, **kwargs):
+            if any(product.name == 'Towel' for product in products):
+                raise IntegrityError("UNIQUE constraint failed: store_product.barcode")
+            return bulk_create(products, *args, **kwargs)
+
+        with mock.patch.object(ProductImporter, 'chunk_size', 1), mock.patch.object(Product.objects, 'bulk_create', side_effect=collide):
+            response = self.upload("name,category,brand\nBedsheet,Linen,House\nTowel,Linen,House\nPillow,Linen,House\n")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual([error['row'] for error in response.data['errors']], [3])
+        self.assertEqual(set(Product.objects.values_list('name', flat=True)), {'Bedsheet', 'Pillow'})
+
+
+class LotAllocationTests(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.branch = Branch.objects.create(name='Branch', location='Kochi', contact_details='123')
+
+    def test_allocates_earliest_expiry_first_and_records_lots(self):
+        product, = self.create_products(1)
+        no_expiry, late, early = self.create_lots(product, (5, None), (5, 30), (5, 10))
+
+        response = self.client.post(reverse('product-out-transaction-list-create'), {
+            'branch': self.branch.branch_code,
+            'transfer_invoice_number': 'OUT-1',
+            'branch_in_charge': 'Manager',
+            'transaction_details': [{'product': product.id, 'qty_requested': 8}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+
+        allocations = dict(LotAllocation.objects.values_list('in_detail_id', 'quantity'))
+        self.assertEqual(allocations, {early.id: 5, late.id: 3})
+        self.assertEqual(TotalStock.objects.get(product=product).total_quantity, 7)
+
+    def test_shortfall_rolls_back_the_whole_transfer(self):
+        product, = self.create_products(1)
+        lot, = self.create_lots(product, (4, 10))
+
+        response = self.client.post(reverse('product-out-transaction-list-create'), {
+            'branch': self.branch.branch_code,
+            'transfer_invoice_number': 'OUT-2',
+            'branch_in_charge': 'Manager',
+            'transaction_details': [{'product': product.id, 'qty_requested': 3}, {'product': product.id, 'qty_requested': 3}],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ProductOutTransaction.objects.exists())
+        lot.refresh_from_db()
+        self.assertEqual(lot.remaining_quantity, 4)
+
+
+class LotAllocationConcurrencyTests(StoreFixturesMixin, TransactionTestCase):
+    def test_parallel_dispatches_never_oversell(self):
+        self.create_reference_data()
+        product, = self.create_products(1)
+        self.create_lots(product, (10, 5), (10, 10), (10, None))
+        branch = Branch.objects.create(name='Branch', location='Kochi', contact_details='123')
+
+        results = []
+
+        def dispatch(number):
+            try:
+                for attempt in range(200):
+                    try:
+                        with transaction.atomic():
+                            out = ProductOutTransaction.objects.create(
+                                branch=branch, transfer_invoice_number=f'OUT-{number}', branch_in_charge='Manager'
+                            )
+                            ProductOutTransactionDetail(transaction=out, product=product, qty_requested=4).save()
+                        results.append('dispatched')
+                        return
+                    except InsufficientStock:
+                        results.append('short')
+                        return
+                    except OperationalError:
+                        # SQLite reports lock contention instead of waiting; retry like a client would
+                        time.sleep(0.005)
+                results.append('gave up')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=dispatch, args=(number,)) for number in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # 30 units in stock, ten requests of 4: exactly seven can be served
+        self.assertEqual(results.count('dispatched'), 7)
+        self.assertEqual(results.count('short'), 3)
+        self.assertEqual(sum(LotAllocation.objects.values_list('quantity', flat=True)), 28)
+        self.assertEqual(sum(ProductInTransactionDetail.objects.values_list('remaining_quantity', flat=True)), 2)
+        self.assertEqual(TotalStock.objects.get(product=product).total_quantity, 2)
+
+
+class BatchRemoveProductTests(StoreTestCase):
+    def test_removes_many_products_in_constant_queries(self):
+        products = self.create_products(30)
+        for product in products:
+            self.create_lots(product, (5, -3), (5, -1))
+        broke = self.create_products(1)[0]
+
+        items = [{'product_id': product.id, 'qty': 7} for product in products] + [{'product_id': broke.id, 'qty': 1}]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('remove-products-batch'), {'type': 'expired', 'remarks': 'EOD', 'items': items}, format='json')
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual((response.data['removed'], response.data['failed']), (30, 1))
+        self.assertEqual(response.data['results'][-1]['status'], 'failed')
+        self.assertLess(len(queries), 20)
+
+        self.assertEqual(ExpiredProduct.objects.count(), 60)
+        self.assertEqual(ExpiredProduct.objects.filter(product=products[0]).get(qty_expired=2).expiry_date, date.today() - timedelta(days=1))
+        self.assertEqual(TotalStock.objects.get(product=products[0]).total_quantity, 3)
+
+    def test_expired_removal_ignores_lots_that_have_not_expired(self):
+        product, = self.create_products(1)
+        self.create_lots(product, (5, 10))
+
+        response = self.client.post(reverse('remove-expired-product'), {'product_id': product.id, 'qty_to_remove': 2}, format='json')
+        self.assertEqual(response.status_code, 404)
+
+        response = self.client.post(reverse('remove-defective-product'), {'product_id': product.id, 'qty_to_remove': 2}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(DefectiveProduct.objects.get().qty_defective, 2)
+        self.assertEqual(TotalStock.objects.get(product=product).total_quantity, 3)
+
+
+class DashboardTests(StoreTestCase):
+    def test_snapshot_is_cached_until_a_delivery_changes(self):
+        product, = self.create_products(1, price=5)
+        self.create_lots(product, (4, None))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(response.data['pending_orders'], 1)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('dashboard'))
+        self.assertEqual(len(queries), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse('update-delivery-status', args=[f'LOTS-{product.id}']))
+
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual((response.data['pending_orders'], response.data['completed_orders']), (0, 1))
+        self.assertEqual(response.data['total_revenue'], 20)
+
+
+class ReportExportTests(StoreTestCase):
+    def test_streams_csv_and_ndjson(self):
+        product, = self.create_products(1, price=5)
+        self.create_lots(product, (4, None), (2, None))
+        url = reverse('report_view', args=['transaction-in'])
+
+        response = self.client.get(url, {'export': 'csv'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].startswith('supplier_invoice_number,customer_name'))
+
+        response = self.client.get(reverse('report_view', args=['daily']), {'export': 'ndjson'})
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['section'] for row in rows], ['in', 'in'])
+        self.assertEqual(rows[0]['total'], '20.00')
+
+    def test_product_details_export_matches_the_report(self):
+        product, = self.create_products(1, price=5)
+        self.create_lots(product, (4, None), (2, 10))
+        url = reverse('report_view', args=['product-details'])
+
+        report = json.loads(self.client.get(url).content)['product_details']
+        response = self.client.get(url, {'export': 'ndjson'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()], report)
+
+        lines = b''.join(self.client.get(url, {'export': 'csv'}).streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], ','.join(report[0]))
+        self.assertEqual(len(lines), 3)
+
+    def test_rejects_unknown_export_format(self):
+        response = self.client.get(reverse('report_view', args=['sales']), {'export': 'xml'})
+        self.assertEqual(response.status_code, 400)
+
+
+class DailyRollupTests(StoreTestCase):
+    def rollup_rows(self):
+        return list(DailySalesRollup.objects.values_list('product_id', 'quantity', 'total', 'lines').order_by('product_id'))
+
+    def test_delivery_and_deletes_keep_rollups_in_step(self):
+        first, second = self.create_products(2, price=5)
+        self.create_lots(first, (4, None), (2, None))
+        self.assertEqual(self.rollup_rows(), [])
+
+        self.client.patch(reverse('update-delivery-status', args=[f'LOTS-{first.id}']))
+        self.assertEqual(self.rollup_rows(), [(first.id, 6, 30, 2)])
+
+        lot, = self.create_lots(second, (3, None))
+        lot.transaction.is_delivered = True
+        lot.transaction.save()
+        lot.transaction.delivery_date = date.today() + timedelta(days=1)
+        lot.transaction.save()
+        self.assertEqual(DailySalesRollup.objects.get(product=second).delivery_date, date.today() + timedelta(days=1))
+
+        lot.transaction.delete()
+        self.assertEqual(self.rollup_rows(), [(first.id, 6, 30, 2)])
+
+        branch = Branch.objects.create(name='Main', location='Kochi', contact_details='1')
+        out_transaction = ProductOutTransaction.objects.create(branch=branch, transfer_invoice_number='OUT-1', branch_in_charge='Asha')
+        ProductOutTransactionDetail.objects.create(transaction=out_transaction, product=first, qty_requested=5)
+        self.assertEqual(list(DailyOutwardRollup.objects.values_list('product_id', 'quantity', 'lines')), [(first.id, 5, 1)])
+
+        DailySalesRollup.objects.all().delete()
+        DailyOutwardRollup.objects.all().delete()
+        self.assertEqual(rebuild_rollups(), (1, 1))
+        self.assertEqual(self.rollup_rows(), [(first.id, 6, 30, 2)])
+
+    def test_reports_read_from_rollups(self):
+        product, = self.create_products(1, price=5)
+        self.create_lots(product, (4, None), (2, None))
+        self.client.patch(reverse('update-delivery-status', args=[f'LOTS-{product.id}']))
+
+        response = self.client.get(reverse('report_view', args=['sales']), {
+            'start_date': date.today().isoformat(), 'end_date': date.today().isoformat(),
+        })
+        self.assertEqual(response.data['total_sales'], 30)
+        self.assertEqual([line['quantity'] for line in response.data['sales_details']], [4, 2])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('report_view', args=['sales']), {
+                'start_date': date.today().isoformat(), 'end_date': date.today().isoformat(), 'breakdown': 'daily',
+            })
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(response.data['total_sales'], 30)
+        self.assertNotIn('sales_details', response.data)
+        self.assertEqual(response.data['daily_sales'][0]['quantity_sold'], 6)
+
+        response = self.client.get(reverse('report_view', args=['daily']))
+        self.assertEqual(response.data['total_sales_today'], 30)
+
+    def test_bump_accepts_different_measures_per_product(self):
+        first, second = self.create_products(2)
+        key = {'day': date.today(), 'delivery_date': date.today(), 'customer_id': self.customer.id}
+        DailySalesRollup.objects.bump(key, {first.id: {'quantity': 2, 'lines': 1}, second.id: {'quantity': 3, 'total': 9, 'lines': 1}})
+        DailySalesRollup.objects.bump(key, {first.id: {'total': 4}, second.id: {'quantity': 1}})
+        self.assertEqual(self.rollup_rows(), [(first.id, 2, 4, 1), (second.id, 4, 9, 1)])
+
+
+class TransactionDetailQueryTests(StoreTestCase):
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_report_queries_do_not_grow_with_rows(self):
+        urls = [reverse('report_view', args=[report]) for report in ('transaction-in', 'transaction-out', 'daily')]
+        products = self.create_products(12)
+
+        for product in products[:2]:
+            self.create_lots(product, (2, None), (3, None))
+        few = [self.count_queries(url) for url in urls]
+
+        for product in products[2:]:
+            self.create_lots(product, (2, None), (3, None))
+        self.assertEqual([self.count_queries(url) for url in urls], few)
+
+        first = f'LOTS-{products[0].id}'
+        self.assertEqual(self.count_queries(reverse('transaction_by_invoice', args=[first])), 2)
+
+
+class ProductDetailsReportTests(StoreTestCase):
+    def test_outward_totals_come_from_one_query(self):
+        products = self.create_products(3)
+        for product in products:
+            self.create_lots(product, (10, None), (5, None))
+        branch = Branch.objects.create(name='Main', location='Kochi', contact_details='1')
+        out_transaction = ProductOutTransaction.objects.create(branch=branch, transfer_invoice_number='OUT-1', branch_in_charge='Asha')
+        for quantity in (4, 3):
+            ProductOutTransactionDetail.objects.create(transaction=out_transaction, product=products[0], qty_requested=quantity)
+
+        with CaptureQueriesContext(connection) as queries:
+            data = ProductDetailsReportSerializer(
+                ProductInTransactionDetail.objects.with_outward_totals().order_by('id'), many=True
+            ).data
+        self.assertEqual(len(queries), 1)
+        self.assertEqual([row['outward_qty'] for row in data], [7, 7, 0, 0, 0, 0])
+
+    def test_report_is_one_query(self):
+        products = self.create_products(2)
+        for product in products:
+            self.create_lots(product, (10, None))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('report_view', args=['product-details']))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual([(row['product_detail'], row['quantity'], row['outward_qty']) for row in response.data['product_details']], [
+            ('Product 0', 10, 0), ('Product 1', 10, 0),
+        ])
+
+
+class PaginationTests(StoreTestCase):
+    def test_page_size_is_client_selectable_and_capped(self):
+        self.create_products(12)
+        response = self.client.get(reverse('product-list-create'), {'page_size': 5})
+        self.assertEqual((response.data['count'], len(response.data['results'])), (12, 5))
+
+        with mock.patch.object(StorePageNumberPagination, 'max_page_size', 8):
+            response = self.client.get(reverse('product-list-create'), {'page_size': 100000})
+        self.assertEqual(len(response.data['results']), 8)
+
+    def test_cursor_pages_walk_every_row_without_counting(self):
+        products = self.create_products(12)
+        url, seen = reverse('product-list-create') + '?pagination=cursor&page_size=5', []
+
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertFalse(any('COUNT(' in query['sql'] for query in queries.captured_queries))
+            self.assertNotIn('count', response.data)
+            seen += [product['id'] for product in response.data['results']]
+            url = response.data['next']
+
+        self.assertEqual(seen, sorted((product.id for product in products), reverse=True))
+
+
+class ProductSearchTests(StoreTestCase):
+    def search(self, query):
+        response = self.client.get(reverse('search_product_codes'), {'query': query})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_ranks_code_prefixes_then_fuzzy_names_with_stock(self):
+        towel = Product.objects.create(name='Bath Towel', category=self.category, brand=self.brand, product_code='TW-100')
+        Product.objects.create(name='Pillow Cover', category=self.category, brand=self.brand, product_code='PC-200')
+        self.create_lots(towel, (7, None))
+
+        with CaptureQueriesContext(connection) as queries:
+            results = self.search('tw-1')
+        self.assertEqual(len(queries), 1)
+        self.assertEqual([(row['id'], row['stock']) for row in results], [(towel.id, 7)])
+
+        self.assertEqual([row['name'] for row in self.search('towl')], ['Bath Towel'])
+        self.assertEqual([row['name'] for row in self.search('pilow')], ['Pillow Cover'])
+        self.assertEqual([row['name'] for row in self.search(towel.barcode[:6])][:1], ['Bath Towel'])
+
+    def test_index_follows_product_changes(self):
+        product = Product.objects.create(name='Duvet', category=self.category, brand=self.brand)
+        product.name = 'Blanket'
+        product.save()
+        self.assertEqual(self.search('duvet'), [])
+        self.assertEqual([row['id'] for row in self.search('blanket')], [product.id])
+
+        product.delete()
+        self.assertEqual(self.search('blanket'), [])
+
+
+class ProductScanTests(StoreTestCase):
+    def scan(self, barcode):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('product-scan', args=[barcode]))
+        return response, len(queries)
+
+    def test_repeated_scans_are_served_from_the_cache_until_stock_or_price_changes(self):
+        product, = self.create_products(1, price=12)
+        self.create_lots(product, (5, None))
+
+        response, queries = self.scan(product.barcode)
+        self.assertEqual(queries, 1)
+        self.assertEqual((response.data['name'], response.data['stock'], response.data['category_name']), (product.name, 5, 'Linen'))
+        self.assertEqual(self.scan(product.barcode)[1], 0)
+
+        self.create_lots(product, (2, None))
+        response, queries = self.scan(product.barcode)
+        self.assertEqual((queries, response.data['stock']), (1, 7))
+
+        product.price = 15
+        product.save()
+        self.assertEqual(str(self.scan(product.barcode)[0].data['price']), '15.00')
+
+        self.assertEqual(self.scan('0000000000000')[0].status_code, 404)
+
+    def test_cache_is_bounded_and_skips_results_read_before_an_invalidation(self):
+        lru = ScanCache(maxsize=2, timeout=60)
+        for product_id in (1, 2, 3):
+            lru.set(f'code-{product_id}', {'id': product_id}, lru.generation)
+        self.assertEqual((len(lru), lru.get('code-1')), (2, None))
+
+        generation = lru.generation
+        lru.invalidate([2])
+        lru.set('code-2', {'id': 2}, generation)
+        self.assertIsNone(lru.get('code-2'))
+
+
+class ProductImageTests(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = self.settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def upload(self, name):
+        from PIL import Image
+
+        content = BytesIO()
+        Image.new('RGB', (1200, 900), 'teal').save(content, 'PNG')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('product-list-create'), {
+                'name': name, 'category': self.category.id, 'brand': self.brand.id, 'price': '5.00',
+                'image': SimpleUploadedFile('photo.png', content.getvalue(), content_type='image/png'),
+            }, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data
+
+    def test_variants_are_generated_and_identical_uploads_share_them(self):
+        first = self.upload('Towel')
+        self.assertIsNone(first['image_variants'])
+
+        # No broker is configured, so the upload left the variants to the command
+        image = ProductImage.objects.get()
+        self.assertFalse(image.variants_ready)
+        call_command('process_product_images', stdout=StringIO())
+        image.refresh_from_db()
+        self.assertTrue(image.variants_ready)
+        variants = self.client.get(reverse('product-detail', args=[first['id']])).data['image_variants']
+        self.assertTrue(variants['thumbnail']['webp'].endswith(f'{image.sha256}/thumbnail.webp'))
+
+        from PIL import Image
+        with default_storage.open(image.variant_name('medium', 'jpg')) as medium:
+            self.assertEqual(Image.open(medium).size, (640, 480))
+
+        second = self.upload('Towel XL')
+        self.assertEqual(ProductImage.objects.count(), 1)
+        self.assertEqual(second['image'], first['image'])
+        self.assertEqual(Product.objects.filter(image_asset=image).count(), 2)
+
+    def test_uploads_queue_variants_when_a_broker_is_configured(self):
+        with self.settings(CELERY_BROKER_URL='redis://broker:6379/0'), mock.patch('store.signals.generate_image_variants.delay') as delay:
+            self.upload('Towel')
+        delay.assert_called_once_with(ProductImage.objects.get().pk)
+        self.assertFalse(ProductImage.objects.get().variants_ready)
+
+
+
+class BarcodeRenderingTests(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        settings_override = self.settings(BARCODE_CACHE_DIR=cache_dir, LABEL_WORKERS=1)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_barcodes_are_rendered_once_and_revalidated_by_etag(self):
+        product, = self.create_products(1)
+        url = reverse('product-barcode', args=[product.id, 'svg'])
+
+        with mock.patch('store.barcodes.render_barcode', wraps=render_barcode) as render:
+            response = self.client.get(url, HTTP_ACCEPT='image/*')
+            self.assertEqual((response.status_code, response['Content-Type']), (200, 'image/svg+xml'))
+            self.assertIn(b'<svg', b''.join(response.streaming_content))
+
+            self.assertEqual(self.client.get(url).status_code, 200)
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+            self.assertEqual(render.call_count, 1)
+
+        png = self.client.get(reverse('product-barcode', args=[product.id, 'png']))
+        self.assertTrue(b''.join(png.streaming_content).startswith(b'\x89PNG'))
+        self.assertEqual(self.client.get(reverse('product-barcode', args=[product.id, 'gif'])).status_code, 400)
+        self.assertEqual(self.client.get(reverse('product-barcode', args=[0, 'svg'])).status_code, 404)
+
+    def test_only_valid_ean13_codes_are_printed_as_ean13(self):
+        self.assertEqual(symbology('4006381333931'), 'ean13')
+        self.assertEqual(symbology('4006381333932'), 'code128')
+        self.assertEqual(symbology('P5001'), 'code128')
+
+    def test_label_sheet_is_a_multi_page_pdf(self):
+        first, second = self.create_products(2)
+        response = self.client.post(reverse('product-labels'), {
+            'items': [{'product_id': first.id, 'copies': 30}, {'product_id': second.id}],
+        }, format='json', HTTP_ACCEPT='application/pdf')
+
+        self.assertEqual((response.status_code, response['Content-Type']), (200, 'application/pdf'))
+        self.assertTrue(response.content.startswith(b'%PDF'))
+        self.assertEqual(response.content.count(b'/Type /Page\n'), 2)
+
+        response = self.client.post(reverse('product-labels'), {'items': [{'product_id': 0}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        with self.settings(LABEL_SHEET_MAX_LABELS=10):
+            response = self.client.post(reverse('product-labels'), {'items': [{'product_id': first.id, 'copies': 11}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+@skipUnless(settings.DB_PROFILE == 'sqlite', "Only the tuned SQLite profile sets pragmas")
+class DatabaseProfileTests(SimpleTestCase):
+    def test_sqlite_connections_use_wal_and_immediate_transactions(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        database = DatabaseWrapper({**connection.settings_dict, 'NAME': f'{directory}/profile.sqlite3'}, alias='profile')
+        self.addCleanup(database.close)
+
+        with database.cursor() as cursor:
+            pragmas = [cursor.execute(f'PRAGMA {name}').fetchone()[0] for name in ('journal_mode', 'synchronous', 'busy_timeout')]
+        self.assertEqual(pragmas, ['wal', 1, settings.SQLITE_PRAGMAS['busy_timeout']])
+
+        with CaptureQueriesContext(database) as queries:
+            database.set_autocommit(False, force_begin_transaction_with_broken_autocommit=True)
+            database.rollback()
+        self.assertEqual(queries[0]['sql'], 'BEGIN IMMEDIATE')
+
+
+class QueryPlanTests(StoreTestCase):
+    """
+    Every query an endpoint runs is passed through EXPLAIN QUERY PLAN, and a full scan of a
+    large table fails the test. No ANALYZE is run, so SQLite plans as if the tables were large
+    and the plans match production rather than the handful of seeded rows.
+    """
+
+    LARGE_TABLES = {
+        model._meta.db_table for model in (
+            Product, ProductInTransaction, ProductInTransactionDetail, ProductOutTransactionDetail,
+            StockMovement, LotAllocation, TotalStock, DailySalesRollup, DailyOutwardRollup,
+        )
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.branch = Branch.objects.create(name='Branch', location='Kochi', contact_details='123')
+
+    def setUp(self):
+        super().setUp()
+        self.products = self.create_products(4)
+        for product in self.products:
+            self.create_lots(product, (5, -3), (5, 30))
+        ProductInTransaction.objects.filter(transaction_details__product=self.products[0]).update(is_delivered=True)
+
+    def full_scans(self, method, url, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data, format='json')
+        self.assertLess(response.status_code, 300, getattr(response, 'data', None))
+
+        scans = []
+        with connection.cursor() as cursor:
+            for query in queries:
+                sql = query['sql']
+                if not sql.startswith(('SELECT', 'UPDATE', 'DELETE', 'INSERT')):
+                    continue
+                # Plans name subquery tables by their alias ("store_product" U0)
+                aliases = {alias: table for table, alias in re.findall(r'"(\w+)" (U\d+)\b', sql)}
+                for *_, detail in cursor.execute(f'EXPLAIN QUERY PLAN {sql}').fetchall():
+                    # A bare SCAN reads the whole table; SCAN ... USING INDEX only walks a (partial) index
+                    table = re.fullmatch(r'SCAN (\w+)', detail)
+                    if table and aliases.get(table.group(1), table.group(1)) in self.LARGE_TABLES:
+                        scans.append(f'{detail}: {sql}')
+        return scans
+
+    def test_hot_queries_use_indexes(self):
+        invoice = f'LOTS-{self.products[1].id}'
+        today = date.today().isoformat()
+        cases = [
+            ('pending invoices', 'get', reverse('all_supplier_invoices'), None),
+            ('transaction by invoice', 'get', reverse('transaction_by_invoice', args=[invoice]), None),
+            ('inventory', 'get', reverse('inventory-list'), None),
+            ('overdue inventory', 'get', reverse('inventory-list') + '?exceeded_delivery=true', None),
+            ('expired products', 'get', reverse('expired-product-list'), None),
+            ('transaction-in report', 'get', reverse('report_view', args=['transaction-in']), None),
+            ('transaction-out report', 'get', reverse('report_view', args=['transaction-out']), None),
+            ('daily report', 'get', reverse('report_view', args=['daily']), None),
+            ('sales report', 'get', reverse('report_view', args=['sales']) + f'?start_date={today}&end_date={today}', None),
+            ('barcode scan', 'get', reverse('product-scan', args=[self.products[2].barcode]), None),
+            ('dispatch', 'post', reverse('product-out-transaction-list-create'), {
+                'branch': self.branch.branch_code, 'transfer_invoice_number': 'OUT-1', 'branch_in_charge': 'Manager',
+                'transaction_details': [{'product': self.products[2].id, 'qty_requested': 2}],
+            }),
+            ('delivery', 'patch', reverse('update-delivery-status', args=[invoice]), None),
+        ]
+        for name, method, url, data in cases:
+            with self.subTest(name):
+                self.assertEqual(self.full_scans(method, url, data), [])
+
+
+class ProfilingMiddlewareTests(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, profile_dir)
+        settings_override = self.settings(PROFILING_ENABLED=True, PROFILING_DIR=profile_dir, PROFILING_SAMPLE_RATE=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        # The middleware chain is built on a client's first request, after the override
+        self.client = APIClient()
+        self.create_products(3)
+
+    def get_logged(self, url, **params):
+        with self.assertLogs('Backend.profiling', 'INFO') as logs:
+            response = self.client.get(url, params)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        line, = logs.records
+        return response, json.loads(line.getMessage())
+
+    def test_reports_queries_and_timings(self):
+        with CaptureQueriesContext(connection) as queries:
+            response, logged = self.get_logged(reverse('product-list-create'))
+
+        self.assertEqual(logged['queries'], len(queries))
+        self.assertEqual((logged['route'], logged['status'], logged['profile']), ('store/products/', 200, None))
+        self.assertGreater(logged['serializer_ms'], 0)
+        self.assertLessEqual(logged['db_ms'] + logged['serializer_ms'], logged['total_ms'])
+        self.assertRegex(
+            response['Server-Timing'],
+            rf'^db;dur=[\d.]+;desc="{len(queries)} queries", serialize;dur=[\d.]+, total;dur=[\d.]+$',
+        )
+
+    def test_streamed_responses_are_logged_after_streaming(self):
+        response, logged = self.get_logged(reverse('report_view', args=['transaction-in']), export='csv')
+        self.assertEqual(logged['queries'], 1)
+        self.assertIn('Server-Timing', response)
+
+    def test_keeps_sampled_profiles_of_slow_requests(self):
+        with self.settings(PROFILING_SAMPLE_RATE=1, PROFILING_SLOW_MS=0):
+            _, logged = self.get_logged(reverse('dashboard'))
+        self.assertTrue(logged['profile'].startswith(settings.PROFILING_DIR))
+        self.assertTrue(pstats.Stats(logged['profile']).total_calls)
+
+        with self.settings(PROFILING_SAMPLE_RATE=1, PROFILING_SLOW_MS=60000):
+            _, logged = self.get_logged(reverse('dashboard'))
+        self.assertIsNone(logged['profile'])
+
+    async def test_async_requests_are_measured(self):
+        # Under ASGI the queries run on another thread than the middleware
+        with self.assertLogs('Backend.profiling', 'INFO') as logs:
+            response = await self.async_client.get(reverse('product-list-create'))
+        logged = json.loads(logs.records[0].getMessage())
+
+        # The count and the page
+        self.assertEqual((logged['route'], logged['status'], logged['queries']), ('store/products/', 200, 2))
+        self.assertIn('desc="2 queries"', response['Server-Timing'])
+
+    def test_disabled_by_default(self):
+        with self.settings(PROFILING_ENABLED=False):
+            response = APIClient().get(reverse('dashboard'))
+        self.assertNotIn('Server-Timing', response)
+
+
+class MetricsTests(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, metrics_dir)
+        settings_override = self.settings(METRICS_ENABLED=True, METRICS_DIR=metrics_dir, METRICS_FLUSH_INTERVAL=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.admin = get_user_model().objects.create_user('admin', password='x', is_staff=True)
+        self.admin_client = APIClient()
+        self.admin_client.force_authenticate(self.admin)
+
+    def sample(self, name, **labels):
+        text = self.admin_client.get(reverse('metrics')).content.decode()
+        label_text = ','.join(f'{key}="{value}"' for key, value in sorted(labels.items()))
+        match = re.search(rf'^{re.escape(name)}{re.escape("{" + label_text + "}" if labels else "")} (\S+)$', text, re.M)
+        return float(match.group(1)) if match else 0
+
+    def test_processes_are_summed(self):
+        first, second = MetricsRegistry(), MetricsRegistry()
+        first.inc('out_allocations_total', amount=2)
+        second.inc('out_allocations_total', amount=3)
+        second.observe('http_request_queries', 4, {'route': 'store/products/', 'method': 'GET'})
+        first.flush()
+
+        text = first.render()
+        self.assertIn('out_allocations_total 5\n', text)
+        self.assertIn('http_request_queries_bucket{method="GET",route="store/products/",le="2"} 0\n', text)
+        self.assertIn('http_request_queries_bucket{method="GET",route="store/products/",le="5"} 1\n', text)
+        self.assertIn('http_request_queries_bucket{method="GET",route="store/products/",le="+Inf"} 1\n', text)
+        self.assertIn('http_request_queries_sum{method="GET",route="store/products/"} 4\n', text)
+
+    def test_exited_processes_are_folded_into_one_file(self):
+        exited = subprocess.Popen([sys.executable, '-c', '']).pid
+        os.waitpid(exited, 0)
+        for pid, amount in ((exited, 2), (exited, 3), (os.getpid(), 4)):
+            with open(os.path.join(settings.METRICS_DIR, f'{pid}-{amount}.json'), 'w') as snapshot:
+                json.dump({'out_allocations_total': {MetricsRegistry.key(None): amount}}, snapshot)
+
+        registry = MetricsRegistry()
+        registry.fold_exited()
+        registry.fold_exited()
+
+        self.assertEqual(sorted(os.listdir(settings.METRICS_DIR)), ['.lock', f'{os.getpid()}-4.json', 'exited.json'])
+        self.assertIn('out_allocations_total 9\n', registry.render())
+
+    def test_process_liveness_is_checked_without_signalling(self):
+        exited = subprocess.Popen([sys.executable, '-c', '']).pid
+        os.waitpid(exited, 0)
+        self.assertTrue(process_running(os.getpid()))
+        self.assertFalse(process_running(exited))
+
+    def test_requests_are_counted_by_route(self):
+        route = {'route': 'store/products/<int:pk>/', 'method': 'GET'}
+        before = self.sample('http_requests_total', status='404', **route)
+        self.client.get(reverse('product-detail', args=[999]))
+        self.client.get(reverse('product-detail', args=[998]))
+
+        self.assertEqual(self.sample('http_requests_total', status='404', **route), before + 2)
+        self.assertGreaterEqual(self.sample('http_request_duration_seconds_count', **route), 2)
+        self.assertGreaterEqual(self.sample('http_request_queries_count', **route), 2)
+
+    def test_async_requests_are_counted(self):
+        self.create_products(3)
+        route = {'route': 'store/products/', 'method': 'GET'}
+        queries = self.sample('http_request_queries_sum', **route)
+        async_to_sync(self.async_client.get)(reverse('product-list-create'))
+        self.assertEqual(self.sample('http_request_queries_sum', **route), queries + 2)
+
+    def test_committed_stock_changes_are_counted(self):
+        product, = self.create_products(1)
+        branch = Branch.objects.create(name='Main', location='Kochi', contact_details='1')
+        movements = self.sample('stock_movements_total', type='out')
+        units = self.sample('out_allocated_units_total')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_lots(product, (4, None), (4, None))
+            self.client.post(reverse('product-out-transaction-list-create'), {
+                'branch': branch.branch_code, 'transfer_invoice_number': 'OUT-1', 'branch_in_charge': 'Asha',
+                'transaction_details': [{'product': product.id, 'qty_requested': 6}],
+            }, format='json')
+
+        self.assertEqual(self.sample('stock_movements_total', type='out'), movements + 1)
+        self.assertEqual(self.sample('out_allocated_units_total'), units + 6)
+
+    def test_nothing_is_written_when_disabled(self):
+        product, = self.create_products(1)
+        with self.settings(METRICS_ENABLED=False), self.captureOnCommitCallbacks(execute=True):
+            self.create_lots(product, (4, None))
+        self.assertEqual(os.listdir(settings.METRICS_DIR), [])
+
+    def test_admin_only(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+        self.client.force_authenticate(get_user_model().objects.create_user('clerk', password='x'))
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+
+        response = self.admin_client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+
+class SeedStoreTests(TestCase):
+    def ledger(self):
+        return (
+            TotalStock.objects.aggregate(total=Sum('total_quantity'))['total'],
+            ProductInTransactionDetail.objects.aggregate(total=Sum('remaining_quantity'))['total'],
+            StockMovement.objects.aggregate(total=Sum('quantity'))['total'],
+        )
+
+    def test_seeded_stock_agrees_everywhere(self):
+        call_command('seed_store', lines=600, seed=3, interactive=False, stdout=StringIO())
+
+        self.assertEqual(ProductInTransactionDetail.objects.count(), 600)
+        self.assertEqual(StockMovement.objects.filter(movement_type=StockMovement.IN, in_detail__isnull=False).count(), 600)
+        stock, remaining, ledger = self.ledger()
+        self.assertEqual(stock, remaining)
+        self.assertEqual(stock, ledger)
+        self.assertEqual(
+            LotAllocation.objects.aggregate(total=Sum('quantity'))['total'],
+            ProductOutTransactionDetail.objects.aggregate(total=Sum('qty_requested'))['total'],
+        )
+        self.assertEqual(DailySalesRollup.objects.aggregate(total=Sum('lines'))['total'],
+                         ProductInTransactionDetail.objects.filter(transaction__is_delivered=True).count())
+
+    def test_same_seed_gives_same_data(self):
+        today = date(2026, 1, 15)
+
+        def invoices():
+            return list(ProductInTransaction.objects.order_by('id').values_list(
+                'supplier_invoice_number', 'inward_stock_date', 'transaction_details__quantity',
+            ))
+
+        StoreSeeder(200, seed=7, today=today).run()
+        first = invoices()
+        ProductInTransaction.objects.all().delete()
+        StoreSeeder(200, seed=7, today=today).run()
+        self.assertEqual(invoices(), first)
+
+
+class EndpointBudgetTests(TestCase):
+    """
+    Every API route is requested against the seeded 1k-line dataset and its query count is
+    compared with the checked-in baseline. Wall time depends on the machine, so it is only
+    checked by the check_endpoint_budgets command.
+    """
+
+    rows = 1000
+
+    @classmethod
+    def setUpTestData(cls):
+        StoreSeeder(cls.rows).run()
+
+    def setUp(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        settings_override = self.settings(BARCODE_CACHE_DIR=cache_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_every_route_is_budgeted(self):
+        self.assertEqual(unbudgeted_routes(budget_endpoints(budget_fixtures())), [])
+
+    def test_query_counts_are_within_budget(self):
+        fixtures = budget_fixtures()
+        results = measure_endpoints(budget_endpoints(fixtures), fixtures['user'])
+        self.assertEqual(budget_violations(results, load_baseline()[str(self.rows)], check_time=False), [])
+
+    def test_budget_violations(self):
+        budgets = {'list': {'queries': 2, 'ms': 10}}
+        self.assertEqual(budget_violations({'list': {'queries': 2, 'ms': 50, 'status': 200}}, budgets), [])
+        self.assertEqual(budget_violations({'list': {'queries': 3, 'ms': 56, 'status': 200}}, budgets), [
+            'list: 3 queries, budget 2', 'list: 56 ms, budget 55 ms',
+        ])
+        self.assertEqual(budget_violations({'list': {'queries': 3, 'ms': 56, 'status': 200}}, budgets, check_time=False), [
+            'list: 3 queries, budget 2',
+        ])
+        self.assertEqual(budget_violations({'detail': {'queries': 1, 'ms': 1, 'status': 404}}, budgets), ['detail: responded 404'])
+
+
+class AsyncReadViewTests(TestCase):
+    """The async views Backend.asgi routes the read-heavy endpoints to answer like the sync ones."""
+
+    ASYNC_VIEWS = {
+        DashboardView: AsyncDashboardView,
+        InventoryListView: AsyncInventoryListView,
+        TransactionView: AsyncTransactionView,
+        ReportView: AsyncReportView,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        StoreSeeder(300, seed=3).run()
+
+    def paths(self):
+        today = date.today()
+        sales = f'?start_date={today - timedelta(days=365)}&end_date={today}'
+        pending = ProductInTransaction.objects.filter(is_delivered=False).order_by('id').first()
+        paths = [
+            reverse('dashboard'),
+            reverse('inventory-list'),
+            reverse('inventory-list') + '?page=2&page_size=7',
+            reverse('inventory-list') + '?pagination=cursor&exceeded_delivery=true',
+            reverse('all_supplier_invoices'),
+            reverse('transaction_by_invoice', args=[pending.supplier_invoice_number]),
+            reverse('transaction_by_invoice', args=['NO-SUCH-INVOICE']),
+            reverse('report_view', args=['sales']) + sales,
+            reverse('report_view', args=['sales']) + sales + '&breakdown=daily',
+            reverse('report_view', args=['sales']),
+            reverse('report_view', args=['product-details']),
+            reverse('report_view', args=['nonsense']),
+            reverse('report_view', args=['daily']) + '?export=xml',
+        ]
+        for report_type in ('transaction-in', 'transaction-out', 'daily'):
+            paths += [reverse('report_view', args=[report_type]), reverse('report_view', args=[report_type]) + '?export=csv']
+        paths.append(reverse('report_view', args=['sales']) + sales + '&export=ndjson')
+        paths.append(reverse('report_view', args=['product-details']) + '?export=csv')
+        return paths
+
+    def get_sync(self, path):
+        cache.clear()
+        response = self.client.get(path)
+        return response.status_code, b''.join(response.streaming_content) if response.streaming else response.content
+
+    async def get_async(self, path):
+        cache.clear()
+        url = urlsplit(path)
+        match = resolve(url.path)
+        view = self.ASYNC_VIEWS[match.func.view_class].as_view()
+        response = await view(AsyncRequestFactory().get(path), **match.kwargs)
+        if response.streaming:
+            return response.status_code, b''.join([chunk async for chunk in response.streaming_content])
+        response.render()
+        return response.status_code, response.content
+
+    def test_async_views_answer_like_sync_views(self):
+        for path in self.paths():
+            with self.subTest(path=path):
+                status, content = self.get_sync(path)
+                self.assertEqual(async_to_sync(self.get_async)(path), (status, content))
+                self.assertTrue(content)
+
+    def test_asgi_routes_to_async_views(self):
+        self.addCleanup(importlib.reload, store_urls)
+        with self.settings(ASYNC_READ_VIEWS=True):
+            importlib.reload(store_urls)
+
+        views = {pattern.name: pattern.callback.view_class for pattern in store_urls.urlpatterns}
+        self.assertEqual(
+            [views[name] for name in ('dashboard', 'inventory-list', 'all_supplier_invoices', 'transaction_by_invoice', 'report_view')],
+            [AsyncDashboardView, AsyncInventoryListView, AsyncTransactionView, AsyncTransactionView, AsyncReportView],
+        )
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}, NOTIFICATIONS_COALESCE_MS=50)
+class StoreEventsTests(StoreFixturesMixin, TransactionTestCase):
+    # Consumers look users and branches up on worker threads, which need committed rows
+    def setUp(self):
+        channel_layers.backends.clear()
+        self.addCleanup(channel_layers.backends.clear)
+        self.create_reference_data()
+        self.admin = get_user_model().objects.create_user('admin', password='x', is_staff=True)
+        self.clerk = get_user_model().objects.create_user('clerk', password='x')
+        self.branch = Branch.objects.create(name='North', location='Kochi', contact_details='123')
+        self.other_branch = Branch.objects.create(name='South', location='Kochi', contact_details='456')
+
+    async def connect(self, path, user=None):
+        # channels.testing.WebsocketCommunicator would do, but it imports daphne at import time
+        path, _, query_string = path.partition('?')
+        if user is not None:
+            query_string = f'token={AccessToken.for_user(user)}'
+        communicator = ApplicationCommunicator(JWTAuthMiddleware(URLRouter(websocket_urlpatterns)), {
+            'type': 'websocket', 'path': path, 'query_string': query_string.encode(), 'headers': [], 'subprotocols': [],
+        })
+        await communicator.send_input({'type': 'websocket.connect'})
+        response = await communicator.receive_output()
+        return communicator, response['type'] == 'websocket.accept'
+
+    async def receive_json(self, communicator):
+        return json.loads((await communicator.receive_output())['text'])
+
+    async def disconnect(self, communicator):
+        await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await communicator.wait()
+
+    def dispatch(self, branch, product, number):
+        out = ProductOutTransaction.objects.create(branch=branch, transfer_invoice_number=number, branch_in_charge='Manager')
+        ProductOutTransactionDetail(transaction=out, product=product, qty_requested=2).save()
+        return out
+
+    async def test_bulk_intake_arrives_as_one_message(self):
+        products = await sync_to_async(self.create_products)(3)
+        communicator, connected = await self.connect('/ws/store/', self.admin)
+        self.assertTrue(connected)
+
+        def intake():
+            details = [self.create_lots(product, (5, None))[0] for product in products]
+            in_transaction = details[0].transaction
+            in_transaction.is_delivered = True
+            in_transaction.save()
+            # A second save of a delivered transaction is not a new delivery
+            in_transaction.save()
+            return in_transaction
+
+        in_transaction = await sync_to_async(intake)()
+        message = await self.receive_json(communicator)
+        self.assertEqual(message, {
+            'type': 'store.update',
+            'stock': {str(product.id): 5 for product in products},
+            'delivered': [{'id': in_transaction.id, 'supplier_invoice_number': in_transaction.supplier_invoice_number}],
+        })
+        self.assertTrue(await communicator.receive_nothing(0.2))
+        await self.disconnect(communicator)
+
+    async def test_branch_stream_carries_its_dispatches_and_stock(self):
+        product, = await sync_to_async(self.create_products)(1)
+        await sync_to_async(self.create_lots)(product, (10, None))
+        communicator, connected = await self.connect(f'/ws/store/branches/{self.branch.branch_code}/', self.clerk)
+        self.assertTrue(connected)
+
+        out = await sync_to_async(self.dispatch)(self.branch, product, 'OUT-1')
+        self.assertEqual(await self.receive_json(communicator), {
+            'type': 'store.update',
+            'stock': {str(product.id): -2},
+            'dispatched': [{'id': out.id, 'branch': self.branch.branch_code, 'transfer_invoice_number': 'OUT-1'}],
+        })
+
+        await sync_to_async(self.dispatch)(self.other_branch, product, 'OUT-2')
+        self.assertEqual(await self.receive_json(communicator), {'type': 'store.update', 'stock': {str(product.id): -2}})
+        await self.disconnect(communicator)
+
+    async def test_refuses_unauthorized_connections(self):
+        for path, user in [
+            ('/ws/store/', None),
+            ('/ws/store/?token=not-a-token', None),
+            ('/ws/store/', self.clerk),
+            ('/ws/store/branches/BR000000/', self.clerk),
+        ]:
+            with self.subTest(path=path, user=user):
+                communicator, connected = await self.connect(path, user)
+                self.assertFalse(connected)
+
+    def test_batch_merges_events(self):
+        batch = EventBatch()
+        batch.add({'kind': 'stock', 'deltas': {'1': 4, '2': 3}})
+        batch.add({'kind': 'stock', 'deltas': {'1': -4}})
+        batch.add({'kind': 'dispatched', 'id': 9, 'branch': 'BR1', 'transfer_invoice_number': 'OUT-9'})
+        batch.add({'kind': 'dispatched', 'id': 9, 'branch': 'BR1', 'transfer_invoice_number': 'OUT-9'})
+        self.assertEqual(batch.message(), {
+            'type': 'store.update', 'stock': {'2': 3},
+            'dispatched': [{'id': 9, 'branch': 'BR1', 'transfer_invoice_number': 'OUT-9'}],
+        })
+
+        batch.add({'kind': 'stock', 'deltas': None})
+        self.assertIsNone(batch.message()['stock'])
+
+        cancelled = EventBatch()
+        cancelled.add({'kind': 'stock', 'deltas': {'1': 2}})
+        cancelled.add({'kind': 'stock', 'deltas': {'1': -2}})
+        self.assertIsNone(cancelled.message())